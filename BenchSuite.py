@@ -0,0 +1,248 @@
+"""
+Benchmark suite for the tracker hot paths at several wishlist sizes, e.g.
+
+    python BenchSuite.py --out before.json
+    (change something)
+    python BenchSuite.py --out after.json --compare before.json
+
+Times calc, add_item, view_wishlist, search_wishlist and saving and
+loading through SnapshotStore (what Session.save_tracker and load_tracker
+do) on synthetic trackers of 1k, 100k and 1M items, and records the peak
+traced memory of each. Results are written as JSON keyed by operation and
+size so runs from different commits can be compared. With --compare, any
+operation slower (or using more memory) than the baseline by more than
+--threshold is reported and the exit status is 1.
+"""
+
+# import required packages
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from Benchmark import make_tracker
+from SnapshotStore import SnapshotStore
+
+OPERATIONS = ["calc", "search_wishlist", "view_wishlist", "add_item", "save", "load"]
+
+
+class Case():
+
+    """
+    The operations of the suite on one synthetic tracker. Each operation
+    method runs its operation once and returns the number of calls made, so
+    cheap operations can be repeated enough to time.
+    """
+
+    # calls made by the operations that take microseconds each
+    calls = 1000
+
+    def __init__(self, size, path, **mix):
+        self.size = size
+        self.path = path
+        self.tracker = make_tracker(size, **mix)
+        self.added = 0
+
+    def calc(self):
+        self.tracker.calc()
+        return 1
+
+    def search_wishlist(self):
+
+        # half hits, half misses
+        for i in range(self.calls):
+            self.tracker.search_wishlist("item_" + str(i * 2 % (self.size * 2)))
+
+        return self.calls
+
+    def view_wishlist(self):
+        self.tracker.view_wishlist()
+        return 1
+
+    def add_item(self):
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(self.calls):
+                self.tracker.add_item("added_" + str(self.added), 9.99, "Books", 100)
+                self.added += 1
+
+        return self.calls
+
+    def save(self):
+
+        # a new store writes a full snapshot, like the first save of a session
+        store = SnapshotStore(self.path)
+        store.retention = None
+        store.save(self.tracker, "bench", {"bench"})
+        return 1
+
+    def load(self):
+
+        tracker = SnapshotStore(self.path).load("bench")
+        wishlist = tracker.get_wishlist()
+
+        if hasattr(wishlist, "load"):
+            wishlist.load()
+
+        return 1
+
+
+def measure(func, repeat = 3, budget = 5.0, memory = True):
+
+    """
+    Returns the best seconds per call over up to repeat runs of func (fewer
+    once the runs have taken budget seconds), and the peak traced bytes of
+    one more run (None without memory). tracemalloc slows the run it traces,
+    so it isn't timed.
+    """
+
+    best = None
+    spent = 0
+
+    for r in range(repeat):
+
+        start = time.perf_counter()
+        calls = func()
+        seconds = time.perf_counter() - start
+        spent += seconds
+        best = seconds / calls if best is None else min(best, seconds / calls)
+
+        if spent >= budget:
+            break
+
+    peak = None
+
+    if memory:
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return best, peak
+
+
+def commit():
+
+    """
+    Returns the current git commit of the repository, or None
+    """
+
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output = True, text = True,
+                              check = True, cwd = os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes = (1000, 100000, 1000000), operations = OPERATIONS, repeat = 3, budget = 5.0, memory = True,
+        seed = 0, redeemed = 0.1, deleted = 0.1, days = 700, skew = 0, log = None):
+
+    """
+    Runs the suite and returns the results as a dict. results maps
+    "operation/size" to the seconds per call and peak traced bytes.
+    """
+
+    mix = {"seed": seed, "redeemed": redeemed, "deleted": deleted, "days": days, "skew": skew}
+    report = {"commit": commit(), "python": platform.python_version(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "mix": mix, "results": dict()}
+
+    for size in sizes:
+
+        path = tempfile.mkdtemp()
+
+        try:
+            case = Case(size, path, **mix)
+
+            for operation in operations:
+
+                seconds, peak = measure(getattr(case, operation), repeat, budget, memory)
+                report["results"]["{}/{}".format(operation, size)] = {"seconds": seconds, "peak_bytes": peak}
+
+                if log is not None:
+                    log("{:>16} {:>8}: {:12.6f}s{}".format(operation, size, seconds,
+                                                          "" if peak is None else "  peak {} bytes".format(peak)))
+        finally:
+            shutil.rmtree(path, ignore_errors = True)
+
+    return report
+
+
+def compare(report, baseline, threshold = 0.2, min_seconds = 0.0001):
+
+    """
+    Returns a list of (key, metric, baseline value, new value) for the results
+    worse than the baseline by more than threshold (0.2 is 20%). Times under
+    min_seconds in both runs are too noisy to compare and are skipped.
+    """
+
+    regressions = []
+
+    for key, result in sorted(report["results"].items()):
+
+        base = baseline["results"].get(key)
+
+        if base is None:
+            continue
+
+        if max(result["seconds"], base["seconds"]) >= min_seconds and result["seconds"] > base["seconds"] * (1 + threshold):
+            regressions.append((key, "seconds", base["seconds"], result["seconds"]))
+
+        if result["peak_bytes"] is not None and base["peak_bytes"] is not None and \
+                result["peak_bytes"] > base["peak_bytes"] * (1 + threshold):
+            regressions.append((key, "peak_bytes", base["peak_bytes"], result["peak_bytes"]))
+
+    return regressions
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Benchmark the tracker hot paths on synthetic data")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [1000, 100000, 1000000], help = "wishlist sizes")
+    parser.add_argument("--operations", nargs = "+", choices = OPERATIONS, default = OPERATIONS)
+    parser.add_argument("--repeat", type = int, default = 3, help = "timed runs of each operation, best is kept")
+    parser.add_argument("--budget", type = float, default = 5.0, help = "seconds after which an operation isn't repeated")
+    parser.add_argument("--no-memory", action = "store_true", help = "skip the traced run measuring peak memory")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--redeemed", type = float, default = 0.1, help = "share of redeemed items")
+    parser.add_argument("--deleted", type = float, default = 0.1, help = "share of deleted items")
+    parser.add_argument("--days", type = int, default = 700, help = "days the items' add dates are spread over")
+    parser.add_argument("--skew", type = float, default = 0, help = "Zipf exponent of the category mix, 0 for uniform")
+    parser.add_argument("--out", help = "file to write the JSON results to")
+    parser.add_argument("--compare", help = "JSON results of an earlier run to check for regressions")
+    parser.add_argument("--threshold", type = float, default = 0.2, help = "allowed slowdown, 0.2 is 20%%")
+    args = parser.parse_args()
+
+    if args.redeemed + args.deleted > 1:
+        parser.error("--redeemed and --deleted add up to more than 1")
+
+    report = run(args.sizes, args.operations, args.repeat, args.budget, not args.no_memory, args.seed,
+                 args.redeemed, args.deleted, args.days, args.skew, log = print)
+
+    if args.out is not None:
+        with open(args.out, "w", encoding = "utf-8") as f:
+            json.dump(report, f, indent = 2)
+
+    if args.compare is not None:
+
+        with open(args.compare, encoding = "utf-8") as f:
+            baseline = json.load(f)
+
+        regressions = compare(report, baseline, args.threshold)
+
+        print("Compared with {} ({}):".format(args.compare, baseline.get("commit")))
+
+        for key, metric, before, after in regressions:
+            print("  {} {}: {:.6g} -> {:.6g} ({:+.0%})".format(key, metric, before, after, after / before - 1))
+
+        if regressions:
+            sys.exit(1)
+
+        print("  no regressions over {:.0%}".format(args.threshold))
@@ -0,0 +1,474 @@
+# import required packages
+
+import datetime
+import random
+import sys
+import time
+from Tracker import Tracker
+from Item import NOT_REDEEMED_DATE, item_events, item_fields
+
+CATEGORIES = ["Beauty/Skincare", "Books", "Clothing/Accessories", "Electronics",
+              "Food", "Jewelry", "Other"]
+
+
+def make_items(n, seed = 0, redeemed = 0.1, deleted = 0.1, days = 700, skew = 0):
+
+    """
+    Generator of (name, item dict) pairs for n synthetic wishlist items.
+    redeemed and deleted are the shares of items in each status (the rest
+    are active), items are added over the days days ending 30 days ago, and
+    skew weights the categories Zipf-like (the first category is the most
+    common); 0 picks them uniformly.
+    """
+
+    rng = random.Random(seed)
+    start = datetime.date.today().toordinal() - days - 30
+    weights = [1 / (rank + 1) ** skew for rank in range(len(CATEGORIES))]
+
+    for i in range(n):
+
+        date = datetime.date.fromordinal(start + rng.randint(0, days))
+        status = rng.random()
+
+        yield "item_" + str(i), {"price": round(rng.uniform(1, 500), 2),
+                                 "category": rng.choice(CATEGORIES) if skew == 0 else rng.choices(CATEGORIES, weights)[0],
+                                 "value": rng.randint(100, 2000), "date": date,
+                                 "redeemed_dt": date + datetime.timedelta(days = 20) if status < redeemed else NOT_REDEEMED_DATE,
+                                 "redeemed": "y" if status < redeemed else "n",
+                                 "del_ind": "y" if redeemed <= status < redeemed + deleted else "n"}
+
+
+def make_tracker(n, username = "bench", **mix):
+
+    """
+    Returns a tracker holding n synthetic items, see make_items for the
+    status mix options
+    """
+
+    return Tracker(username, wishlist = dict(make_items(n, **mix)))
+
+
+def timed(func):
+
+    """
+    Runs func once and returns the elapsed seconds
+    """
+
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def bench_columnar(n = 1000000):
+
+    """
+    Compares calc() and the aggregate rebuild done on load between the
+    default dict wishlist and the NumPy columnar wishlist
+    """
+
+    from Columnar import ColumnarWishlist
+
+    dict_wl = dict()
+    columnar_wl = ColumnarWishlist(capacity = n)
+
+    for name, item in make_items(n):
+        dict_wl[name] = item
+        columnar_wl[name] = item
+
+    print("Items:", n)
+
+    for label, wishlist in (("dict", dict_wl), ("columnar", columnar_wl)):
+
+        # building the tracker rebuilds its running aggregates from the wishlist
+        tracker = None
+
+        def build():
+            nonlocal tracker
+            tracker = Tracker("bench", wishlist = wishlist)
+
+        print("{:>9} aggregate rebuild: {:.3f}s".format(label, timed(build)))
+        print("{:>9} calc(): {:.3f}s".format(label, timed(tracker.calc)))
+
+
+def bench_mapped(n = 1000000, path = "bench_wishlist.bin"):
+
+    """
+    Compares opening a pickled tracker with opening the same tracker from a
+    memory-mapped binary wishlist file
+    """
+
+    import os
+    import pickle
+    from Mapped import MappedWishlist
+
+    tracker = Tracker("bench", wishlist = dict(make_items(n)))
+    MappedWishlist.write(path, tracker)
+    pickled = pickle.dumps(tracker)
+
+    print("Items:", n)
+    print("{:>9} file size: {} bytes".format("pickle", len(pickled)))
+    print("{:>9} file size: {} bytes".format("mapped", os.path.getsize(path)))
+    print("{:>9} open + points: {:.3f}s".format("pickle", timed(lambda: pickle.loads(pickled).summary())))
+    print("{:>9} open + points: {:.3f}s".format("mapped", timed(lambda: MappedWishlist.open_tracker(path).summary())))
+
+    mapped = MappedWishlist.open_tracker(path)
+    print("{:>9} item lookup: {:.6f}s".format("mapped", timed(lambda: mapped.search_wishlist("item_" + str(n // 2)))))
+
+    os.remove(path)
+
+
+def bench_export(n = 1000000, path = "bench_export"):
+
+    """
+    Measures export throughput and peak memory for CSV and JSON Lines
+    """
+
+    import os
+    import tracemalloc
+    from Exporter import Exporter
+
+    tracker = Tracker("bench", wishlist = dict(make_items(n)))
+    exporter = Exporter(tracker)
+
+    print("Items:", n)
+
+    for suffix, write in ((".csv", exporter.write_csv), (".jsonl", exporter.write_jsonl)):
+
+        tracemalloc.start()
+        count, seconds = write(path + suffix, only_active = "n")
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        print("{:>9} export: {:.0f} rows/sec, peak {} bytes".format(suffix, count / seconds, peak))
+        os.remove(path + suffix)
+
+
+def bench_history(n = 1000000):
+
+    """
+    Compares a year of daily points balances from the point history with
+    rescanning the wishlist for each day
+    """
+
+    tracker = Tracker("bench", wishlist = dict(make_items(n)))
+    today = datetime.date.today()
+    year_ago = today - datetime.timedelta(days = 364)
+
+    def rescan(date):
+
+        # the balance straight from every item's events
+        day = date.toordinal()
+        points = 0
+
+        for temp in tracker.get_wishlist().values():
+
+            date_ord, redeemed_ord, value, price, flags = item_fields(temp)
+
+            for event_day, dc, ds, dk in item_events(date_ord, redeemed_ord, value, flags):
+                if event_day <= day:
+                    points += dc * day - ds + dk
+
+        return points
+
+    print("Items:", n)
+    print("{:>9} build: {:.3f}s".format("history", timed(lambda: tracker.points_on(today))))
+    print("{:>9} 365 days: {:.3f}s".format("history", timed(lambda: tracker.points_history(year_ago, today))))
+    print("{:>9} 1 day: {:.3f}s (x365 for a year)".format("rescan", timed(lambda: rescan(today))))
+
+
+def bench_search(n = 100000, queries = 200):
+
+    """
+    Times fuzzy_search per query over item_N names, with typo queries and
+    queries made only of trigrams that most names share
+    """
+
+    tracker = Tracker("bench", wishlist = dict(make_items(n)))
+    rng = random.Random(0)
+    typos = ["itme_" + str(rng.randrange(n)) for i in range(queries)]
+    common = ["item_", "item", "tem_"] * (queries // 3)
+
+    print("Items:", n)
+    print("{:>9} index: {:.3f}s".format("fuzzy", timed(lambda: tracker.fuzzy_search("item_0"))))
+
+    for label, batch in (("typos", typos), ("common", common)):
+        seconds = timed(lambda: [tracker.fuzzy_search(query) for query in batch])
+        print("{:>9} {:.3f}ms per query".format(label, seconds / len(batch) * 1000))
+
+
+def bench_memory(n = 1000000):
+
+    """
+    Compares the memory held by a loaded wishlist of item dicts with the
+    Wishlist of slotted records, and calc() over each
+    """
+
+    import pickle
+    import tracemalloc
+    from Item import Wishlist
+
+    data = pickle.dumps(dict(make_items(n)), protocol = pickle.HIGHEST_PROTOCOL)
+    print("Items:", n)
+
+    for label, load in (("dicts", pickle.loads), ("records", lambda data: Wishlist.upgrade(pickle.loads(data)))):
+
+        tracemalloc.start()
+        wishlist = load(data)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        tracker = Tracker("bench")
+        tracker.set_wishlist(wishlist)
+        print("{:>9} {:.0f} bytes/item, calc(): {:.3f}s".format(label, size / n, timed(tracker.calc)))
+        del wishlist, tracker
+
+
+def bench_session(n = 100000, path = "bench_data", max_depth = 12, max_growth = 64 * 1024, max_peak = 512 * 1024):
+
+    """
+    Drives the interactive menus with n scripted operations (cancels,
+    searches, invalid responses and saves) and reports the call stack depth
+    and traced memory along the way, which should both stay flat. Returns
+    False (and says why) if the stack got deeper than max_depth frames, or
+    traced memory grew by more than max_growth bytes from the first sample
+    to the last or peaked above max_peak bytes.
+    """
+
+    import builtins
+    import contextlib
+    import itertools
+    import os
+    import shutil
+    import tracemalloc
+    import Session
+    from SnapshotStore import SnapshotStore
+
+    ops = [["2", "cancel"], ["3", "cancel"], ["4", "cancel"], ["5", "item_1"], ["1", "cancel"],
+           ["2", "item_1", "2", "cancel"], ["6", "cancel"], ["x"], ["8"]]
+    # create a tracker with a few items, then cycle through ops
+    script = ["1", "bench", "2"]
+
+    for i in range(10):
+        script += ["1", "item_" + str(i), "2", "10", "100", "n"]
+
+    script = itertools.chain(script, itertools.chain.from_iterable(
+        itertools.islice(itertools.cycle(ops), n)), ["9"])
+    depths = [None, 0]
+    samples = []
+    done = 0
+
+    def scripted_input(prompt = ""):
+
+        nonlocal done
+
+        # count the frames below this call
+        frame, depth = __import__("sys")._getframe(), 0
+
+        while frame is not None:
+            frame, depth = frame.f_back, depth + 1
+
+        # keep only the min and max so the bench itself doesn't grow
+        depths[:] = [depth if depths[0] is None else min(depths[0], depth), max(depths[1], depth)]
+        done += 1
+
+        if done % (n // 10 or 1) == 0:
+            samples.append(tracemalloc.get_traced_memory()[0])
+
+        return next(script)
+
+    store = SnapshotStore(path)
+    store.retention = None
+    session = Session.Session(store)
+    real_input, real_readline = builtins.input, Session.readline
+    builtins.input, Session.readline = scripted_input, None
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            session.run()
+    except SystemExit:
+        pass
+    finally:
+        builtins.input, Session.readline = real_input, real_readline
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        shutil.rmtree(path, ignore_errors = True)
+
+    print("Operations:", n, "prompts:", done, "in {:.2f}s".format(time.perf_counter() - start))
+    print("Stack depth: min {} max {}".format(*depths))
+    print("Traced memory: " + ", ".join(str(sample) for sample in samples) + ", peak {}".format(peak))
+
+    failures = []
+
+    if depths[1] > max_depth:
+        failures.append("stack depth {} > {}".format(depths[1], max_depth))
+
+    if len(samples) > 1 and samples[-1] - samples[0] > max_growth:
+        failures.append("memory grew {} bytes > {}".format(samples[-1] - samples[0], max_growth))
+
+    if peak > max_peak:
+        failures.append("peak memory {} bytes > {}".format(peak, max_peak))
+
+    print("FAILED: " + "; ".join(failures) if failures else "Within bounds")
+
+    return len(failures) == 0
+
+
+def bench_cache(users = 200, items = 1000, requests = 5000, path = "bench_data"):
+
+    """
+    Compares loading a tracker from the store for every request with a
+    TrackerCache holding a quarter of the users, on skewed (Zipf-like)
+    access where a few users get most of the requests
+    """
+
+    import contextlib
+    import io
+    import shutil
+    from Cache import TrackerCache
+    from SnapshotStore import SnapshotStore
+
+    store = SnapshotStore(path)
+    store.retention = None
+    names = set("user_" + str(u) for u in range(users))
+
+    for username in names:
+        store.save(Tracker(username, wishlist = dict(make_items(items))), username, names)
+
+    rng = random.Random(0)
+    weights = [1 / (rank + 1) for rank in range(users)]
+    order = sorted(names)
+    picks = rng.choices(order, weights, k = requests)
+    cache = TrackerCache(store, names, max_trackers = users // 4)
+
+    def uncached():
+        for username in picks:
+            store.load(username).search_wishlist("item_1")
+
+    def cached():
+        for username in picks:
+            cache.get(username).search_wishlist("item_1")
+
+    def writes():
+        # each change marks the tracker dirty until it's evicted or flushed
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i, username in enumerate(picks):
+                cache.get(username).add_item("extra_" + str(i), 1.0, "Other", 100)
+
+        cache.flush()
+
+    try:
+        print("Users:", users, "items each:", items, "requests:", requests)
+        print("{:>9} reads: {:.3f}s".format("uncached", timed(uncached)))
+        print("{:>9} reads: {:.3f}s".format("cached", timed(cached)))
+        print("{:>9} writes: {:.3f}s".format("cached", timed(writes)))
+        print("{:>9} stats: {}".format("cache", cache.stats()))
+    finally:
+        shutil.rmtree(path, ignore_errors = True)
+
+
+def contend(path, users, saves, worker):
+
+    """
+    One writer process for bench_contention: adds an item to a user's
+    tracker and saves it, saves times, cycling through the users. Returns
+    the seconds taken.
+    """
+
+    import contextlib
+    import io
+    from SnapshotStore import SnapshotStore
+
+    store = SnapshotStore(path)
+    store.retention = None
+    # checkpoint often so snapshots are replaced under contention too
+    store.checkpoint_every = 5
+    names = set(users)
+    start = time.perf_counter()
+
+    for i in range(saves):
+
+        username = users[i % len(users)]
+
+        # hold the user's lock from the load to the save, so no other
+        # process's changes are lost in between
+        with store.lock(username):
+            tracker = store.load(username)
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                tracker.add_item("w{}_{}".format(worker, i), 1.0, "Other", 100)
+
+            store.save(tracker, username, names)
+
+    return time.perf_counter() - start
+
+
+def bench_contention(processes = 8, saves = 100, users = 4, path = "bench_data"):
+
+    """
+    Runs concurrent writer processes against the same users in one data
+    directory, then checks every snapshot is complete, every tracker loads
+    and verifies, and no item was lost. Reports saves per second.
+    """
+
+    import shutil
+    from concurrent.futures import ProcessPoolExecutor
+    from SnapshotStore import SnapshotStore
+
+    store = SnapshotStore(path)
+    store.retention = None
+    usernames = ["user_" + str(u) for u in range(users)]
+
+    for username in usernames:
+        store.save(store.create(username), username, set(usernames))
+
+    try:
+        start = time.perf_counter()
+
+        with ProcessPoolExecutor(max_workers = processes) as executor:
+            taken = list(executor.map(contend, [path] * processes, [usernames] * processes,
+                                      [saves] * processes, range(processes)))
+
+        seconds = time.perf_counter() - start
+        incomplete = 0
+        lost = 0
+        unverified = 0
+        store = SnapshotStore(path)
+
+        for username in usernames:
+
+            incomplete += sum(1 for saved, snapshot in store.manifest.snapshots(username)
+                              if not store.is_complete(snapshot))
+            tracker = store.load(username)
+            expected = set("w{}_{}".format(w, i) for w in range(processes) for i in range(saves)
+                           if usernames[i % users] == username)
+            lost += sum(1 for item in expected if not tracker.is_in_wishlist(item))
+            unverified += 0 if tracker.calc() else 1
+
+        print("Processes:", processes, "saves each:", saves, "users:", users)
+        print("{} saves in {:.2f}s: {:.0f} saves/sec (slowest writer {:.2f}s)".format(
+            processes * saves, seconds, processes * saves / seconds, max(taken)))
+        print("incomplete snapshots: {}  lost items: {}  unverified trackers: {}".format(incomplete, lost, unverified))
+    finally:
+        shutil.rmtree(path, ignore_errors = True)
+
+
+if __name__ == "__main__":
+
+    # "python Benchmark.py session" runs just the menu check, exiting 1 if
+    # it's out of bounds
+    if sys.argv[1:] == ["session"]:
+        sys.exit(0 if bench_session() else 1)
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    bench_columnar(n)
+    bench_mapped(n)
+    bench_export(n)
+    bench_history(n)
+    bench_search()
+    bench_memory(n)
+    session_ok = bench_session()
+    bench_cache()
+    bench_contention()
+    sys.exit(0 if session_ok else 1)
@@ -0,0 +1,200 @@
+# import required packages
+
+from collections import OrderedDict
+import time
+
+
+class TrackerCache():
+
+    """
+    In-memory cache of loaded trackers by username, for long-lived processes
+    serving several users. Bounded by the number of trackers and by their
+    estimated size, evicting the least recently used first.
+
+    A tracker is dirty when it has changes made since it was loaded or last
+    saved (its last_seq() moved on). Dirty trackers are saved when they're
+    evicted and by flush(), which get() runs every flush_interval seconds.
+    A process that can sit idle should also call maybe_flush() from a timer
+    (TrackerServer runs its own flush task). The cache isn't thread safe;
+    use it from one thread, like the store.
+    """
+
+    # estimated bytes of a loaded tracker and of each wishlist item (a
+    # Wishlist of records measures about 290 bytes an item, see
+    # Benchmark.bench_memory)
+    tracker_bytes = 2000
+    item_bytes = 300
+
+    def __init__(self, store, names, max_trackers = 100, max_bytes = 512 * 1024 * 1024, flush_interval = 60):
+
+        self.store = store
+        # tracker names passed to the store when saving
+        self.names = names
+        self.max_trackers = max_trackers
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        # username to [tracker, last_seq() when saved or None if never, estimated bytes]
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.last_flush = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writebacks = 0
+        # called with the username of each tracker evicted or discarded
+        self.on_evict = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, username):
+        return username in self.entries
+
+    def estimate(self, tracker):
+
+        """
+        Returns the estimated bytes held by a tracker
+        """
+
+        return self.tracker_bytes + self.item_bytes * len(tracker.get_wishlist())
+
+    def is_dirty(self, username):
+
+        tracker, saved_seq, size = self.entries[username]
+
+        return saved_seq is None or tracker.last_seq() != saved_seq
+
+    def get(self, username):
+
+        """
+        Returns the user's tracker, loading it from the store on a miss.
+        Returns None if the user has no saved tracker.
+        """
+
+        self.maybe_flush()
+
+        if username in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(username)
+            return self.entries[username][0]
+
+        self.misses += 1
+        tracker = self.store.load(username)
+
+        if tracker is not None:
+            self.__insert(username, tracker, tracker.last_seq())
+
+        return tracker
+
+    def put(self, username, tracker):
+
+        """
+        Adds a tracker that isn't saved yet (e.g. just created); it's dirty
+        until written back
+        """
+
+        if username in self.entries:
+            self.bytes -= self.entries.pop(username)[2]
+
+        self.__insert(username, tracker, None)
+
+    def __insert(self, username, tracker, saved_seq):
+
+        size = self.estimate(tracker)
+        self.entries[username] = [tracker, saved_seq, size]
+        self.bytes += size
+
+        # always keep the tracker just asked for, even if it's over the limits on its own
+        while len(self.entries) > 1 and (len(self.entries) > self.max_trackers or self.bytes > self.max_bytes):
+            self.evict()
+
+    def evict(self):
+
+        """
+        Removes the least recently used tracker, saving it first if it's dirty
+        """
+
+        username = next(iter(self.entries))
+
+        if self.is_dirty(username):
+            self.write_back(username)
+
+        self.bytes -= self.entries.pop(username)[2]
+        self.evictions += 1
+
+        if self.on_evict is not None:
+            self.on_evict(username)
+
+    def discard(self, username):
+
+        """
+        Drops a tracker without saving it, e.g. once it's out of date with
+        its saved copy; the next get() loads it again
+        """
+
+        if username in self.entries:
+            self.bytes -= self.entries.pop(username)[2]
+
+            if self.on_evict is not None:
+                self.on_evict(username)
+
+    def write_back(self, username):
+
+        entry = self.entries[username]
+        self.store.save(entry[0], username, self.names)
+        self.writebacks += 1
+
+        # the size changes as items are added
+        self.bytes -= entry[2]
+        entry[1], entry[2] = entry[0].last_seq(), self.estimate(entry[0])
+        self.bytes += entry[2]
+
+    def mark_saved(self, username):
+
+        """
+        Records that the user's tracker was saved outside the cache
+        """
+
+        if username in self.entries:
+            self.entries[username][1] = self.entries[username][0].last_seq()
+
+    def dirty(self):
+
+        """
+        Returns the usernames of the dirty trackers
+        """
+
+        return [username for username in self.entries if self.is_dirty(username)]
+
+    def flush(self):
+
+        """
+        Saves every dirty tracker. Returns the number saved.
+        """
+
+        dirty = self.dirty()
+
+        for username in dirty:
+            self.write_back(username)
+
+        self.last_flush = time.monotonic()
+
+        return len(dirty)
+
+    def maybe_flush(self):
+
+        if self.flush_interval is not None and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def stats(self):
+
+        """
+        Returns the cache counters as a dict
+        """
+
+        lookups = self.hits + self.misses
+
+        return {"trackers": len(self.entries), "bytes": self.bytes, "hits": self.hits,
+                "misses": self.misses, "hit_rate": self.hits / lookups if lookups > 0 else 0,
+                "evictions": self.evictions, "writebacks": self.writebacks,
+                "dirty": sum(1 for username in self.entries if self.is_dirty(username))}
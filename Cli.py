@@ -0,0 +1,296 @@
+"""
+Non-interactive command line for scripts and batch jobs, e.g.
+
+    python . add alice "Red Shoes" --price 59.99 --category Clothing/Accessories --value 500
+    python . list alice --category Books
+    python . info alice
+
+Each command loads the tracker once, saves it once if it changed (holding
+the user's lock in between, so concurrent runs don't lose changes), and
+prints JSON (one object, or one object per line for list). Exit codes:
+0 on success, 1 when the tracker or item doesn't allow the action, 2 for
+invalid arguments or values.
+"""
+
+# import required packages
+
+from SnapshotStore import SnapshotStore
+from Exporter import Exporter
+from Importer import CsvImporter
+from Validation import parse_category, parse_date, parse_price, parse_value
+import argparse
+import contextlib
+import csv
+import io
+import json
+import sys
+
+# exit codes
+OK = 0
+FAILED = 1
+INVALID = 2
+
+# how update values are checked, by field
+PARSERS = {"price": parse_price, "value": parse_value, "category": parse_category, "date": parse_date}
+
+
+class CliError(Exception):
+
+    """
+    Raised to stop a command with a message and an exit code
+    """
+
+    def __init__(self, message, code = FAILED):
+        self.message = message
+        self.code = code
+        super().__init__(self.message)
+
+
+def build_parser():
+
+    parser = argparse.ArgumentParser(prog = "tracker", description = "Impulse Spending Tracker command line")
+    parser.add_argument("--data", default = "data", help = "data directory for pickle snapshots")
+    parser.add_argument("--db", default = None, help = "use this SQLite database instead of the data directory")
+    commands = parser.add_subparsers(dest = "command", required = True)
+
+    create = commands.add_parser("create", help = "create a tracker")
+    create.add_argument("username")
+
+    add = commands.add_parser("add", help = "add an item")
+    add.add_argument("username")
+    add.add_argument("item")
+    add.add_argument("--price", required = True)
+    add.add_argument("--category", required = True, help = "category name or menu number")
+    add.add_argument("--value", required = True, help = "point value, 100 to 2000")
+    add.add_argument("--date", default = None, help = "MM/DD/YYYY, default today")
+
+    update = commands.add_parser("update", help = "update an item's price, value, category or date")
+    update.add_argument("username")
+    update.add_argument("item")
+    update.add_argument("field", choices = sorted(PARSERS))
+    update.add_argument("new_value")
+
+    delete = commands.add_parser("delete", help = "delete an item")
+    delete.add_argument("username")
+    delete.add_argument("item")
+
+    redeem = commands.add_parser("redeem", help = "redeem an item")
+    redeem.add_argument("username")
+    redeem.add_argument("item")
+    redeem.add_argument("--date", default = None, help = "MM/DD/YYYY, default today")
+
+    search = commands.add_parser("search", help = "look up an item, or the closest names if there's no exact match")
+    search.add_argument("username")
+    search.add_argument("item")
+    search.add_argument("-k", type = int, default = 5, help = "number of close matches")
+
+    listing = commands.add_parser("list", help = "list items, one JSON object per line")
+    listing.add_argument("username")
+    listing.add_argument("--all", action = "store_true", help = "include deleted and redeemed items")
+    listing.add_argument("--status", choices = ["active", "deleted", "redeemed"], default = None)
+    listing.add_argument("--category", default = None)
+    listing.add_argument("--start", default = None, help = "first add date, MM/DD/YYYY")
+    listing.add_argument("--end", default = None, help = "last add date, MM/DD/YYYY")
+
+    info = commands.add_parser("info", help = "show the tracker's totals")
+    info.add_argument("username")
+
+    imports = commands.add_parser("import", help = "import items from a CSV file")
+    imports.add_argument("username")
+    imports.add_argument("path")
+
+    export = commands.add_parser("export", help = "export items to a .csv or .jsonl file")
+    export.add_argument("username")
+    export.add_argument("path")
+    export.add_argument("--all", action = "store_true", help = "include deleted and redeemed items")
+
+    return parser
+
+
+def parse(parser, resp, field):
+
+    """
+    Runs a Validation parser, turning its error into an invalid argument
+    """
+
+    try:
+        return parser(resp)
+    except ValueError as e:
+        raise CliError("{}: {}".format(field, e), INVALID)
+
+
+def quietly(tracker, func, *args):
+
+    """
+    Runs a Tracker change method without its printing. Returns nothing if
+    the change was made, otherwise raises a CliError with what it printed.
+    """
+
+    seq = tracker.last_seq()
+    out = io.StringIO()
+
+    with contextlib.redirect_stdout(out):
+        func(*args)
+
+    if tracker.last_seq() == seq:
+        raise CliError(out.getvalue().strip())
+
+
+def run(args, out):
+
+    """
+    Runs a parsed command, writing its JSON output to out
+    """
+
+    if args.db is not None:
+        from SqliteStore import SqliteStore
+        store = SqliteStore(args.db)
+    else:
+        store = SnapshotStore(args.data)
+
+    names = store.load_names()
+
+    if args.command == "create":
+
+        # held from the check to the save, so two creates can't both succeed
+        with store.lock(args.username):
+
+            # another process may have created it since the names were read
+            names = store.load_names()
+
+            if args.username in names:
+                raise CliError("Username already exists.")
+
+            tracker = store.create(args.username)
+            names.add(args.username)
+            store.save(tracker, args.username, names)
+
+        json.dump({"created": args.username}, out)
+        out.write("\n")
+        return
+
+    if args.username not in names:
+        raise CliError("There is no saved tracker for that username.")
+
+    # other processes wait for this one's save before loading the tracker
+    with store.lock(args.username):
+        command(store, names, args, out)
+
+
+def command(store, names, args, out):
+
+    """
+    Runs a command on an existing tracker
+    """
+
+    tracker = store.load(args.username)
+    seq = tracker.last_seq()
+    result = dict()
+
+    if args.command == "add":
+
+        if tracker.is_in_wishlist(args.item):
+            raise CliError("Item is already in wishlist.")
+
+        item = (args.item, parse(parse_price, args.price, "price"), parse(parse_category, args.category, "category"),
+                parse(parse_value, args.value, "value"), None if args.date is None else parse(parse_date, args.date, "date"))
+        tracker.add_items([item])
+        result = {"added": args.item}
+
+    elif args.command == "update":
+
+        quietly(tracker, tracker.update_item, args.item, args.field, parse(PARSERS[args.field], args.new_value, args.field))
+        result = {"updated": args.item, args.field: args.new_value}
+
+    elif args.command == "delete":
+
+        quietly(tracker, tracker.del_item, args.item)
+        result = {"deleted": args.item}
+
+    elif args.command == "redeem":
+
+        if args.date is None:
+            quietly(tracker, tracker.redeem_item, args.item)
+        else:
+            quietly(tracker, tracker.redeem_item, args.item, "y", parse(parse_date, args.date, "date"))
+
+        result = {"redeemed": args.item}
+
+    elif args.command == "search":
+
+        temp = tracker.search_wishlist(args.item)
+
+        if temp is not False:
+            result = {"item": Exporter(tracker).row(args.item, temp)}
+        else:
+            result = {"item": None, "matches": [{"item": name, "score": score}
+                                                for name, score in tracker.fuzzy_search(args.item, args.k)]}
+
+    elif args.command == "list":
+
+        filters = {"only_active": "n" if args.all or args.status is not None else "y",
+                   "status": args.status, "category": args.category,
+                   "start": None if args.start is None else parse(parse_date, args.start, "start"),
+                   "end": None if args.end is None else parse(parse_date, args.end, "end")}
+
+        for chunk in Exporter(tracker).chunks(**filters):
+            out.write("".join(json.dumps(row) + "\n" for row in chunk))
+
+        return
+
+    elif args.command == "info":
+
+        result = tracker.summary()
+        result["start_date"] = result["start_date"].isoformat()
+        result["cost"] = round(float(result["cost"]), 2)
+
+    elif args.command == "import":
+
+        try:
+            result = CsvImporter(tracker).run(args.path)
+        except OSError as e:
+            raise CliError("Unable to open that file. {}".format(e))
+        except CsvImporter.MissingColumns as e:
+            raise CliError(str(e), INVALID)
+        except UnicodeDecodeError:
+            raise CliError("Unable to import. The CSV file isn't UTF-8 encoded.", INVALID)
+        except csv.Error as e:
+            raise CliError("Unable to import. The CSV file is malformed ({}).".format(e), INVALID)
+
+        result["errors"] = [{"line": line, "message": message} for line, message in result["errors"]]
+
+    elif args.command == "export":
+
+        try:
+            count, seconds = Exporter(tracker).write(args.path, only_active = "n" if args.all else "y")
+        except OSError as e:
+            raise CliError("Unable to write to that file. {}".format(e))
+
+        result = {"exported": count, "path": args.path, "seconds": seconds}
+
+    # only changes need saving
+    if tracker.last_seq() != seq:
+        store.save(tracker, args.username, names)
+
+    json.dump(result, out)
+    out.write("\n")
+
+
+def main(argv = None):
+
+    """
+    Runs the command line with argv (default sys.argv[1:]) and returns the
+    exit code
+    """
+
+    args = build_parser().parse_args(argv)
+
+    try:
+        run(args, sys.stdout)
+
+    except CliError as e:
+        json.dump({"error": e.message}, sys.stdout)
+        sys.stdout.write("\n")
+        return e.code
+
+    return OK
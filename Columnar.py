@@ -0,0 +1,310 @@
+# import required packages
+
+from Item import NOT_REDEEMED
+import datetime
+import numpy as np
+
+
+class ColumnarWishlist():
+
+    """
+    Columnar storage for a Tracker wishlist. Items are kept in parallel NumPy
+    arrays (one row per item) with a name to row index, so totals and filters
+    can be computed with vectorized expressions instead of Python loops.
+
+    Items index like the records of the default Item.Wishlist, so it can be
+    passed in with Tracker(username, wishlist = ColumnarWishlist()). The
+    totals() and aggregates() hooks apply Item.item_totals and
+    item_aggregates to whole columns at once.
+    """
+
+    def __init__(self, capacity = 1024):
+
+        # name to row lookup and row to name list
+        self.__index = dict()
+        self.__names = []
+        # interned categories
+        self.__categories = []
+        self.__category_codes = dict()
+        # number of rows in use
+        self.__size = 0
+        self.__allocate(max(capacity, 1))
+
+    class Row():
+
+        """
+        View of a single wishlist row that reads and writes the underlying
+        arrays using the same keys as the default item dicts
+        """
+
+        __slots__ = ("wishlist", "row")
+
+        def __init__(self, wishlist, row):
+            self.wishlist = wishlist
+            self.row = row
+
+        def __getitem__(self, key):
+            return self.wishlist._get(self.row, key)
+
+        def __setitem__(self, key, value):
+            self.wishlist._set(self.row, key, value)
+
+        def keys(self):
+            return ["price", "category", "value", "date", "redeemed_dt", "redeemed", "del_ind"]
+
+        def to_dict(self):
+            return {k: self[k] for k in self.keys()}
+
+        def __repr__(self):
+            return repr(self.to_dict())
+
+    def __allocate(self, capacity):
+
+        """
+        Creates empty columns of the given capacity
+        """
+
+        self.__date = np.zeros(capacity, dtype = np.int64)
+        self.__redeemed_dt = np.full(capacity, NOT_REDEEMED, dtype = np.int64)
+        self.__price = np.zeros(capacity, dtype = np.float64)
+        self.__value = np.zeros(capacity, dtype = np.int64)
+        self.__deleted = np.zeros(capacity, dtype = bool)
+        self.__redeemed = np.zeros(capacity, dtype = bool)
+        self.__category = np.zeros(capacity, dtype = np.int32)
+
+    def __grow(self, needed):
+
+        """
+        Doubles the column capacity until it can hold the needed number of rows
+        """
+
+        capacity = len(self.__date)
+
+        if needed <= capacity:
+            return
+
+        while capacity < needed:
+            capacity *= 2
+
+        old = (self.__date, self.__redeemed_dt, self.__price, self.__value,
+               self.__deleted, self.__redeemed, self.__category)
+        self.__allocate(capacity)
+
+        for new, prev in zip((self.__date, self.__redeemed_dt, self.__price, self.__value,
+                              self.__deleted, self.__redeemed, self.__category), old):
+            new[:self.__size] = prev[:self.__size]
+
+    def __category_code(self, category):
+
+        """
+        Returns the interned code of a category, adding it if it's new
+        """
+
+        if category not in self.__category_codes:
+            self.__category_codes[category] = len(self.__categories)
+            self.__categories.append(category)
+
+        return self.__category_codes[category]
+
+    def __getstate__(self):
+
+        # only pickle the rows in use
+        state = self.__dict__.copy()
+        n = self.__size
+
+        for key in ("date", "redeemed_dt", "price", "value", "deleted", "redeemed", "category"):
+            attr = "_ColumnarWishlist__" + key
+            state[attr] = state[attr][:n].copy()
+
+        return state
+
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+        # leave room to append after loading
+        self.__grow(max(self.__size * 2, 1024))
+
+    def _get(self, row, key):
+
+        """
+        Reads a field of a row, converting it back to the dict representation
+        """
+
+        if key == "price":
+            return float(self.__price[row])
+        elif key == "value":
+            return int(self.__value[row])
+        elif key == "category":
+            return self.__categories[self.__category[row]]
+        elif key == "date":
+            return datetime.date.fromordinal(int(self.__date[row]))
+        elif key == "redeemed_dt":
+            return datetime.date.fromordinal(int(self.__redeemed_dt[row]))
+        elif key == "redeemed":
+            return "y" if self.__redeemed[row] else "n"
+        elif key == "del_ind":
+            return "y" if self.__deleted[row] else "n"
+
+        raise KeyError(key)
+
+    def _set(self, row, key, value):
+
+        """
+        Writes a field of a row from its dict representation
+        """
+
+        if key == "price":
+            self.__price[row] = value
+        elif key == "value":
+            self.__value[row] = value
+        elif key == "category":
+            self.__category[row] = self.__category_code(value)
+        elif key == "date":
+            self.__date[row] = value.toordinal()
+        elif key == "redeemed_dt":
+            self.__redeemed_dt[row] = value.toordinal()
+        elif key == "redeemed":
+            self.__redeemed[row] = value[0] == "y"
+        elif key == "del_ind":
+            self.__deleted[row] = value[0] == "y"
+        else:
+            raise KeyError(key)
+
+    def __len__(self):
+        return self.__size
+
+    def __contains__(self, item):
+        return item in self.__index
+
+    def __iter__(self):
+        return iter(self.__names)
+
+    def keys(self):
+        return self.__index.keys()
+
+    def values(self):
+        return (self.Row(self, row) for row in range(self.__size))
+
+    def items(self):
+        return ((name, self.Row(self, row)) for row, name in enumerate(self.__names))
+
+    def __getitem__(self, item):
+        return self.Row(self, self.__index[item])
+
+    def __setitem__(self, item, fields):
+
+        """
+        Adds a new item from an item dict, or overwrites an existing one
+        """
+
+        if item in self.__index:
+            row = self.__index[item]
+        else:
+            row = self.__size
+            self.__grow(row + 1)
+            self.__index[item] = row
+            self.__names.append(item)
+            self.__size += 1
+
+        for key in ("price", "category", "value", "date", "redeemed_dt", "redeemed", "del_ind"):
+            self._set(row, key, fields[key])
+
+    def __repr__(self):
+        return repr({name: row.to_dict() for name, row in self.items()})
+
+    def __masks(self, today):
+
+        """
+        Returns the active mask (counted towards today's totals) and the
+        redeemed mask (redeemed on or before today), the conditions of
+        Item.item_totals
+        """
+
+        n = self.__size
+        date = self.__date[:n]
+        redeemed_dt = self.__redeemed_dt[:n]
+        deleted = self.__deleted[:n]
+
+        active = (date <= today) & ~self.__redeemed[:n] & ~deleted
+        redeemed = (redeemed_dt > NOT_REDEEMED) & (redeemed_dt <= today) & ~deleted
+
+        return active, redeemed
+
+    def totals(self, today):
+
+        """
+        Vectorized version of Tracker.calc(). Takes today's date ordinal and
+        returns the points, wishlist points and cost.
+        """
+
+        n = self.__size
+        date = self.__date[:n]
+        redeemed_dt = self.__redeemed_dt[:n]
+        value = self.__value[:n]
+        active, redeemed = self.__masks(today)
+
+        points = int((today - date[active]).sum())
+        points += int(np.abs(redeemed_dt[redeemed] - date[redeemed]).sum())
+        points -= int(value[redeemed].sum())
+
+        return points, int(value[active].sum()), float(self.__price[:n][active].sum())
+
+    def aggregates(self):
+
+        """
+        Vectorized pass used by Tracker to rebuild its running aggregates.
+        Returns the active count, sum of active add date ordinals, active
+        value and price totals, redeemed points and latest date ordinal.
+        """
+
+        n = self.__size
+
+        if n == 0:
+            return 0, 0, 0, 0, 0, 0
+
+        date = self.__date[:n]
+        redeemed_dt = self.__redeemed_dt[:n]
+        value = self.__value[:n]
+        deleted = self.__deleted[:n]
+        active = ~self.__redeemed[:n] & ~deleted
+        redeemed = (redeemed_dt > NOT_REDEEMED) & ~deleted
+
+        redeemed_points = int(np.abs(redeemed_dt[redeemed] - date[redeemed]).sum()
+                              - value[redeemed].sum())
+        max_ord = max(int(date[active].max(initial = 0)),
+                      int(redeemed_dt[redeemed].max(initial = 0)),
+                      int(date[redeemed].max(initial = 0)))
+
+        return (int(active.sum()), int(date[active].sum()), int(value[active].sum()),
+                float(self.__price[:n][active].sum()), redeemed_points, max_ord)
+
+    def rows(self, only_active = "y"):
+
+        """
+        Returns the table rows for Tracker.view_wishlist, filtering with a
+        vectorized mask before any formatting is done
+        """
+
+        n = self.__size
+
+        if only_active == "y":
+            selected = np.flatnonzero(~self.__redeemed[:n] & ~self.__deleted[:n])
+        else:
+            selected = range(n)
+
+        formatted_wl = []
+
+        for row in selected:
+            row = int(row)
+            entry = (self.__names[row],
+                     datetime.date.fromordinal(int(self.__date[row])).strftime("%m/%d/%Y"),
+                     self.__categories[self.__category[row]],
+                     float(self.__price[row]), int(self.__value[row]))
+
+            if only_active != "y":
+                entry += ("y" if self.__deleted[row] else "n",
+                          "y" if self.__redeemed[row] else "n")
+
+            formatted_wl.append(entry)
+
+        return formatted_wl
@@ -0,0 +1,113 @@
+# import required packages
+
+import csv
+import itertools
+import json
+import time
+
+
+class Exporter():
+
+    """
+    Streams wishlist items from a tracker to a CSV or JSON Lines file. Rows
+    are produced lazily by Tracker.iter_rows and written chunk_size at a
+    time, so memory use stays flat no matter how large the wishlist is.
+    CSV files can be read back by the CSV importer, which takes the active
+    rows and skips the deleted and redeemed ones.
+    """
+
+    columns = ["item", "date", "category", "price", "value", "status", "redeemed_dt"]
+
+    def __init__(self, tracker, chunk_size = 10000):
+        self.tracker = tracker
+        self.chunk_size = chunk_size
+
+    def rows(self, **filters):
+
+        """
+        Generator of export rows as dicts. Takes the same filters as
+        Tracker.iter_rows (only_active, status, category, start, end).
+        """
+
+        for name, temp in self.tracker.iter_rows(**filters):
+            yield self.row(name, temp)
+
+    def row(self, name, temp):
+
+        """
+        Returns the export row dict of an item
+        """
+
+        status = self.tracker.status(temp)
+
+        return {"item": name, "date": temp["date"].strftime("%m/%d/%Y"),
+                "category": temp["category"], "price": float(temp["price"]),
+                "value": temp["value"], "status": status,
+                "redeemed_dt": temp["redeemed_dt"].strftime("%m/%d/%Y") if status == "redeemed" else ""}
+
+    def chunks(self, **filters):
+
+        """
+        Generator of lists of at most chunk_size export rows
+        """
+
+        rows = self.rows(**filters)
+
+        while True:
+
+            chunk = list(itertools.islice(rows, self.chunk_size))
+
+            if len(chunk) == 0:
+                break
+
+            yield chunk
+
+    def write_csv(self, path, **filters):
+
+        """
+        Writes the filtered wishlist to a CSV file. Returns the number of rows
+        written and the seconds taken.
+        """
+
+        start = time.perf_counter()
+        count = 0
+
+        with open(path, "w", newline = "", encoding = "utf-8") as f:
+
+            writer = csv.DictWriter(f, fieldnames = self.columns)
+            writer.writeheader()
+
+            for chunk in self.chunks(**filters):
+                writer.writerows(chunk)
+                count += len(chunk)
+
+        return count, time.perf_counter() - start
+
+    def write_jsonl(self, path, **filters):
+
+        """
+        Writes the filtered wishlist to a JSON Lines file, one item per line.
+        Returns the number of rows written and the seconds taken.
+        """
+
+        start = time.perf_counter()
+        count = 0
+
+        with open(path, "w", encoding = "utf-8") as f:
+
+            for chunk in self.chunks(**filters):
+                f.write("".join(json.dumps(row) + "\n" for row in chunk))
+                count += len(chunk)
+
+        return count, time.perf_counter() - start
+
+    def write(self, path, **filters):
+
+        """
+        Writes a .jsonl file as JSON Lines and anything else as CSV
+        """
+
+        if path.endswith(".jsonl"):
+            return self.write_jsonl(path, **filters)
+
+        return self.write_csv(path, **filters)
@@ -0,0 +1,115 @@
+"""
+File helpers shared by the stores: atomic writes and advisory locks, so
+several processes can save into the same data directory without leaving
+torn files or overwriting each other's updates.
+"""
+
+# import required packages
+
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # advisory locks need fcntl (not on Windows), without it only one
+    # process should use a data directory at a time
+    fcntl = None
+
+
+def atomic_write(path, write, mode = "wb"):
+
+    """
+    Writes a file by calling write(f) on a temp file next to it, syncing it
+    to disk and renaming it over path, so path only ever holds a complete
+    file. Returns the number of bytes written.
+    """
+
+    tmp = "{}.{}.{}.tmp".format(path, os.getpid(), threading.get_ident())
+
+    try:
+        with open(tmp, mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+
+        os.replace(tmp, path)
+
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    # make the rename itself durable
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY | os.O_DIRECTORY)
+
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    return size
+
+
+class FileLock():
+
+    """
+    Advisory lock on a lock file, used as a context manager. Shared locks
+    are for reading and exclusive locks for writing. The same process can
+    take a lock it already holds again (e.g. a save inside a locked load and
+    save); nested locks are released when the outermost one is.
+    """
+
+    # (thread, lock file path) to [file, exclusive, depth] for the locks held
+    # in this process; other threads queue on the lock like other processes
+    held = dict()
+
+    def __init__(self, path, shared = False):
+        self.path = path
+        self.shared = shared
+        self.key = None
+
+    def __enter__(self):
+
+        if fcntl is None:
+            return self
+
+        self.key = (threading.get_ident(), self.path)
+        entry = self.held.get(self.key)
+
+        if entry is not None:
+
+            if not self.shared and not entry[1]:
+                raise RuntimeError("Can't take an exclusive lock while holding a shared one: " + self.path)
+
+            entry[2] += 1
+            return self
+
+        f = open(self.path, "a+b")
+
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        except BaseException:
+            f.close()
+            raise
+
+        self.held[self.key] = [f, not self.shared, 1]
+
+        return self
+
+    def __exit__(self, *exc):
+
+        if fcntl is None:
+            return False
+
+        entry = self.held[self.key]
+        entry[2] -= 1
+
+        if entry[2] == 0:
+            del self.held[self.key]
+            fcntl.flock(entry[0].fileno(), fcntl.LOCK_UN)
+            entry[0].close()
+
+        return False
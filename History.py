@@ -0,0 +1,184 @@
+# import required packages
+
+from Item import item_events, item_fields
+import datetime
+
+
+class Fenwick():
+
+    """
+    Fenwick (binary indexed) tree over a fixed number of slots, for adding to
+    a slot and summing a prefix of slots in O(log n)
+    """
+
+    def __init__(self, values):
+
+        # linear time build from the slot values
+        self.tree = [0] + list(values)
+
+        for i in range(1, len(self.tree)):
+
+            parent = i + (i & -i)
+
+            if parent < len(self.tree):
+                self.tree[parent] += self.tree[i]
+
+    def __len__(self):
+        return len(self.tree) - 1
+
+    def add(self, i, delta):
+
+        i += 1
+
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i):
+
+        """
+        Returns the sum of slots 0 to i (inclusive)
+        """
+
+        total = 0
+        i = min(i + 1, len(self.tree) - 1)
+
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+
+        return total
+
+    def values(self):
+
+        """
+        Returns the slot values, undoing the build
+        """
+
+        values = list(self.tree)
+
+        for i in range(len(values) - 1, 0, -1):
+
+            parent = i + (i & -i)
+
+            if parent < len(values):
+                values[parent] -= values[i]
+
+        return values[1:]
+
+
+class PointHistory():
+
+    """
+    Points balance on any date, from the add and redeem dates of the items.
+
+    An item added on day a earns a point a day until it's redeemed on day r,
+    when its value is taken off, so on day D the balance is
+
+        points(D) = D * C(D) - S(D) + K(D)
+
+    where C(D) is the number of items earning points on D, S(D) the sum of
+    their add days and K(D) the net points of the items redeemed by D. Each of
+    those is a prefix sum over per-day changes, kept in a Fenwick tree
+    indexed by days since base, so both a balance and an item change cost
+    O(log days). Deleted items never count, the same as in Tracker.calc.
+    """
+
+    def __init__(self, items = ()):
+
+        # per-day changes to C, S and K, keyed by date ordinal
+        count, ords, net = dict(), dict(), dict()
+
+        for name, temp in items:
+
+            for day, dc, ds, dk in self.events(temp):
+                count[day] = count.get(day, 0) + dc
+                ords[day] = ords.get(day, 0) + ds
+                net[day] = net.get(day, 0) + dk
+
+        days = list(count) or [datetime.date.today().toordinal()]
+        self.__build(min(days), max(days) - min(days) + 1, count, ords, net)
+
+    def __build(self, base, size, count, ords, net):
+
+        self.base = base
+        self.count = Fenwick(count.get(base + i, 0) for i in range(size))
+        self.ords = Fenwick(ords.get(base + i, 0) for i in range(size))
+        self.net = Fenwick(net.get(base + i, 0) for i in range(size))
+
+    @staticmethod
+    def events(temp):
+
+        """
+        Returns the (day ordinal, change to C, change to S, change to K)
+        events for an item dict (see Item.item_events)
+        """
+
+        date_ord, redeemed_ord, value, price, flags = item_fields(temp)
+
+        return item_events(date_ord, redeemed_ord, value, flags)
+
+    def __grow(self, day):
+
+        """
+        Widens the day range to take in day, at least doubling it so a run of
+        new days doesn't rebuild every time
+        """
+
+        size = len(self.count)
+        low, high = self.base, self.base + size
+
+        if day < low:
+            low = day - size
+        else:
+            high = day + size + 1
+
+        shifted = []
+
+        for tree in (self.count, self.ords, self.net):
+            shifted.append({self.base + i: v for i, v in enumerate(tree.values()) if v != 0})
+
+        self.__build(low, high - low, *shifted)
+
+    def __change(self, temp, sign):
+
+        for day, dc, ds, dk in self.events(temp):
+
+            if day < self.base or day >= self.base + len(self.count):
+                self.__grow(day)
+
+            i = day - self.base
+            self.count.add(i, sign * dc)
+            self.ords.add(i, sign * ds)
+            self.net.add(i, sign * dk)
+
+    def add(self, name, temp):
+        self.__change(temp, 1)
+
+    def remove(self, name, temp):
+        self.__change(temp, -1)
+
+    def points_on(self, date):
+
+        """
+        Returns the points balance at the end of date
+        """
+
+        day = date.toordinal()
+
+        if day < self.base:
+            return 0
+
+        i = day - self.base
+
+        return day * self.count.prefix(i) - self.ords.prefix(i) + self.net.prefix(i)
+
+    def series(self, start, end, step = 1):
+
+        """
+        Returns (date, points) pairs from start to end (inclusive) every step days
+        """
+
+        days = range(start.toordinal(), end.toordinal() + 1, step)
+
+        return [(datetime.date.fromordinal(day), self.points_on(datetime.date.fromordinal(day))) for day in days]
@@ -0,0 +1,131 @@
+# import required packages
+
+import csv
+import itertools
+import time
+from Validation import parse_category, parse_date, parse_price, parse_value
+
+
+class CsvImporter():
+
+    """
+    Streams wishlist items from a CSV file into a tracker. The file needs
+    item, price, category and value columns and may have a date column
+    (MM/DD/YYYY, blank for today) and a status column. Rows with a status
+    other than active (e.g. deleted or redeemed items in an Exporter file)
+    are skipped and reported. Rows are checked with the same rules as
+    the interactive prompts and added in chunks with Tracker.add_items, so
+    memory use doesn't depend on the size of the file.
+    """
+
+    columns = ("item", "price", "category", "value")
+
+    def __init__(self, tracker, chunk_size = 10000, max_errors = 1000):
+        self.tracker = tracker
+        self.chunk_size = chunk_size
+        # only the first max_errors row errors are kept, the rest are counted
+        self.max_errors = max_errors
+
+    class MissingColumns(Exception):
+
+        """
+        Raised when the CSV file doesn't have the required columns
+        """
+
+        def __init__(self, item, message = "Unable to import. CSV file is missing required columns."):
+            self.item = item
+            self.message = message
+            super().__init__(self.message)
+
+        def __str__(self):
+
+            return "{} --> {}".format(self.item, self.message)
+
+    def rows(self, f, errors):
+
+        """
+        Generator of (line number, (item, price, category, value, date))
+        pairs from an open CSV file. Invalid rows are skipped and (line
+        number, message) pairs are added to errors.
+        """
+
+        reader = csv.DictReader(f)
+        missing = [c for c in self.columns if c not in (reader.fieldnames or [])]
+
+        if len(missing) > 0:
+            raise self.MissingColumns(", ".join(missing))
+
+        for row in reader:
+
+            try:
+                item = row["item"].strip()
+
+                if item == "":
+                    raise ValueError("Item name is blank.")
+
+                status = (row.get("status") or "").strip()
+
+                # deleted and redeemed items would come back as active ones
+                if status not in ("", "active"):
+                    raise ValueError("{} is {}, only active items are imported.".format(item, status))
+
+                date = row.get("date") or ""
+                date = parse_date(date.strip()) if date.strip() != "" else None
+
+                yield reader.line_num, (item, parse_price(row["price"]), parse_category(row["category"].strip()),
+                                        parse_value(row["value"]), date)
+
+            except (ValueError, AttributeError) as e:
+                errors.append((reader.line_num, str(e)))
+
+    def run(self, path):
+
+        """
+        Imports a CSV file and returns a report dict with the rows read,
+        items added, errors as (line number, message) pairs, the number of
+        errors, seconds taken and rows per second. Files that aren't UTF-8
+        raise UnicodeDecodeError and malformed ones csv.Error.
+        """
+
+        start = time.perf_counter()
+        errors = []
+        error_count = 0
+        added = 0
+        read = 0
+        # errors found while reading the current chunk
+        found = []
+
+        # utf-8-sig drops the byte order mark Excel writes at the start
+        with open(path, "r", newline = "", encoding = "utf-8-sig") as f:
+
+            rows = self.rows(f, found)
+
+            while True:
+
+                chunk = list(itertools.islice(rows, self.chunk_size))
+                seen = set()
+
+                # the rows add_items will skip, found first to give their line numbers
+                for line, row in chunk:
+
+                    if row[0] in seen or self.tracker.is_in_wishlist(row[0]):
+                        found.append((line, "{} is already in the wishlist.".format(row[0])))
+
+                    seen.add(row[0])
+
+                chunk_added, skipped = self.tracker.add_items(row for line, row in chunk)
+                added += chunk_added
+
+                read += len(chunk) + len(found) - len(skipped)
+                found.sort()
+                error_count += len(found)
+                errors += found[:max(self.max_errors - len(errors), 0)]
+                found.clear()
+
+                if len(chunk) == 0:
+                    break
+
+        seconds = time.perf_counter() - start
+
+        return {"rows": read, "added": added, "errors": errors, "error_count": error_count,
+                "seconds": seconds, "rows_per_sec": read / seconds if seconds > 0 else 0}
@@ -0,0 +1,120 @@
+# import required packages
+
+from Item import NOT_REDEEMED, item_status
+import bisect
+
+
+class SecondaryIndex():
+
+    """
+    Secondary indexes over a wishlist: category to names, status (active,
+    deleted, redeemed) to names, and add dates and redeemed dates kept as
+    sorted (date ordinal, name) lists searched with bisect. Kept up to date
+    by calling remove() before an item changes and add() after.
+    """
+
+    def __init__(self, items = ()):
+
+        self.by_category = dict()
+        self.by_status = {"active": set(), "deleted": set(), "redeemed": set()}
+        self.by_date = []
+        self.by_redeemed_dt = []
+
+        # build the sorted lists in one go instead of inserting one at a time
+        for name, temp in items:
+            self.by_category.setdefault(temp["category"], set()).add(name)
+            self.by_status[item_status(temp)].add(name)
+            self.by_date.append((temp["date"].toordinal(), name))
+
+            if temp["redeemed_dt"].toordinal() > NOT_REDEEMED:
+                self.by_redeemed_dt.append((temp["redeemed_dt"].toordinal(), name))
+
+        self.by_date.sort()
+        self.by_redeemed_dt.sort()
+
+    def add(self, name, temp):
+
+        self.by_category.setdefault(temp["category"], set()).add(name)
+        self.by_status[item_status(temp)].add(name)
+        bisect.insort(self.by_date, (temp["date"].toordinal(), name))
+
+        if temp["redeemed_dt"].toordinal() > NOT_REDEEMED:
+            bisect.insort(self.by_redeemed_dt, (temp["redeemed_dt"].toordinal(), name))
+
+    def remove(self, name, temp):
+
+        names = self.by_category.get(temp["category"])
+
+        if names is not None:
+            names.discard(name)
+
+            if len(names) == 0:
+                del self.by_category[temp["category"]]
+
+        self.by_status[item_status(temp)].discard(name)
+        self.__remove_sorted(self.by_date, (temp["date"].toordinal(), name))
+        self.__remove_sorted(self.by_redeemed_dt, (temp["redeemed_dt"].toordinal(), name))
+
+    @staticmethod
+    def __remove_sorted(entries, entry):
+
+        i = bisect.bisect_left(entries, entry)
+
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+
+    def query(self, category = None, status = None, start = None, end = None, date_field = "date"):
+
+        """
+        Returns the names matching all the filters given. start and end are
+        inclusive dates on the add date, or on the redeemed date if
+        date_field is "redeemed_dt". The smallest index that applies is
+        used to pick candidates, so the cost follows the result size.
+        """
+
+        candidates = []
+
+        if start is not None or end is not None:
+
+            entries = self.by_date if date_field == "date" else self.by_redeemed_dt
+            low = 0 if start is None else bisect.bisect_left(entries, (start.toordinal(),))
+            high = len(entries) if end is None else bisect.bisect_left(entries, (end.toordinal() + 1,))
+            candidates.append([name for ordinal, name in entries[low:high]])
+
+        if category is not None:
+            candidates.append(self.by_category.get(category, set()))
+
+        if status is not None:
+            candidates.append(self.by_status.get(status, set()))
+
+        if len(candidates) == 0:
+            return [name for ordinal, name in self.by_date]
+
+        candidates.sort(key = len)
+        others = [c if isinstance(c, set) else set(c) for c in candidates[1:]]
+
+        return [name for name in candidates[0] if all(name in c for c in others)]
+
+    def check(self, items):
+
+        """
+        Compares the indexes with a fresh build from (name, item dict) pairs
+        and returns a list of the differences found
+        """
+
+        fresh = SecondaryIndex(items)
+        problems = []
+
+        if {k: v for k, v in self.by_category.items() if v} != fresh.by_category:
+            problems.append("category index out of sync")
+
+        if self.by_status != fresh.by_status:
+            problems.append("status index out of sync")
+
+        if self.by_date != fresh.by_date:
+            problems.append("add date index out of sync")
+
+        if self.by_redeemed_dt != fresh.by_redeemed_dt:
+            problems.append("redeemed date index out of sync")
+
+        return problems
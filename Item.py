@@ -0,0 +1,373 @@
+# import required packages
+
+import datetime
+import math
+
+# placeholder redeemed date of items that haven't been redeemed, and its ordinal
+NOT_REDEEMED_DATE = datetime.date(1900, 1, 1)
+NOT_REDEEMED = NOT_REDEEMED_DATE.toordinal()
+
+# status bits of WishlistItem.flags
+DELETED = 1
+REDEEMED = 2
+
+
+# The rules for what one item counts towards the totals. Every wishlist
+# backend uses these: the ones that go item by item call them, and Columnar
+# and SqliteStore, which work on whole columns, apply the same conditions and
+# are compared against them by check_hooks(). Items are passed as fields: add
+# date ordinal, redeemed date ordinal, value, price and status flags.
+
+def item_flags(temp):
+
+    """
+    Returns the status flags of an item dict
+    """
+
+    return (DELETED if temp["del_ind"][0] == "y" else 0) | (REDEEMED if temp["redeemed"][0] == "y" else 0)
+
+
+def item_fields(temp):
+
+    """
+    Returns the (add date ordinal, redeemed date ordinal, value, price,
+    flags) of an item dict or record
+    """
+
+    if isinstance(temp, WishlistItem):
+        return temp.date_ord, temp.redeemed_ord, temp.value, temp.price, temp.flags
+
+    return (temp["date"].toordinal(), temp["redeemed_dt"].toordinal(), temp["value"], temp["price"],
+            item_flags(temp))
+
+
+def item_status(temp):
+
+    """
+    Returns the status of an item dict: active, deleted or redeemed
+    """
+
+    if temp["del_ind"][0] == "y":
+        return "deleted"
+
+    if temp["redeemed"][0] == "y":
+        return "redeemed"
+
+    return "active"
+
+
+def item_totals(date_ord, redeemed_ord, value, price, flags, today):
+
+    """
+    Returns what an item adds to Tracker.calc()'s points, wishlist points and
+    cost on day today. An active item added by today earns a point a day and
+    counts its value and price; once redeemed (by today) it counts the days
+    held less its value. Deleted items count for nothing.
+    """
+
+    if flags & DELETED:
+        return 0, 0, 0
+
+    points = wl_points = cost = 0
+
+    if date_ord <= today and not flags & REDEEMED:
+        points, wl_points, cost = today - date_ord, value, price
+
+    if NOT_REDEEMED < redeemed_ord <= today:
+        points += abs(redeemed_ord - date_ord) - value
+
+    return points, wl_points, cost
+
+
+def item_aggregates(date_ord, redeemed_ord, value, price, flags):
+
+    """
+    Returns what an item adds to Tracker's running aggregates: active count,
+    add date ordinal, value and price (all while active), redeemed points and
+    the latest date ordinal involved
+    """
+
+    if flags & DELETED:
+        return 0, 0, 0, 0, 0, 0
+
+    count = ord_sum = active_value = active_price = redeemed_points = max_ord = 0
+
+    if not flags & REDEEMED:
+        count, ord_sum, active_value, active_price, max_ord = 1, date_ord, value, price, date_ord
+
+    if redeemed_ord > NOT_REDEEMED:
+        redeemed_points = abs(redeemed_ord - date_ord) - value
+        max_ord = max(max_ord, redeemed_ord, date_ord)
+
+    return count, ord_sum, active_value, active_price, redeemed_points, max_ord
+
+
+def item_events(date_ord, redeemed_ord, value, flags):
+
+    """
+    Returns the (day ordinal, change to C, change to S, change to K) events
+    of an item for PointHistory. It earns from its add date, until its
+    redeemed date if there is one, when the days held less its value are
+    added. Deleted items have none.
+    """
+
+    if flags & DELETED:
+        return []
+
+    events = []
+
+    if not flags & REDEEMED:
+        events.append((date_ord, 1, date_ord, 0))
+
+    elif date_ord < redeemed_ord:
+        events += [(date_ord, 1, date_ord, 0), (redeemed_ord, -1, -date_ord, 0)]
+
+    if redeemed_ord > NOT_REDEEMED:
+        events.append((redeemed_ord, 0, 0, abs(redeemed_ord - date_ord) - value))
+
+    return events
+
+
+def check_hooks(wishlist, today):
+
+    """
+    Returns the names of a wishlist's totals() and aggregates() hooks that
+    don't agree with the item rules above, for backends that compute them
+    their own way (e.g. in NumPy or SQL)
+    """
+
+    totals = [0, 0, 0]
+    aggregates = [0, 0, 0, 0, 0, 0]
+
+    for temp in wishlist.values():
+
+        fields = item_fields(temp)
+
+        for i, v in enumerate(item_totals(*fields, today)):
+            totals[i] += v
+
+        for i, v in enumerate(item_aggregates(*fields)):
+            aggregates[i] = max(aggregates[i], v) if i == 5 else aggregates[i] + v
+
+    def agrees(got, expected):
+        return all(math.isclose(g, e, abs_tol = 1e-6) for g, e in zip(got, expected))
+
+    problems = []
+
+    if hasattr(wishlist, "totals") and not agrees(wishlist.totals(today), totals):
+        problems.append("totals")
+
+    if hasattr(wishlist, "aggregates") and not agrees(wishlist.aggregates(), aggregates):
+        problems.append("aggregates")
+
+    return problems
+
+
+class WishlistItem():
+
+    """
+    Compact record for one wishlist item. Dates are kept as day ordinals,
+    the deleted and redeemed "y"/"n" fields as bits of flags, and the
+    category as an id into a table shared by all items, in __slots__ rather
+    than a dict.
+
+    Indexing with the keys of the old item dicts ("price", "category",
+    "value", "date", "redeemed_dt", "redeemed", "del_ind") reads and writes
+    the same values those dicts held, so code written against them keeps
+    working.
+    """
+
+    __slots__ = ("price", "value", "date_ord", "redeemed_ord", "flags", "category_id")
+
+    # interned categories, shared by every item
+    categories = []
+    category_ids = dict()
+
+    def __init__(self, price, category, value, date_ord, redeemed_ord = NOT_REDEEMED, flags = 0):
+        self.price = price
+        self.value = value
+        self.date_ord = date_ord
+        self.redeemed_ord = redeemed_ord
+        self.flags = flags
+        self.category_id = self.intern(category)
+
+    @classmethod
+    def intern(cls, category):
+
+        """
+        Returns the id of a category, adding it to the table if it's new
+        """
+
+        category_id = cls.category_ids.get(category)
+
+        if category_id is None:
+            category_id = cls.category_ids[category] = len(cls.categories)
+            cls.categories.append(category)
+
+        return category_id
+
+    @classmethod
+    def from_fields(cls, fields):
+
+        """
+        Makes a record from an item dict (or a copy of another record)
+        """
+
+        if isinstance(fields, cls):
+            return cls(fields.price, fields.categories[fields.category_id], fields.value,
+                       fields.date_ord, fields.redeemed_ord, fields.flags)
+
+        return cls(fields["price"], fields["category"], fields["value"], fields["date"].toordinal(),
+                   fields["redeemed_dt"].toordinal(), item_flags(fields))
+
+    def __reduce__(self):
+        # pickled with the category name, since ids differ between processes
+        return (WishlistItem, (self.price, self.categories[self.category_id], self.value,
+                               self.date_ord, self.redeemed_ord, self.flags))
+
+    def __getitem__(self, key):
+
+        if key == "redeemed":
+            return "y" if self.flags & REDEEMED else "n"
+        elif key == "del_ind":
+            return "y" if self.flags & DELETED else "n"
+        elif key == "date":
+            return datetime.date.fromordinal(self.date_ord)
+        elif key == "value":
+            return self.value
+        elif key == "price":
+            return self.price
+        elif key == "category":
+            return self.categories[self.category_id]
+        elif key == "redeemed_dt":
+            return datetime.date.fromordinal(self.redeemed_ord)
+
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+
+        if key == "redeemed":
+            self.flags = self.flags | REDEEMED if value[0] == "y" else self.flags & ~REDEEMED
+        elif key == "del_ind":
+            self.flags = self.flags | DELETED if value[0] == "y" else self.flags & ~DELETED
+        elif key == "date":
+            self.date_ord = value.toordinal()
+        elif key == "value":
+            self.value = value
+        elif key == "price":
+            self.price = value
+        elif key == "category":
+            self.category_id = self.intern(value)
+        elif key == "redeemed_dt":
+            self.redeemed_ord = value.toordinal()
+        else:
+            raise KeyError(key)
+
+    def get(self, key, default = None):
+
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return ["price", "category", "value", "date", "redeemed_dt", "redeemed", "del_ind"]
+
+    def to_dict(self):
+        return {k: self[k] for k in self.keys()}
+
+    def __eq__(self, other):
+
+        if isinstance(other, (WishlistItem, dict)):
+            return self.to_dict() == (other.to_dict() if isinstance(other, WishlistItem) else other)
+
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+class Wishlist(dict):
+
+    """
+    Default Tracker wishlist: a dict of item names to WishlistItem records.
+    Provides the totals(), aggregates() and rows() hooks Tracker looks for,
+    working on the record fields directly.
+    """
+
+    @classmethod
+    def upgrade(cls, wishlist):
+
+        """
+        Returns a plain dict of item dicts (e.g. from an older pickle) as a
+        Wishlist of records. Other wishlist types are returned unchanged.
+        """
+
+        if type(wishlist) is not dict:
+            return wishlist
+
+        return cls((name, WishlistItem.from_fields(fields)) for name, fields in wishlist.items())
+
+    def totals(self, today):
+
+        """
+        Tracker.calc() over the records. Takes today's date ordinal and
+        returns the points, wishlist points and cost.
+        """
+
+        points = 0
+        wl_points = 0
+        cost = 0
+
+        for temp in self.values():
+            p, w, c = item_totals(temp.date_ord, temp.redeemed_ord, temp.value, temp.price, temp.flags, today)
+            points += p
+            wl_points += w
+            cost += c
+
+        return points, wl_points, cost
+
+    def aggregates(self):
+
+        """
+        Pass used by Tracker to rebuild its running aggregates. Returns the
+        active count, sum of active add date ordinals, active value and price
+        totals, redeemed points and latest date ordinal.
+        """
+
+        count = ord_sum = value = price = redeemed_points = max_ord = 0
+
+        for temp in self.values():
+            c, o, v, p, r, m = item_aggregates(temp.date_ord, temp.redeemed_ord, temp.value, temp.price, temp.flags)
+            count += c
+            ord_sum += o
+            value += v
+            price += p
+            redeemed_points += r
+            max_ord = max(max_ord, m)
+
+        return count, ord_sum, value, price, redeemed_points, max_ord
+
+    def rows(self, only_active = "y"):
+
+        """
+        Returns the table rows for Tracker.view_wishlist
+        """
+
+        categories = WishlistItem.categories
+        formatted_wl = []
+
+        for name, temp in self.items():
+
+            if only_active == "y" and temp.flags & (DELETED | REDEEMED):
+                continue
+
+            entry = (name, datetime.date.fromordinal(temp.date_ord).strftime("%m/%d/%Y"),
+                     categories[temp.category_id], float(temp.price), temp.value)
+
+            if only_active != "y":
+                entry += ("y" if temp.flags & DELETED else "n", "y" if temp.flags & REDEEMED else "n")
+
+            formatted_wl.append(entry)
+
+        return formatted_wl
@@ -0,0 +1,247 @@
+# import required packages
+
+import datetime
+import json
+import logging
+import os
+import Metrics
+from Item import NOT_REDEEMED_DATE
+
+logger = logging.getLogger(__name__)
+
+
+class Journal():
+
+    """
+    Append-only log of the changes made to a user's tracker. Each change is
+    written as one compact JSON line tagged with its sequence number, so a
+    save only costs the changes made since the last save. Loading a tracker
+    is the latest snapshot (checkpoint) plus a replay of the journal.
+    """
+
+    # keys of an item dict that hold dates, stored as ordinals
+    date_keys = ("date", "redeemed_dt")
+
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def encode(cls, seq, op):
+
+        """
+        Turns a (sequence number, change) pair from Tracker.pop_changes()
+        into a JSON compatible list
+        """
+
+        action, item = op[0], op[1]
+
+        if action == "add":
+            fields = op[2]
+            return [seq, "a", item, fields["price"], fields["category"], fields["value"],
+                    fields["date"].toordinal()]
+
+        elif action == "update":
+            update = op[3].toordinal() if op[2] in cls.date_keys else op[3]
+            return [seq, "u", item, op[2], update]
+
+        elif action == "delete":
+            return [seq, "d", item]
+
+        elif action == "redeem":
+            return [seq, "r", item, op[2].toordinal()]
+
+        raise ValueError("Unknown change: {}".format(action))
+
+    @classmethod
+    def decode(cls, record):
+
+        """
+        Turns a journal record back into a (sequence number, change) pair
+        """
+
+        seq, action, item = record[0], record[1], record[2]
+
+        if action == "a":
+            return seq, ("add", item, {"price": record[3], "category": record[4],
+                                       "value": record[5],
+                                       "date": datetime.date.fromordinal(record[6]),
+                                       "redeemed_dt": NOT_REDEEMED_DATE,
+                                       "redeemed": "n", "del_ind": "n"})
+
+        elif action == "u":
+            update = datetime.date.fromordinal(record[4]) if record[3] in cls.date_keys else record[4]
+            return seq, ("update", item, record[3], update)
+
+        elif action == "d":
+            return seq, ("delete", item)
+
+        elif action == "r":
+            return seq, ("redeem", item, datetime.date.fromordinal(record[3]))
+
+        raise ValueError("Unknown journal record: {}".format(action))
+
+    def append(self, changes):
+
+        """
+        Appends the changes to the journal and syncs them to disk once for
+        the whole batch. Returns the number of bytes written.
+        """
+
+        if len(changes) == 0:
+            return 0
+
+        lines = "".join(json.dumps(self.encode(seq, op), separators = (",", ":")) + "\n"
+                        for seq, op in changes).encode("utf-8")
+
+        with open(self.path, "a+b") as f:
+
+            end = f.seek(0, os.SEEK_END)
+
+            if end > 0:
+
+                f.seek(end - 1)
+
+                if f.read(1) != b"\n":
+                    # a save that crashed part way left a torn last line, which
+                    # the new lines mustn't be glued onto
+                    self.drop_torn_line(f, end)
+
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+        Metrics.add_bytes("journal", written = len(lines))
+
+        return len(lines)
+
+    def drop_torn_line(self, f, end):
+
+        """
+        Truncates an open journal file to just after its last newline
+        """
+
+        block = 4096
+        keep = 0
+
+        while end > 0:
+
+            start = max(end - block, 0)
+            f.seek(start)
+            found = f.read(end - start).rfind(b"\n")
+
+            if found >= 0:
+                keep = start + found + 1
+                break
+
+            end = start
+
+        logger.warning("Journal %s ended in an incomplete change; dropping it", self.path)
+        f.truncate(keep)
+
+    def read(self):
+
+        """
+        Yields the (sequence number, change) pairs in the journal. Lines that
+        are incomplete (e.g. from a crash in the middle of a save) or don't
+        decode are skipped with a warning.
+        """
+
+        if not os.path.isfile(self.path):
+            return
+
+        with open(self.path, "r", encoding = "utf-8", errors = "replace") as f:
+
+            Metrics.add_bytes("journal", read = os.fstat(f.fileno()).st_size)
+
+            for number, line in enumerate(f, 1):
+
+                try:
+                    if not line.endswith("\n"):
+                        raise ValueError("incomplete line")
+
+                    change = self.decode(json.loads(line))
+
+                except (ValueError, IndexError, KeyError, TypeError) as e:
+                    logger.warning("Skipping line %d of journal %s: %s", number, self.path, e)
+                    continue
+
+                yield change
+
+    def last_seq(self):
+
+        """
+        Returns the sequence number of the last complete change in the
+        journal, or None if it has none. Reads back from the end of the file
+        rather than replaying the whole journal.
+        """
+
+        if not os.path.isfile(self.path):
+            return None
+
+        with open(self.path, "rb") as f:
+
+            end = f.seek(0, os.SEEK_END)
+            block = 4096
+
+            while True:
+
+                start = max(end - block, 0)
+                f.seek(start)
+                lines = f.read(end - start).split(b"\n")
+                # the piece after the last newline is empty or torn, and the
+                # first piece may be the end of a line that started earlier
+                complete = lines[:-1] if start == 0 else lines[1:-1]
+
+                for line in reversed(complete):
+                    try:
+                        return json.loads(line)[0]
+                    except (ValueError, IndexError, KeyError, TypeError):
+                        continue
+
+                if start == 0:
+                    return None
+
+                block *= 4
+
+    def replay(self, tracker):
+
+        """
+        Applies the journal changes the tracker doesn't have yet and returns
+        how many were applied. The changes must be numbered in increasing
+        order; if one isn't (e.g. two processes saved from the same starting
+        point), it and everything after it are left out, with a warning,
+        rather than applied on top of changes they weren't made against.
+        """
+
+        changes = []
+
+        for seq, op in self.read():
+
+            if len(changes) > 0 and seq <= changes[-1][0]:
+                logger.warning("Journal %s has change %d after change %d; ignoring it and the changes after it",
+                               self.path, seq, changes[-1][0])
+                break
+
+            changes.append((seq, op))
+
+        count = 0
+
+        for seq, op in changes:
+
+            if seq > tracker.last_seq():
+                tracker.replay(seq, op)
+                count += 1
+
+        tracker.refresh()
+
+        return count
+
+    def truncate(self):
+
+        """
+        Empties the journal once its changes are covered by a checkpoint
+        """
+
+        with open(self.path, "w", encoding = "utf-8") as f:
+            f.flush()
+            os.fsync(f.fileno())
@@ -0,0 +1,166 @@
+"""
+Load test for Server.py over localhost, e.g.
+
+    python Server.py --port 8080 &
+    python LoadTest.py --port 8080 --clients 50 --requests 200
+
+or with --spawn to start a server on a throwaway data directory. Each
+client keeps one connection open and sends a mix of reads (view_wishlist,
+search_wishlist, calc) and writes (add_item, update_item) for a random
+user. Reports requests per second and latency percentiles.
+"""
+
+# import required packages
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+async def request(reader, writer, endpoint, body):
+
+    """
+    Sends one POST on an open connection and returns the status and reply
+    """
+
+    data = json.dumps(body).encode("utf-8")
+    writer.write("POST /{} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n".format(
+        endpoint, len(data)).encode("latin-1") + data)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+
+    while True:
+
+        line = await reader.readline()
+
+        if line in (b"\r\n", b""):
+            break
+
+        key, _, value = line.decode("latin-1").partition(":")
+
+        if key.strip().lower() == "content-length":
+            length = int(value)
+
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def client(host, port, number, users, requests, write_ratio, latencies, statuses):
+
+    rng = random.Random(number)
+    reader, writer = await asyncio.open_connection(host, port)
+
+    for i in range(requests):
+
+        username = rng.choice(users)
+
+        if rng.random() < write_ratio:
+            if rng.random() < 0.5:
+                endpoint, body = "add_item", {"username": username, "item": "item_{}_{}".format(number, i),
+                                              "price": 9.99, "category": "Books", "value": 100}
+            else:
+                endpoint, body = "update_item", {"username": username, "item": "item_0",
+                                                 "field": "price", "value": round(rng.uniform(1, 100), 2)}
+        else:
+            endpoint, body = rng.choice([("view_wishlist", {"username": username, "limit": 20}),
+                                         ("search_wishlist", {"username": username, "item": "itme_1"}),
+                                         ("calc", {"username": username})])
+
+        start = time.perf_counter()
+        status, reply = await request(reader, writer, endpoint, body)
+        latencies.append(time.perf_counter() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+
+    writer.close()
+
+
+async def run(host = "127.0.0.1", port = 8080, clients = 50, requests = 200, users = 20, write_ratio = 0.2, items = 100):
+
+    """
+    Creates users (with items to read) if they don't exist yet, then runs
+    the clients concurrently and returns a report dict
+    """
+
+    names = ["loadtest_" + str(u) for u in range(users)]
+    reader, writer = await asyncio.open_connection(host, port)
+
+    for username in names:
+
+        status, reply = await request(reader, writer, "create", {"username": username})
+
+        if status == 200:
+            for i in range(items):
+                await request(reader, writer, "add_item", {"username": username, "item": "item_" + str(i),
+                                                           "price": 5, "category": "Other", "value": 100})
+
+    writer.close()
+
+    latencies = []
+    statuses = dict()
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, c, names, requests, write_ratio, latencies, statuses) for c in range(clients)))
+    seconds = time.perf_counter() - start
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(int(len(latencies) * p), len(latencies) - 1)]
+
+    return {"requests": len(latencies), "seconds": seconds, "requests_per_sec": len(latencies) / seconds,
+            "p50_ms": percentile(0.5) * 1000, "p99_ms": percentile(0.99) * 1000,
+            "max_ms": latencies[-1] * 1000, "statuses": statuses}
+
+
+async def wait_for(host, port, timeout = 10):
+
+    deadline = time.monotonic() + timeout
+
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Load test the tracker HTTP/JSON server")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8080)
+    parser.add_argument("--clients", type = int, default = 50, help = "concurrent connections")
+    parser.add_argument("--requests", type = int, default = 200, help = "requests per client")
+    parser.add_argument("--users", type = int, default = 20)
+    parser.add_argument("--write-ratio", type = float, default = 0.2, help = "share of requests that change a tracker")
+    parser.add_argument("--spawn", action = "store_true", help = "start a server on a temporary data directory")
+    args = parser.parse_args()
+
+    server = None
+
+    if args.spawn:
+        data = tempfile.mkdtemp()
+        server = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Server.py"),
+                                   "--data", data, "--host", args.host, "--port", str(args.port)])
+
+    try:
+        asyncio.run(wait_for(args.host, args.port))
+        report = asyncio.run(run(args.host, args.port, args.clients, args.requests, args.users, args.write_ratio))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+            shutil.rmtree(data, ignore_errors = True)
+
+    print("{} requests in {:.2f}s: {:.0f} requests/sec".format(report["requests"], report["seconds"], report["requests_per_sec"]))
+    print("latency p50 {:.1f}ms  p99 {:.1f}ms  max {:.1f}ms".format(report["p50_ms"], report["p99_ms"], report["max_ms"]))
+    print("statuses:", report["statuses"])
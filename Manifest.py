@@ -0,0 +1,375 @@
+# import required packages
+
+import datetime
+import json
+import os
+import time
+from urllib.parse import quote, unquote
+from Files import FileLock, atomic_write
+
+
+class Manifest():
+
+    """
+    Index of the latest snapshot files in the data directory. Maps each
+    username to its latest tracker snapshot (path, size and timestamp) and
+    keeps the latest tracker_names file, so finding them doesn't need a
+    listing and a ctime check of every file ever saved.
+
+    Each user's snapshots and journal live in their own directory,
+    data/users/<username>/, so a user's files are found by exact lookup no
+    matter how many other users or snapshots there are. Data directories
+    from before this layout are migrated the first time they're loaded.
+
+    If the manifest file is missing, unreadable or points at a file that no
+    longer exists, it is rebuilt with a scan of the data directory (or of
+    just the user's directory for a single stale user).
+
+    Changes are made under a lock on data/manifest.lock and re-read the
+    file first, so processes sharing the data directory don't overwrite
+    each other's entries.
+    """
+
+    # version of the data directory layout
+    layout = 2
+
+    def __init__(self, root = "data"):
+        self.root = root
+        self.path = os.path.join(root, "manifest.json")
+        self.lock_path = os.path.join(root, "manifest.lock")
+        self.users_root = os.path.join(root, "users")
+        self.entries = None
+        # modification time and size of the manifest file when last read or
+        # written, to tell if another process has changed it since
+        self.stamp = None
+
+    def user_dir(self, username):
+
+        """
+        Returns the directory holding a user's snapshots and journal. The
+        username is escaped so any name is a single safe directory name.
+        """
+
+        return os.path.join(self.users_root, quote(username, safe = "").replace(".", "%2E"))
+
+    def snapshot_path(self, username, stamp):
+
+        """
+        Returns the path of a user's snapshot saved at stamp (YYYYmmdd_HHMMSS)
+        """
+
+        return os.path.join(self.user_dir(username), stamp + ".pickle")
+
+    def journal_path(self, username):
+
+        """
+        Returns the path of a user's journal
+        """
+
+        return os.path.join(self.user_dir(username), "journal")
+
+    def user_lock_path(self, username):
+
+        """
+        Returns the path of the file locked while a user's files change
+        """
+
+        return os.path.join(self.user_dir(username), "lock")
+
+    def lock(self):
+
+        """
+        Returns a lock to hold while changing the manifest
+        """
+
+        return FileLock(self.lock_path)
+
+    def load(self):
+
+        """
+        Reads the manifest file, rebuilding it if it's missing or unreadable
+        """
+
+        try:
+            with open(self.path, "r", encoding = "utf-8") as f:
+                self.entries = json.load(f)
+                self.stamp = self.__stat()
+
+            if self.entries.get("layout") != self.layout:
+                raise ValueError("Manifest is from an older data layout")
+
+        except (OSError, ValueError, AttributeError):
+            self.migrate()
+            self.rebuild()
+
+    def save(self):
+
+        """
+        Writes the manifest atomically: to a temp file first, then swapped in
+        """
+
+        atomic_write(self.path, lambda f: json.dump(self.entries, f), "w")
+        self.stamp = self.__stat()
+
+    def __stat(self):
+
+        try:
+            info = os.stat(self.path)
+        except OSError:
+            return None
+
+        # the inode changes with every replace, even within the mtime resolution
+        return info.st_ino, info.st_mtime_ns, info.st_size
+
+    def refresh(self):
+
+        """
+        Re-reads the manifest if another process changed it since it was
+        last read or written here
+        """
+
+        if self.entries is None or self.__stat() != self.stamp:
+            self.load()
+
+    @staticmethod
+    def parse_stamp(stamp):
+
+        """
+        Returns the save time of a YYYYmmdd_HHMMSS stamp, or None
+        """
+
+        try:
+            return datetime.datetime.strptime(stamp, "%Y%m%d_%H%M%S")
+        except ValueError:
+            return None
+
+    @classmethod
+    def parse_name(cls, f):
+
+        """
+        Splits a snapshot file name in the data directory into its owner and
+        save time. tracker_names_<YYYYmmdd>_<HHMMSS>.pickle files have None as
+        owner, and <username>_<YYYYmmdd>_<HHMMSS>.pickle files are user
+        snapshots from before the per-user layout. Returns None if the name
+        doesn't match.
+        """
+
+        if not f.endswith(".pickle"):
+            return None
+
+        parts = f[:-len(".pickle")].rsplit("_", 2)
+
+        if len(parts) != 3:
+            return None
+
+        saved = cls.parse_stamp(parts[1] + "_" + parts[2])
+
+        if saved is None:
+            return None
+
+        if f[0:14] == "tracker_names_":
+            return None, saved
+
+        return parts[0], saved
+
+    def snapshots(self, username):
+
+        """
+        Returns (save time, path) pairs of every snapshot in a user's directory
+        """
+
+        user_dir = self.user_dir(username)
+
+        if not os.path.isdir(user_dir):
+            return []
+
+        found = []
+
+        for f in os.listdir(user_dir):
+
+            if f.endswith(".pickle"):
+
+                saved = self.parse_stamp(f[:-len(".pickle")])
+
+                if saved is not None:
+                    found.append((saved, os.path.join(user_dir, f)))
+
+        return found
+
+    def usernames(self):
+
+        """
+        Returns the usernames that have a directory in the data directory
+        """
+
+        if not os.path.isdir(self.users_root):
+            return []
+
+        return [unquote(d) for d in os.listdir(self.users_root)]
+
+    def migrate(self):
+
+        """
+        Moves user snapshots and journals saved flat in the data directory
+        into the per-user directories
+        """
+
+        if not os.path.isdir(self.root):
+            return
+
+        for f in os.listdir(self.root):
+
+            path = os.path.join(self.root, f)
+            parsed = self.parse_name(f)
+
+            if parsed is not None and parsed[0] is not None:
+
+                username, saved = parsed
+                os.makedirs(self.user_dir(username), exist_ok = True)
+                os.replace(path, self.snapshot_path(username, saved.strftime("%Y%m%d_%H%M%S")))
+
+            elif f.endswith(".journal") and os.path.isfile(path):
+
+                username = f[:-len(".journal")]
+                os.makedirs(self.user_dir(username), exist_ok = True)
+
+                if not os.path.exists(self.journal_path(username)):
+                    os.replace(path, self.journal_path(username))
+
+    @staticmethod
+    def entry(path):
+
+        """
+        Returns the manifest entry describing a snapshot file
+        """
+
+        return {"path": path, "size": os.path.getsize(path), "time": os.path.getctime(path)}
+
+    def __newest(self, username):
+
+        """
+        Returns the manifest entry of the newest snapshot in a user's
+        directory, or None
+        """
+
+        found = self.snapshots(username)
+
+        if len(found) == 0:
+            return None
+
+        return self.entry(max(found)[1])
+
+    def rebuild(self):
+
+        """
+        Scans the data directory once and records the newest tracker_names
+        file and the newest snapshot of each user
+        """
+
+        self.entries = {"layout": self.layout, "tracker_names": None, "users": dict()}
+
+        if not os.path.isdir(self.root):
+            return
+
+        with self.lock():
+
+            for f in os.listdir(self.root):
+
+                parsed = self.parse_name(f)
+
+                if parsed is None or parsed[0] is not None:
+                    continue
+
+                found = self.entry(os.path.join(self.root, f))
+                latest = self.entries["tracker_names"]
+
+                if latest is None or found["time"] > latest["time"]:
+                    self.entries["tracker_names"] = found
+
+            for username in self.usernames():
+
+                found = self.__newest(username)
+
+                if found is not None:
+                    self.entries["users"][username] = found
+
+            self.save()
+
+    def __lookup(self, entry):
+
+        """
+        Returns the path of an entry, or None. Returns False if the entry
+        points at a file that no longer exists, so the caller can rebuild.
+        """
+
+        if entry is None:
+            return None
+
+        if not os.path.isfile(entry["path"]):
+            return False
+
+        return entry["path"]
+
+    def latest(self, username):
+
+        """
+        Returns the path of the user's latest snapshot, or None
+        """
+
+        if self.entries is None:
+            self.load()
+
+        path = self.__lookup(self.entries["users"].get(username))
+
+        if not path:
+
+            # missing or stale, so only the user's own directory is checked
+            found = self.__newest(username)
+
+            if found is None:
+                return None
+
+            with self.lock():
+                self.refresh()
+                self.entries["users"][username] = found
+                self.save()
+
+            path = found["path"]
+
+        return path
+
+    def latest_names(self):
+
+        """
+        Returns the path of the latest tracker_names file, or None
+        """
+
+        if self.entries is None:
+            self.load()
+
+        path = self.__lookup(self.entries["tracker_names"])
+
+        if path is False:
+            self.rebuild()
+            path = self.__lookup(self.entries["tracker_names"])
+
+        return path or None
+
+    def update(self, username = None, path = None, names_path = None):
+
+        """
+        Records newly saved snapshot files and writes the manifest
+        """
+
+        with self.lock():
+
+            self.refresh()
+
+            if username is not None and path is not None:
+                self.entries["users"][username] = self.entry(path)
+
+            if names_path is not None:
+                self.entries["tracker_names"] = self.entry(names_path)
+
+            self.entries["updated"] = time.time()
+            self.save()
@@ -0,0 +1,411 @@
+# import required packages
+
+from Tracker import Tracker
+from Files import atomic_write
+from Item import DELETED, REDEEMED, item_aggregates, item_fields, item_flags, item_totals
+import datetime
+import mmap
+import struct
+
+MAGIC = b"ISTWL\x00\x00\x00"
+VERSION = 1
+
+# magic, version, item count, start date ordinal, username length, then the
+# offsets of the records, string table, sorted name index and categories,
+# then the running aggregates Tracker needs (active count, sum of active add
+# date ordinals, active value, active price, redeemed points, latest ordinal)
+HEADER = struct.Struct("<8sHIiI4Q3qdqq")
+
+# date and redeemed date ordinals, price, value, status flags, padding,
+# category code, name offset and length in the string table
+RECORD = struct.Struct("<iidiBBHII")
+
+INDEX = struct.Struct("<I")
+
+
+class MappedWishlist():
+
+    """
+    Read-mostly wishlist backed by a versioned binary file opened with mmap.
+    Items are fixed-width records read in place through a memoryview, names
+    live in a string table and are found by binary search over a sorted
+    index, so opening a wishlist only reads its header and a lookup only
+    touches the records it needs.
+
+    Looking an item up returns a read-only view of its record. Writing to
+    the view (as Tracker does to change an item) first copies the item into
+    an in-memory overlay, so only changed and added items are held in
+    memory. Write the wishlist back out with MappedWishlist.write() to
+    persist them.
+    """
+
+    class Item():
+
+        """
+        View of an item record in the file, indexed like an item dict. A
+        write copies the item into the wishlist's overlay and is made there.
+        """
+
+        __slots__ = ("wishlist", "name", "record", "fields")
+
+        def __init__(self, wishlist, name, record):
+            self.wishlist = wishlist
+            self.name = name
+            self.record = record
+            # the overlay copy, once written to
+            self.fields = None
+
+        def __getitem__(self, key):
+
+            if self.fields is not None:
+                return self.fields[key]
+
+            return self.wishlist.field(self.record, key)
+
+        def __setitem__(self, key, value):
+
+            if self.fields is None:
+                self.fields = self.wishlist.promote(self.name, self.record)
+
+            self.fields[key] = value
+
+        def get(self, key, default = None):
+
+            try:
+                return self[key]
+            except KeyError:
+                return default
+
+        def keys(self):
+            return ["price", "category", "value", "date", "redeemed_dt", "redeemed", "del_ind"]
+
+        def __eq__(self, other):
+            return {k: self[k] for k in self.keys()} == other
+
+        def __repr__(self):
+            return repr({k: self[k] for k in self.keys()})
+
+    class FormatError(Exception):
+
+        """
+        Raised when a file isn't a wishlist file of a supported version
+        """
+
+        def __init__(self, path, message = "Not a supported binary wishlist file."):
+            self.path = path
+            self.message = message
+            super().__init__(self.message)
+
+        def __str__(self):
+
+            return "{} --> {}".format(self.path, self.message)
+
+    def __init__(self, path):
+
+        self.path = path
+
+        with open(path, "rb") as f:
+            self.__mmap = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+
+        self.__view = memoryview(self.__mmap)
+
+        if len(self.__view) < HEADER.size:
+            raise self.FormatError(path)
+
+        header = HEADER.unpack_from(self.__view, 0)
+
+        if header[0] != MAGIC or header[1] != VERSION:
+            raise self.FormatError(path)
+
+        (self.__count, self.start_date, username_len, self.__records, self.__strings,
+         self.__index, categories) = header[2:9]
+        self.__aggregates = header[9:]
+
+        self.username = bytes(self.__view[HEADER.size:HEADER.size + username_len]).decode("utf-8")
+        self.start_date = datetime.date.fromordinal(self.start_date)
+        self.__categories = bytes(self.__view[categories:]).decode("utf-8").split("\n")
+
+        # items changed or added since the file was opened, and how many of
+        # them aren't in the file
+        self.__overlay = dict()
+        self.__added = 0
+
+    def __getstate__(self):
+        raise TypeError("MappedWishlist can't be pickled, use MappedWishlist.write() to save it")
+
+    def __record(self, row):
+
+        """
+        Unpacks the record at a row index
+        """
+
+        return RECORD.unpack_from(self.__view, self.__records + row * RECORD.size)
+
+    def __name(self, record):
+
+        return bytes(self.__view[self.__strings + record[7]:self.__strings + record[7] + record[8]]).decode("utf-8")
+
+    def __to_dict(self, record):
+
+        return {"price": record[2], "category": self.__categories[record[6]], "value": record[3],
+                "date": datetime.date.fromordinal(record[0]),
+                "redeemed_dt": datetime.date.fromordinal(record[1]),
+                "redeemed": "y" if record[4] & REDEEMED else "n",
+                "del_ind": "y" if record[4] & DELETED else "n"}
+
+    def field(self, record, key):
+
+        """
+        Returns one field of an unpacked record, as the item dict would hold it
+        """
+
+        if key == "date":
+            return datetime.date.fromordinal(record[0])
+        elif key == "redeemed_dt":
+            return datetime.date.fromordinal(record[1])
+        elif key == "price":
+            return record[2]
+        elif key == "value":
+            return record[3]
+        elif key == "redeemed":
+            return "y" if record[4] & REDEEMED else "n"
+        elif key == "del_ind":
+            return "y" if record[4] & DELETED else "n"
+        elif key == "category":
+            return self.__categories[record[6]]
+
+        raise KeyError(key)
+
+    def promote(self, item, record):
+
+        """
+        Returns the overlay copy of an item, copying its record there first
+        if it hasn't been changed yet
+        """
+
+        if item not in self.__overlay:
+            self.__overlay[item] = self.__to_dict(record)
+
+        return self.__overlay[item]
+
+    def __find(self, item):
+
+        """
+        Returns the row index of a name in the file with a binary search over
+        the sorted name index, or None
+        """
+
+        target = item.encode("utf-8")
+        low, high = 0, self.__count
+
+        while low < high:
+
+            mid = (low + high) // 2
+            row = INDEX.unpack_from(self.__view, self.__index + mid * INDEX.size)[0]
+            record = self.__record(row)
+            name = bytes(self.__view[self.__strings + record[7]:self.__strings + record[7] + record[8]])
+
+            if name < target:
+                low = mid + 1
+            elif name > target:
+                high = mid
+            else:
+                return row
+
+        return None
+
+    def __records_in_file(self):
+
+        """
+        Yields the unpacked records of the file in order without copying it
+        """
+
+        end = self.__records + self.__count * RECORD.size
+
+        return RECORD.iter_unpack(self.__view[self.__records:end])
+
+    def __len__(self):
+        return self.__count + self.__added
+
+    def __contains__(self, item):
+        return item in self.__overlay or self.__find(item) is not None
+
+    def __getitem__(self, item):
+
+        if item in self.__overlay:
+            return self.__overlay[item]
+
+        row = self.__find(item)
+
+        if row is None:
+            raise KeyError(item)
+
+        return self.Item(self, item, self.__record(row))
+
+    def __setitem__(self, item, fields):
+
+        if item not in self.__overlay and self.__find(item) is None:
+            self.__added += 1
+
+        self.__overlay[item] = fields
+
+    def items(self):
+
+        seen = set()
+
+        for record in self.__records_in_file():
+
+            name = self.__name(record)
+
+            if name in self.__overlay:
+                seen.add(name)
+                yield name, self.__overlay[name]
+            else:
+                yield name, self.__to_dict(record)
+
+        for name, item in self.__overlay.items():
+            if name not in seen:
+                yield name, item
+
+    def keys(self):
+        return [name for name, item in self.items()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def values(self):
+        return (item for name, item in self.items())
+
+    def aggregates(self):
+
+        """
+        Returns the running aggregates stored in the header, so Tracker
+        doesn't need a pass over the records when the file is opened
+        """
+
+        if len(self.__overlay) == 0:
+            return self.__aggregates
+
+        return self.compute_aggregates(self.values())
+
+    def totals(self, today):
+
+        """
+        Version of Tracker.calc() that reads records in place. Takes today's
+        date ordinal and returns the points, wishlist points and cost.
+        """
+
+        points = 0
+        wl_points = 0
+        cost = 0
+
+        for record in self.__records_in_file():
+
+            if len(self.__overlay) > 0 and self.__name(record) in self.__overlay:
+                continue
+
+            date, redeemed_dt, price, value, flags = record[0:5]
+            p, w, c = item_totals(date, redeemed_dt, value, price, flags, today)
+            points += p
+            wl_points += w
+            cost += c
+
+        for temp in self.__overlay.values():
+            p, w, c = item_totals(*item_fields(temp), today)
+            points += p
+            wl_points += w
+            cost += c
+
+        return points, wl_points, cost
+
+    @staticmethod
+    def compute_aggregates(items):
+
+        """
+        Computes Tracker's running aggregates from item dicts
+        """
+
+        count = ord_sum = value = redeemed_points = max_ord = 0
+        price = 0.0
+
+        for temp in items:
+            c, o, v, p, r, m = item_aggregates(*item_fields(temp))
+            count += c
+            ord_sum += o
+            value += v
+            price += p
+            redeemed_points += r
+            max_ord = max(max_ord, m)
+
+        return count, ord_sum, value, price, redeemed_points, max_ord
+
+    def close(self):
+
+        self.__view.release()
+        self.__mmap.close()
+
+    @classmethod
+    def write(cls, path, tracker):
+
+        """
+        Writes a tracker's wishlist to a binary wishlist file. The file is
+        written to a temp path and swapped in, so a wishlist mapped from the
+        old file stays readable.
+        """
+
+        info = tracker.summary()
+        username = info["username"].encode("utf-8")
+
+        records = bytearray()
+        strings = bytearray()
+        names = []
+        categories = []
+        category_codes = dict()
+        items = []
+
+        for name, temp in tracker.items():
+
+            encoded = name.encode("utf-8")
+
+            if temp["category"] not in category_codes:
+                category_codes[temp["category"]] = len(categories)
+                categories.append(temp["category"])
+
+            records += RECORD.pack(temp["date"].toordinal(), temp["redeemed_dt"].toordinal(),
+                                   float(temp["price"]), int(temp["value"]), item_flags(temp), 0,
+                                   category_codes[temp["category"]], len(strings), len(encoded))
+            names.append(encoded)
+            strings += encoded
+            items.append(temp)
+
+        index = b"".join(INDEX.pack(row) for row in sorted(range(len(names)), key = names.__getitem__))
+
+        offset_records = HEADER.size + len(username)
+        offset_strings = offset_records + len(records)
+        offset_index = offset_strings + len(strings)
+        offset_categories = offset_index + len(index)
+
+        header = HEADER.pack(MAGIC, VERSION, len(names), info["start_date"].toordinal(), len(username),
+                             offset_records, offset_strings, offset_index, offset_categories,
+                             *cls.compute_aggregates(items))
+
+        def write(f):
+            f.write(header)
+            f.write(username)
+            f.write(records)
+            f.write(strings)
+            f.write(index)
+            f.write("\n".join(categories).encode("utf-8"))
+
+        atomic_write(path, write)
+
+    @classmethod
+    def open_tracker(cls, path):
+
+        """
+        Returns a Tracker over the mapped wishlist in a binary wishlist file
+        """
+
+        wishlist = cls(path)
+
+        return Tracker(wishlist.username, wishlist = wishlist, start_date = wishlist.start_date)
@@ -0,0 +1,356 @@
+"""
+Opt-in instrumentation of the tracker hot paths. While enabled it records,
+for each instrumented operation, the number of calls and their cumulative,
+p50, p99 and max latency, plus the bytes the stores read and write. It can
+also capture a cProfile profile of everything run in the meantime.
+
+Classes register with @instrumented and tag their hot methods with @hot.
+Tagging leaves the methods as they are; enable() swaps in timing wrappers
+and disable() puts the originals back, so there's no cost while disabled.
+Other code times a block with "with timer(name):" and counts persistence
+with add_bytes(), both of which do nothing while disabled.
+
+Enable it from the tracker info debug menu, or with the TRACKER_METRICS
+environment variable set to 1 (or to "profile" to capture a profile too).
+"""
+
+# import required packages
+
+import cProfile
+import functools
+import io
+import json
+import pstats
+import random
+import time
+from tabulate import tabulate
+
+enabled = False
+# operation name to its Stat, and persistence name to [bytes read, bytes written]
+stats = dict()
+io_bytes = dict()
+# cProfile.Profile of the capture, kept after it stops so it can be viewed
+profiler = None
+profiling = False
+# classes registered with instrumented() and the methods replaced while enabled
+classes = []
+originals = []
+
+
+class Stat():
+
+    """
+    Call count and latencies of one operation. Percentiles come from a
+    uniform sample of at most max_samples latencies, so memory stays bounded
+    however many calls are made.
+    """
+
+    max_samples = 10000
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = []
+        self.rng = random.Random(0)
+
+    def add(self, seconds):
+
+        self.calls += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+        # reservoir sampling
+        if len(self.samples) < self.max_samples:
+            self.samples.append(seconds)
+        else:
+            i = self.rng.randrange(self.calls)
+
+            if i < self.max_samples:
+                self.samples[i] = seconds
+
+    def percentile(self, p):
+
+        samples = sorted(self.samples)
+
+        return samples[min(int(len(samples) * p), len(samples) - 1)] if len(samples) > 0 else 0.0
+
+    def to_dict(self):
+        return {"calls": self.calls, "total_s": self.total, "p50_ms": self.percentile(0.5) * 1000,
+                "p99_ms": self.percentile(0.99) * 1000, "max_ms": self.max * 1000}
+
+
+class Timer():
+
+    """
+    Context manager recording the time spent in its block
+    """
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class NullTimer():
+
+    """
+    Timer used while disabled
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+def record(name, seconds):
+
+    stat = stats.get(name)
+
+    if stat is None:
+        stat = stats[name] = Stat()
+
+    stat.add(seconds)
+
+
+def timer(name):
+
+    """
+    Returns a context manager timing its block as the operation name
+    """
+
+    return Timer(name) if enabled else NULL_TIMER
+
+
+def add_bytes(name, read = 0, written = 0):
+
+    """
+    Counts bytes read from and written to disk under name (e.g. "journal")
+    """
+
+    if enabled:
+        counts = io_bytes.setdefault(name, [0, 0])
+        counts[0] += read
+        counts[1] += written
+
+
+def hot(func):
+
+    """
+    Method decorator marking a method to time while enabled. The method
+    itself is returned unchanged.
+    """
+
+    func.hot = True
+    return func
+
+
+def instrumented(cls):
+
+    """
+    Class decorator registering a class whose @hot methods are timed while
+    enabled, as "Class.method"
+    """
+
+    classes.append(cls)
+
+    if enabled:
+        wrap_class(cls)
+
+    return cls
+
+
+def wrap(name, func):
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+
+        start = time.perf_counter()
+
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record(name, time.perf_counter() - start)
+
+    return wrapper
+
+
+def wrap_class(cls):
+
+    for attr, func in list(vars(cls).items()):
+        if getattr(func, "hot", False):
+            originals.append((cls, attr, func))
+            setattr(cls, attr, wrap(cls.__name__ + "." + attr, func))
+
+
+def enable(profile = False):
+
+    """
+    Starts recording, and capturing a cProfile profile too if profile is
+    True. Recording adds to what's already been recorded; see reset().
+    """
+
+    global enabled
+
+    if not enabled:
+        enabled = True
+
+        for cls in classes:
+            wrap_class(cls)
+
+    if profile:
+        start_profile()
+
+
+def disable():
+
+    """
+    Stops recording (and any profile capture). What was recorded is kept.
+    """
+
+    global enabled
+
+    stop_profile()
+
+    for cls, attr, func in originals:
+        setattr(cls, attr, func)
+
+    originals.clear()
+    enabled = False
+
+
+def start_profile():
+
+    global profiler, profiling
+
+    if not profiling:
+        if profiler is None:
+            profiler = cProfile.Profile()
+
+        profiler.enable()
+        profiling = True
+
+
+def stop_profile():
+
+    global profiling
+
+    if profiling:
+        profiler.disable()
+        profiling = False
+
+
+def reset():
+
+    """
+    Clears the recorded metrics and profile
+    """
+
+    global profiler
+
+    stop_profile()
+    stats.clear()
+    io_bytes.clear()
+    profiler = None
+
+
+def report():
+
+    """
+    Returns the recorded metrics as a JSON compatible dict
+    """
+
+    return {"enabled": enabled, "profiling": profiling,
+            "operations": {name: stat.to_dict() for name, stat in sorted(stats.items())},
+            "io": {name: {"read_bytes": counts[0], "written_bytes": counts[1]}
+                   for name, counts in sorted(io_bytes.items())}}
+
+
+def table():
+
+    """
+    Returns the recorded metrics formatted as tables, slowest operations
+    (by cumulative time) first
+    """
+
+    if len(stats) == 0 and len(io_bytes) == 0:
+        return "No metrics recorded."
+
+    operations = sorted(report()["operations"].items(), key = lambda entry: -entry[1]["total_s"])
+    text = tabulate([(name, s["calls"], s["total_s"], s["p50_ms"], s["p99_ms"], s["max_ms"]) for name, s in operations],
+                    headers = ["Operation", "Calls", "Total (s)", "p50 (ms)", "p99 (ms)", "Max (ms)"], floatfmt = ".3f")
+
+    if len(io_bytes) > 0:
+        text += "\n\n" + tabulate([(name, counts[0], counts[1]) for name, counts in sorted(io_bytes.items())],
+                                  headers = ["Persistence", "Bytes read", "Bytes written"])
+
+    return text
+
+
+def profile_stats(limit = 20):
+
+    """
+    Returns the top limit functions of the captured profile by cumulative
+    time, or None if nothing was captured
+    """
+
+    if profiler is None:
+        return None
+
+    out = io.StringIO()
+    # stats can't be read from a profiler that's still running
+    running = profiling
+    stop_profile()
+
+    try:
+        pstats.Stats(profiler, stream = out).sort_stats("cumulative").print_stats(limit)
+    except TypeError:
+        # nothing was captured
+        return None
+    finally:
+        if running:
+            start_profile()
+
+    return out.getvalue()
+
+
+def export(path):
+
+    """
+    Writes the metrics to a JSON file. A captured profile is also written,
+    to the same path ending in .prof instead, for pstats or snakeviz.
+    Returns the profile's path or None.
+    """
+
+    with open(path, "w", encoding = "utf-8") as f:
+        json.dump(report(), f, indent = 2)
+
+    if profiler is None:
+        return None
+
+    prof_path = (path[:-5] if path.lower().endswith(".json") else path) + ".prof"
+    running = profiling
+    stop_profile()
+
+    try:
+        profiler.dump_stats(prof_path)
+    finally:
+        if running:
+            start_profile()
+
+    return prof_path
@@ -0,0 +1,106 @@
+# import required packages
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from SnapshotStore import SnapshotStore
+import argparse
+import json
+import os
+import pickle
+import time
+
+
+def recompute(root, usernames):
+
+    """
+    Loads each user's tracker (newest complete snapshot plus its journal)
+    and recomputes its totals with a full calc(). Runs in a worker process.
+    Returns the worker's pid, a result dict per user and the seconds taken.
+    """
+
+    start = time.perf_counter()
+    store = SnapshotStore(root)
+    results = []
+
+    for username in usernames:
+
+        try:
+            tracker = store.load(username)
+
+            if tracker is None:
+                results.append({"username": username, "error": "No saved tracker found."})
+                continue
+
+            verified = tracker.calc()
+            summary = tracker.summary()
+
+            results.append({"username": username, "start_date": summary["start_date"].isoformat(),
+                            "items": summary["items"], "points": summary["points"],
+                            "wl_points": summary["wl_points"], "cost": round(float(summary["cost"]), 2),
+                            "verified": verified})
+
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError) as e:
+            results.append({"username": username, "error": str(e)})
+
+    return os.getpid(), results, time.perf_counter() - start
+
+
+def run(root = "data", out = "summary.jsonl", workers = None, chunk_size = 64):
+
+    """
+    Recomputes the totals of every tracker in the tracker names across
+    worker processes, chunk_size trackers per task, and writes a JSON line
+    per tracker to out as results come in. Returns a report dict with the
+    trackers done, errors, wall seconds, trackers per second and per worker
+    (pid) the trackers done, busy seconds and trackers per second.
+    """
+
+    start = time.perf_counter()
+    names = sorted(SnapshotStore(root).load_names())
+    errors = 0
+
+    with open(out, "w", encoding = "utf-8") as f:
+
+        chunks = [names[i:i + chunk_size] for i in range(0, len(names), chunk_size)]
+        per_worker = dict()
+
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+
+            futures = [executor.submit(recompute, root, chunk) for chunk in chunks]
+
+            for future in as_completed(futures):
+
+                pid, results, seconds = future.result()
+                f.write("".join(json.dumps(result) + "\n" for result in results))
+                errors += sum(1 for result in results if "error" in result)
+
+                done, busy = per_worker.get(pid, (0, 0))
+                per_worker[pid] = (done + len(results), busy + seconds)
+
+    wall = time.perf_counter() - start
+    trackers = len(names)
+
+    return {"trackers": trackers, "errors": errors, "seconds": wall,
+            "trackers_per_sec": trackers / wall if wall > 0 else 0,
+            "workers": {pid: {"trackers": done, "seconds": busy,
+                              "trackers_per_sec": done / busy if busy > 0 else 0}
+                        for pid, (done, busy) in per_worker.items()}}
+
+
+if __name__ == "__main__":
+
+    # standalone batch command, e.g. for a nightly job
+    parser = argparse.ArgumentParser(description = "Recompute the points, wishlist points and cost of every saved tracker")
+    parser.add_argument("--data", default = "data", help = "data directory")
+    parser.add_argument("--out", default = "summary.jsonl", help = "JSON Lines summary file to write")
+    parser.add_argument("--workers", type = int, default = None, help = "worker processes (default: one per CPU)")
+    parser.add_argument("--chunk-size", type = int, default = 64, help = "trackers per worker task")
+    args = parser.parse_args()
+
+    report = run(args.data, args.out, args.workers, args.chunk_size)
+
+    print("Recomputed {} trackers ({} errors) in {:.2f}s, {:.0f} trackers/sec".format(
+        report["trackers"], report["errors"], report["seconds"], report["trackers_per_sec"]))
+
+    for pid, worker in sorted(report["workers"].items()):
+        print("  worker {}: {} trackers in {:.2f}s, {:.0f} trackers/sec".format(
+            pid, worker["trackers"], worker["seconds"], worker["trackers_per_sec"]))
@@ -0,0 +1,155 @@
+# import required packages
+
+import argparse
+import logging
+import os
+import threading
+import time
+from Manifest import Manifest
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionPolicy():
+
+    """
+    Decides which snapshot files in the data directory are superseded and
+    can be removed. For each user (and for the tracker_names files) it keeps
+    the newest keep_last snapshots, plus the newest snapshot of each of the
+    last keep_daily days and of each of the last keep_weekly weeks. The
+    latest snapshot in the manifest is never removed.
+    """
+
+    def __init__(self, keep_last = 5, keep_daily = 7, keep_weekly = 4):
+        self.keep_last = keep_last
+        self.keep_daily = keep_daily
+        self.keep_weekly = keep_weekly
+
+    def keep(self, saves):
+
+        """
+        Takes a list of (save time, path) pairs of one owner and returns the
+        set of paths to keep
+        """
+
+        saves = sorted(saves, reverse = True)
+        kept = set(path for saved, path in saves[:self.keep_last])
+
+        days = []
+        weeks = []
+
+        # saves are newest first, so the first one seen per day/week is kept
+        for saved, path in saves:
+
+            day = saved.date()
+            week = day.isocalendar()[0:2]
+
+            if day not in days and len(days) < self.keep_daily:
+                days.append(day)
+                kept.add(path)
+
+            if week not in weeks and len(weeks) < self.keep_weekly:
+                weeks.append(week)
+                kept.add(path)
+
+        return kept
+
+    def compact(self, root = "data", manifest = None):
+
+        """
+        Removes the snapshot files the policy doesn't keep. Returns the number
+        of files removed, the bytes reclaimed and the seconds taken.
+        """
+
+        start = time.perf_counter()
+        manifest = manifest or Manifest(root)
+
+        # never remove a file the manifest points at
+        protected = set()
+        latest = manifest.latest_names()
+
+        if latest is not None:
+            protected.add(os.path.normpath(latest))
+
+        # tracker_names files sit in the data directory, user snapshots
+        # in their own directories
+        groups = {None: []}
+
+        for f in os.listdir(root):
+
+            parsed = Manifest.parse_name(f)
+
+            if parsed is not None and parsed[0] is None:
+                groups[None].append((parsed[1], os.path.join(root, f)))
+
+        for username in manifest.usernames():
+            groups[username] = manifest.snapshots(username)
+
+        removed = 0
+        reclaimed = 0
+
+        for owner, saves in groups.items():
+
+            if owner is not None:
+                latest = manifest.latest(owner)
+
+                if latest is not None:
+                    protected.add(os.path.normpath(latest))
+
+            kept = self.keep(saves)
+
+            for saved, path in saves:
+
+                if path in kept or os.path.normpath(path) in protected:
+                    continue
+
+                try:
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                except OSError:
+                    # already removed, e.g. by another compaction
+                    continue
+
+                removed += 1
+                reclaimed += size
+
+        return removed, reclaimed, time.perf_counter() - start
+
+    def compact_in_background(self, root = "data", manifest = None, report = None):
+
+        """
+        Runs compact() in a separate thread. When done its result (files
+        removed, bytes reclaimed, seconds taken) is passed to report (see
+        SnapshotStore.last_compaction), or logged if report is None; nothing
+        is printed, since the thread may finish in the middle of a prompt or
+        another command's output.
+        """
+
+        def run():
+
+            removed, reclaimed, taken = self.compact(root, manifest)
+
+            if report is not None:
+                report(removed, reclaimed, taken)
+            else:
+                logger.info("Compaction removed %d files, reclaimed %d bytes in %.2fs", removed, reclaimed, taken)
+
+        thread = threading.Thread(target = run)
+        thread.start()
+
+        return thread
+
+
+if __name__ == "__main__":
+
+    # standalone maintenance command
+    parser = argparse.ArgumentParser(description = "Remove superseded tracker snapshots from the data directory")
+    parser.add_argument("--data", default = "data", help = "data directory")
+    parser.add_argument("--keep-last", type = int, default = 5, help = "newest snapshots to keep per user")
+    parser.add_argument("--keep-daily", type = int, default = 7, help = "days to keep a daily snapshot for")
+    parser.add_argument("--keep-weekly", type = int, default = 4, help = "weeks to keep a weekly snapshot for")
+    args = parser.parse_args()
+
+    policy = RetentionPolicy(args.keep_last, args.keep_daily, args.keep_weekly)
+    removed, reclaimed, taken = policy.compact(args.data)
+    print("Compaction removed {} files, reclaimed {} bytes in {:.2f}s".format(removed, reclaimed, taken))
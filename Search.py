@@ -0,0 +1,219 @@
+# import required packages
+
+import itertools
+import re
+import unicodedata
+from collections import Counter
+
+
+def normalize(name):
+
+    """
+    Case-folds a name, strips accents and turns runs of punctuation and
+    whitespace into single spaces, so "Café  Mug!" and "cafe mug" match
+    """
+
+    name = unicodedata.normalize("NFKD", name.casefold())
+    name = "".join(c for c in name if not unicodedata.combining(c))
+
+    return re.sub(r"[\W_]+", " ", name).strip()
+
+
+def trigrams(name):
+
+    """
+    Returns the set of trigrams of a normalized name, padded so the start
+    and end of each word count too
+    """
+
+    padded = "  " + name + " "
+
+    return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class TrigramIndex():
+
+    """
+    Inverted index from trigrams of normalized item names to the names, for
+    ranked approximate matching that tolerates case, accents, punctuation
+    and typos. Kept up to date with add() and remove() as items change.
+    """
+
+    # most names scored by one search
+    max_candidates = 500
+
+    def __init__(self, names = ()):
+
+        # trigram to the names containing it
+        self.postings = dict()
+        # name to its trigram count, for scoring
+        self.sizes = dict()
+
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def add(self, name):
+
+        if name in self.sizes:
+            return
+
+        grams = trigrams(normalize(name))
+        self.sizes[name] = len(grams)
+
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(name)
+
+    def remove(self, name):
+
+        if name not in self.sizes:
+            return
+
+        for gram in trigrams(normalize(name)):
+
+            names = self.postings.get(gram)
+
+            if names is not None:
+                names.discard(name)
+
+                if len(names) == 0:
+                    del self.postings[gram]
+
+        del self.sizes[name]
+
+    def search(self, query, k = 5, threshold = 0.3):
+
+        """
+        Returns up to k (name, similarity) pairs ranked best first. Similarity
+        is the Dice coefficient of the trigram sets, from 0 to 1, and matches
+        below threshold are left out.
+
+        The work done doesn't grow with the index: candidates are taken from
+        the rarest posting lists (the trigrams that say the most about the
+        query) up to max_candidates names, and only those are scored, by
+        intersecting them with each list. A query made only of common
+        trigrams (like " th") is matched against a sample of the names that
+        contain them rather than all of them.
+        """
+
+        grams = trigrams(normalize(query))
+        lists = sorted((self.postings[gram] for gram in grams if gram in self.postings), key = len)
+        candidates = set()
+
+        for names in lists:
+
+            if len(candidates) + len(names) > self.max_candidates:
+                candidates.update(itertools.islice(names, self.max_candidates - len(candidates)))
+                break
+
+            candidates |= names
+
+        shared = Counter()
+
+        for names in lists:
+            shared.update(candidates.intersection(names))
+
+        scored = []
+
+        for name, count in shared.items():
+
+            score = 2 * count / (len(grams) + self.sizes[name])
+
+            if score >= threshold:
+                scored.append((score, name))
+
+        scored.sort(key = lambda pair: (-pair[0], pair[1]))
+
+        return [(name, round(score, 3)) for score, name in scored[:k]]
+
+
+class PrefixTrie():
+
+    """
+    Prefix trie over item names for tab-completion. Each node is a dict from
+    the next character to the child node, and a node where a name ends holds
+    the name under the None key. Completing a prefix walks down the prefix
+    and then only as far as the number of names asked for, so it doesn't
+    depend on how many names there are.
+    """
+
+    def __init__(self, names = ()):
+
+        self.root = dict()
+        self.count = 0
+
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return self.count
+
+    def add(self, name):
+
+        node = self.root
+
+        for c in name:
+            node = node.setdefault(c, dict())
+
+        if None not in node:
+            node[None] = name
+            self.count += 1
+
+    def remove(self, name):
+
+        # keep the path so empty nodes can be pruned on the way back up
+        path = []
+        node = self.root
+
+        for c in name:
+
+            if c not in node:
+                return
+
+            path.append((node, c))
+            node = node[c]
+
+        if None not in node:
+            return
+
+        del node[None]
+        self.count -= 1
+
+        for parent, c in reversed(path):
+
+            if len(parent[c]) > 0:
+                break
+
+            del parent[c]
+
+    def complete(self, prefix, limit = 50):
+
+        """
+        Returns up to limit names starting with prefix, in sorted order
+        """
+
+        node = self.root
+
+        for c in prefix:
+
+            if c not in node:
+                return []
+
+            node = node[c]
+
+        found = []
+        # depth first with children in sorted order, stopping at limit
+        stack = [node]
+
+        while stack and len(found) < limit:
+
+            node = stack.pop()
+
+            if None in node:
+                found.append(node[None])
+
+            stack.extend(node[c] for c in sorted((c for c in node if c is not None), reverse = True))
+
+        return found
@@ -0,0 +1,488 @@
+"""
+Local HTTP/JSON service for many users' trackers on one event loop, e.g.
+
+    python Server.py --port 8080
+    curl -d '{"username": "alice", "item": "Red Shoes", "price": 59.99, "category": 3, "value": 500}' localhost:8080/add_item
+
+Each Tracker method is an endpoint taking a POST of a JSON object with the
+username and the method's arguments: create, add_item, update_item,
+del_item, redeem_item, search_wishlist, view_wishlist and calc. Replies are
+JSON objects, with 200 on success, 400 for invalid values, 404 for an
+unknown user or endpoint and 409 when the item doesn't allow the action.
+
+Trackers are loaded on first use and kept in a TrackerCache, which
+evicts the least recently used ones past max_trackers or max_bytes.
+Changes to a user's tracker are serialized with a lock per user and saved
+before replying, so evictions rarely need to write anything back. A
+tracker whose save failed stays dirty; a flush task writes those back
+every flush_interval seconds and once more on shutdown, holding each
+user's lock. The cache counters are served at /stats.
+Loads and saves run on a single I/O thread so the event loop never blocks
+on the disk (SnapshotStore isn't thread safe, so one thread does all its
+work).
+"""
+
+# import required packages
+
+from concurrent.futures import ThreadPoolExecutor
+from SnapshotStore import SnapshotStore
+from Exporter import Exporter
+from Cache import TrackerCache
+from Cli import CliError, INVALID, PARSERS, parse, quietly
+from Validation import parse_category, parse_date, parse_price, parse_value
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import signal
+
+logger = logging.getLogger(__name__)
+
+# HTTP status for each CliError code
+STATUS = {1: 409, INVALID: 400}
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 409: "Conflict", 500: "Internal Server Error"}
+
+
+class NotFound(CliError):
+
+    """
+    Raised for an unknown user or endpoint
+    """
+
+
+class TrackerServer():
+
+    """
+    asyncio HTTP server mapping JSON POSTs to Tracker methods
+    """
+
+    # largest request body accepted, in bytes
+    max_body = 1 << 20
+
+    def __init__(self, root = "data", max_trackers = 1000, max_bytes = 1024 * 1024 * 1024, flush_interval = 60):
+
+        self.root = root
+        self.store = None
+        self.names = set()
+        # loaded trackers (see open_store) and a lock per username
+        self.cache = None
+        self.max_trackers = max_trackers
+        self.max_bytes = max_bytes
+        # seconds between write backs of dirty trackers, None for none
+        self.flush_interval = flush_interval
+        # per-user locks are only made for saved trackers, and dropped when
+        # the tracker leaves the cache; creates share one lock
+        self.locks = dict()
+        self.create_lock = asyncio.Lock()
+        # one thread for all the store's disk work
+        self.io = ThreadPoolExecutor(max_workers = 1)
+        self.endpoints = {"create": self.create, "add_item": self.add_item,
+                          "update_item": self.update_item, "del_item": self.del_item,
+                          "redeem_item": self.redeem_item, "search_wishlist": self.search_wishlist,
+                          "view_wishlist": self.view_wishlist, "calc": self.calc,
+                          "stats": self.stats}
+
+    async def on_io(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.io, func, *args)
+
+    def open_store(self):
+
+        store = SnapshotStore(self.root)
+        names = store.load_names()
+
+        # the cache doesn't flush on its own, as it would save trackers
+        # without their user's lock; see flush()
+        return store, names, TrackerCache(store, names, self.max_trackers, self.max_bytes, flush_interval = None)
+
+    def load(self, username):
+
+        """
+        Gets a tracker from the cache with its wishlist read in, so the event
+        loop doesn't read it later
+        """
+
+        tracker = self.cache.get(username)
+
+        # in the names list but without a snapshot, e.g. removed by hand
+        if tracker is None:
+            raise NotFound("There is no saved tracker for that username.")
+
+        wishlist = tracker.get_wishlist()
+
+        if hasattr(wishlist, "load"):
+            wishlist.load()
+
+        return tracker
+
+    async def tracker(self, body):
+
+        """
+        Returns the loaded tracker for the request's username. Call with the
+        user's lock held.
+        """
+
+        username = body.get("username")
+
+        if username not in self.names:
+            raise NotFound("There is no saved tracker for that username.")
+
+        return await self.on_io(self.load, username)
+
+    def save_now(self, tracker, username):
+
+        try:
+            self.store.save(tracker, username, self.names)
+        except SnapshotStore.Conflict:
+            # another process saved the tracker; the cached copy (with this
+            # request's change) is out of date, so load it afresh next time
+            self.cache.discard(username)
+            raise CliError("The tracker was changed by another process. Please try again.")
+
+        self.cache.mark_saved(username)
+
+    async def save(self, tracker, body):
+        await self.on_io(self.save_now, tracker, body["username"])
+
+    async def create(self, body):
+
+        username = body.get("username")
+
+        if not isinstance(username, str) or username == "":
+            raise CliError("username: A username is required.", INVALID)
+
+        if username in self.names:
+            raise CliError("Username already exists.")
+
+        tracker = await self.on_io(self.store.create, username)
+        # the names are only changed on the I/O thread, which saves them
+        await self.on_io(self.names.add, username)
+        await self.on_io(self.cache.put, username, tracker)
+        await self.save(tracker, body)
+
+        return {"created": username}
+
+    async def add_item(self, body):
+
+        tracker = await self.tracker(body)
+        item = body.get("item")
+
+        if not isinstance(item, str) or item == "":
+            raise CliError("item: An item name is required.", INVALID)
+
+        if tracker.is_in_wishlist(item):
+            raise CliError("Item is already in wishlist.")
+
+        tracker.add_items([(item, parse(parse_price, body.get("price"), "price"),
+                            parse(parse_category, str(body.get("category")), "category"),
+                            parse(parse_value, body.get("value"), "value"),
+                            None if body.get("date") is None else parse(parse_date, body["date"], "date"))])
+        await self.save(tracker, body)
+
+        return {"added": item}
+
+    async def update_item(self, body):
+
+        tracker = await self.tracker(body)
+        field = body.get("field")
+
+        if field not in PARSERS:
+            raise CliError("field: Must be one of {}.".format(", ".join(sorted(PARSERS))), INVALID)
+
+        value = body.get("value")
+        quietly(tracker, tracker.update_item, body.get("item"), field,
+                parse(PARSERS[field], str(value) if field == "category" else value, field))
+        await self.save(tracker, body)
+
+        return {"updated": body.get("item"), field: value}
+
+    async def del_item(self, body):
+
+        tracker = await self.tracker(body)
+        quietly(tracker, tracker.del_item, body.get("item"))
+        await self.save(tracker, body)
+
+        return {"deleted": body.get("item")}
+
+    async def redeem_item(self, body):
+
+        tracker = await self.tracker(body)
+
+        if body.get("date") is None:
+            quietly(tracker, tracker.redeem_item, body.get("item"))
+        else:
+            quietly(tracker, tracker.redeem_item, body.get("item"), "y", parse(parse_date, body["date"], "date"))
+
+        await self.save(tracker, body)
+
+        return {"redeemed": body.get("item")}
+
+    async def search_wishlist(self, body):
+
+        tracker = await self.tracker(body)
+        temp = tracker.search_wishlist(body.get("item"))
+
+        if temp is not False:
+            return {"item": Exporter(tracker).row(body["item"], temp)}
+
+        return {"item": None, "matches": [{"item": name, "score": score}
+                                          for name, score in tracker.fuzzy_search(str(body.get("item")), 5)]}
+
+    async def view_wishlist(self, body):
+
+        """
+        Returns a page of the wishlist: limit (default 100) items from offset
+        in the order added, only active ones unless only_active is "n", and
+        the offset of the next page (None on the last page)
+        """
+
+        tracker = await self.tracker(body)
+        offset, limit = int(body.get("offset", 0)), int(body.get("limit", 100))
+        rows = tracker.iter_rows("n" if body.get("only_active") == "n" else "y")
+        exporter = Exporter(tracker)
+        items = [exporter.row(name, temp) for name, temp in itertools.islice(rows, offset, offset + limit + 1)]
+
+        # one extra row is read to tell if there's another page
+        return {"offset": offset, "items": items[:limit],
+                "next_offset": offset + limit if len(items) > limit else None}
+
+    async def calc(self, body):
+
+        """
+        Returns the tracker's totals from its running aggregates. With
+        "verify": true the full calc() pass checks them too, on a worker
+        thread so a big wishlist doesn't hold up other users' requests.
+        """
+
+        tracker = await self.tracker(body)
+
+        if body.get("verify") is True:
+            verified = await asyncio.get_running_loop().run_in_executor(None, tracker.calc)
+        else:
+            verified = None
+
+        result = tracker.summary()
+        result["start_date"] = result["start_date"].isoformat()
+        result["cost"] = round(float(result["cost"]), 2)
+        result["verified"] = verified
+
+        return result
+
+    async def stats(self, body):
+        return {"cache": await self.on_io(self.cache.stats)}
+
+    def drop_lock(self, username):
+
+        """
+        Forgets the lock of a user whose tracker left the cache, unless a
+        request holds it
+        """
+
+        lock = self.locks.get(username)
+
+        if lock is not None and not lock.locked():
+            del self.locks[username]
+
+    def user_lock(self, username):
+
+        """
+        Returns the lock of a saved tracker's user
+        """
+
+        lock = self.locks.get(username)
+
+        if lock is None:
+            lock = self.locks[username] = asyncio.Lock()
+
+        return lock
+
+    def write_back(self, username):
+
+        """
+        Saves a cached tracker if it's still dirty
+        """
+
+        if username not in self.cache or not self.cache.is_dirty(username):
+            return
+
+        try:
+            self.cache.write_back(username)
+        except SnapshotStore.Conflict:
+            self.cache.discard(username)
+            logger.warning("Dropped the changes to %s's tracker, it was changed by another process", username)
+
+    async def flush(self):
+
+        """
+        Writes back the dirty trackers, each with its user's lock held so no
+        request is changing it meanwhile
+        """
+
+        for username in await self.on_io(self.cache.dirty):
+
+            async with self.user_lock(username):
+
+                try:
+                    await self.on_io(self.write_back, username)
+                except OSError as e:
+                    logger.warning("Unable to save %s's tracker: %s", username, e)
+
+    async def flush_periodically(self):
+
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def dispatch(self, path, body):
+
+        """
+        Runs an endpoint with the user's lock held. Returns the HTTP status
+        and the reply dict.
+        """
+
+        endpoint = self.endpoints.get(path.strip("/"))
+
+        try:
+            if endpoint is None:
+                raise NotFound("Unknown endpoint.")
+
+            if not isinstance(body, dict):
+                raise CliError("The request body must be a JSON object.", INVALID)
+
+            username = body.get("username")
+
+            if endpoint == self.create:
+                lock = self.create_lock
+            elif isinstance(username, str) and username in self.names:
+                lock = self.user_lock(username)
+            else:
+                # an unknown user (the endpoint replies 404) or none, e.g. stats
+                return 200, await endpoint(body)
+
+            async with lock:
+                return 200, await endpoint(body)
+
+        except NotFound as e:
+            return 404, {"error": e.message}
+
+        except CliError as e:
+            return STATUS.get(e.code, 400), {"error": e.message}
+
+        except (TypeError, ValueError) as e:
+            return 400, {"error": str(e)}
+
+        except OSError as e:
+            return 500, {"error": "Unable to save. {}".format(e)}
+
+    async def handle(self, reader, writer):
+
+        """
+        Serves the HTTP/1.1 requests on one connection, keeping it open
+        between requests unless the client asks to close it
+        """
+
+        try:
+            while True:
+
+                request = await reader.readline()
+
+                if request == b"":
+                    break
+
+                parts = request.decode("latin-1").split()
+                headers = dict()
+
+                while True:
+
+                    line = await reader.readline()
+
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    length = -1
+
+                # without a body that can be read, the rest of the connection
+                # can't be split into requests, so it's closed after replying
+                malformed = len(parts) < 3 or not 0 <= length <= self.max_body
+
+                if malformed:
+                    status, reply = 400, {"error": "Malformed request."}
+                else:
+                    try:
+                        body = json.loads(await reader.readexactly(length)) if length > 0 else dict()
+                    except ValueError:
+                        status, reply = 400, {"error": "The request body isn't valid JSON."}
+                    else:
+                        status, reply = await self.dispatch(parts[1], body)
+
+                data = json.dumps(reply).encode("utf-8")
+                writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n".format(
+                    status, REASONS[status], len(data)).encode("latin-1") + data)
+                await writer.drain()
+
+                if headers.get("connection", "").lower() == "close" or malformed:
+                    break
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+        finally:
+            writer.close()
+
+    async def serve(self, host = "127.0.0.1", port = 8080, ready = None):
+
+        """
+        Loads the tracker names and serves until cancelled. ready, if given,
+        is an asyncio.Event set once the server is listening.
+        """
+
+        self.store, self.names, self.cache = await self.on_io(self.open_store)
+        loop = asyncio.get_running_loop()
+        # evictions happen on the I/O thread, the locks live on the loop
+        self.cache.on_evict = lambda username: loop.call_soon_threadsafe(self.drop_lock, username)
+        server = await asyncio.start_server(self.handle, host, port)
+
+        if ready is not None:
+            ready.set()
+
+        flusher = asyncio.create_task(self.flush_periodically()) if self.flush_interval is not None else None
+
+        # stop (and flush) on SIGTERM as on Ctrl+C; not available on Windows
+        with contextlib.suppress(NotImplementedError, AttributeError):
+            loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+
+        try:
+            async with server:
+                await server.serve_forever()
+
+        finally:
+            if flusher is not None:
+                flusher.cancel()
+
+            await self.flush()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Serve trackers over HTTP/JSON on localhost")
+    parser.add_argument("--data", default = "data", help = "data directory")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8080)
+    parser.add_argument("--max-trackers", type = int, default = 1000, help = "trackers kept in memory")
+    parser.add_argument("--max-mb", type = int, default = 1024, help = "estimated memory for the trackers kept, in MB")
+    parser.add_argument("--flush-interval", type = float, default = 60, help = "seconds between write backs of unsaved trackers")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(TrackerServer(args.data, args.max_trackers, args.max_mb * 1024 * 1024,
+                                  args.flush_interval).serve(args.host, args.port))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        # Ctrl+C or SIGTERM, once the trackers are flushed
+        pass
@@ -1,25 +1,58 @@
 
 # import required packages
 
+from SnapshotStore import SnapshotStore
 from Tracker import Tracker
-import datetime
-import pickle
-import os
+from Exporter import Exporter
+from Importer import CsvImporter
+from Validation import CATEGORIES, parse_category, parse_date, parse_price, parse_value
+import Metrics
+import csv
 import time
 from tabulate import tabulate
 from sys import exit
 
+try:
+    import readline
+except ImportError:
+    # tab-completion is a nice to have, readline isn't available everywhere (e.g. Windows)
+    readline = None
+
 class Session():
 
     """
     User interface for the Impulse Tracker
+
+    Screens are run one after another by run(): each screen method returns
+    the name of the next screen in screens (or None to stop) instead of
+    calling it, and typing "Cancel" in a prompt raises Cancel back to the
+    menu it came from, so the call stack stays the same depth however long
+    the session runs.
     """
     # hold all the tracker names that are created
     tracker_names = set()
+    # number of wishlist rows shown per page
+    page_size = 20
+    # screen name to the method that shows it
+    screens = {"main": "display_main", "create": "create_tracker", "load": "load_tracker",
+               "post_create": "display_post_create", "functions": "display_functions"}
+    # functional menu option to the method that runs it
+    actions = {"1": "add_item_run", "2": "update_item", "3": "del_item", "4": "redeem_item",
+               "5": "search_item", "6": "view_wishlist", "7": "tracker_info", "8": "save_tracker",
+               "9": "quit", "10": "import_csv", "11": "export_wishlist"}
+
+    class Cancel(Exception):
+
+        """
+        Raised when the user cancels out of a prompt, to return to the menu
+        """
 
-    def __init__(self):
+    def __init__(self, store = None):
         self.cur_tracker = None
         self.cur_username = ''
+        # where trackers are saved, pickle snapshots in data/ by default
+        # (see SqliteStore for a SQLite database instead)
+        self.store = store
 
     def display_main(self):
         """
@@ -54,11 +87,9 @@ class Session():
             resp = input("Enter your response here: ")
 
             if resp == '1':
-                self.create_tracker()
-                break
+                return "create"
             elif resp == '2':
-                self.load_tracker()
-                break
+                return "load"
             elif resp == '3':
                 self.quit()
             else:
@@ -85,16 +116,19 @@ class Session():
             resp = input("What would you like to do? ")
 
             if resp == '1':
-                self.add_item_run()
-                self.display_functions()
+
+                try:
+                    self.add_item_run()
+                except self.Cancel:
+                    pass
+
+                return "functions"
             elif resp == '2':
-                self.display_functions()
+                return "functions"
             elif resp == '3':
                 # have it save by default
                 self.save_tracker()
                 self.quit()
-                break
-
 
 
     def display_functions(self):
@@ -116,30 +150,22 @@ class Session():
             7) View tracker info
             8) Save tracker
             9) Save tracker and quit
+            10) Import wishlist items from a CSV file
+            11) Export wishlist to a CSV or JSON Lines file
 
             To cancel/exit from any of the menu options, type "Cancel" in the
             prompt.
             """)
             resp = input("What would you like to do? ")
 
-            if resp == "1":
-                self.add_item_run()
-            elif resp == "2":
-                self.update_item()
-            elif resp == "3":
-                self.del_item()
-            elif resp == "4":
-                self.redeem_item()
-            elif resp == "5":
-                self.search_item()
-            elif resp == "6":
-                self.view_wishlist()
-            elif resp == "7":
-                self.tracker_info()
-            elif resp == "8":
-                self.save_tracker()
-            elif resp == "9":
-                self.quit()
+            if resp in self.actions:
+
+                try:
+                    getattr(self, self.actions[resp])()
+                except self.Cancel:
+                    # back to this menu
+                    pass
+
             else:
                 print("Invalid response. Please try again.")
 
@@ -148,22 +174,19 @@ class Session():
         # load the tracker dict so later we can check to see if there's a conflict if
         # someone tries to use the same username
 
-        if not os.path.isdir("data"):
-            os.makedirs("data")
-
-        # then check if there's a pickle file for the tracker names
-        # if so, load the most recent one and assign to tracker_names
+        if self.store is None:
+            self.store = SnapshotStore("data")
 
-        pickles = ["data/" + f for f in os.listdir("data") if f[0:13] == "tracker_names"]
+        # then check if there are saved tracker names
+        # if so, load the most recent ones and assign to tracker_names
 
-        if len(pickles) > 0:
+        self.tracker_names = self.store.load_names()
 
-            newest = max(pickles , key = os.path.getctime)
+        # show each screen in turn until one returns None
+        screen = "main"
 
-            with open(newest, "rb") as f:
-                self.tracker_names = pickle.load(f)
-
-        self.display_main()
+        while screen is not None:
+            screen = getattr(self, self.screens[screen])()
 
 
     def create_tracker(self):
@@ -187,7 +210,7 @@ class Session():
                 resp = input("Enter a response: ")
 
                 if resp == "1":
-                    self.display_main()
+                    return "main"
                 elif resp == "2":
                     continue
 
@@ -195,7 +218,7 @@ class Session():
                 break
 
         # initialize Tracker
-        tracker = Tracker(username)
+        tracker = self.store.create(username)
 
         # add tracker to menu's tracker names
         self.tracker_names.add(username)
@@ -203,7 +226,8 @@ class Session():
         self.cur_tracker = tracker
         self.cur_username = username
         print("Tracker successfully created!")
-        self.display_post_create()
+
+        return "post_create"
 
 
     def load_tracker(self):
@@ -233,40 +257,62 @@ class Session():
                     if resp == '1':
                         continue
                     elif resp == '2':
-                        self.create_tracker()
-                        break
+                        return "create"
                     else:
                         print("Invalid response. Try again.")
                 else:
                     break
             else:
                 print("There are no saved trackers in the system. Please create a new Tracker.")
-                self.create_tracker()
-                break
+                return "create"
 
 
         # find the latest file of the corresponding username
         # set current username to username
         self.cur_username = username
 
-        # make a list of all the files that correspond to username
-        pickles = ["data/" + f for f in os.listdir("data") if f[0:len(username)] == username]
+        # load the most recent save of the username as the current tracker
+        with Metrics.timer("Session.load"):
+            self.cur_tracker = self.store.load(username)
 
-        # if there's at least one file, find the most recent one
-        # and load it as the current tracker
+        # calculate the latest points and cost since last save
+        self.cur_tracker.refresh()
+        print("Tracker successfully loaded!")
 
-        if len(pickles) > 0:
+        return "functions"
 
-            newest = max(pickles , key = os.path.getctime)
+    def item_input(self, prompt):
 
-            with open(newest, "rb") as f:
-                self.cur_tracker = pickle.load(f)
+        """
+        Asks for an item name with tab-completion of active item names when
+        readline is available
+        """
 
-        # calculate the latest points and cost since last save
-        self.cur_tracker.calc()
-        print("Tracker successfully loaded!")
+        if readline is None or self.cur_tracker is None:
+            return input(prompt)
+
+        matches = []
+
+        def completer(text, state):
+
+            # readline asks for matches one at a time, starting at state 0
+            if state == 0:
+                matches[:] = self.cur_tracker.complete(text)
+
+            return matches[state] if state < len(matches) else None
 
-        self.display_functions()
+        old_completer = readline.get_completer()
+        old_delims = readline.get_completer_delims()
+        readline.set_completer(completer)
+        # item names can contain spaces, so complete the whole line
+        readline.set_completer_delims("")
+        readline.parse_and_bind("tab: complete")
+
+        try:
+            return input(prompt)
+        finally:
+            readline.set_completer(old_completer)
+            readline.set_completer_delims(old_delims)
 
     def add_item_date(self):
 
@@ -288,8 +334,7 @@ class Session():
 
             if resp.lower() == "cancel":
                 print("Returning to Main Menu...")
-                self.display_functions()
-                break
+                raise self.Cancel()
 
             if resp[0].lower() == "y":
 
@@ -298,20 +343,13 @@ class Session():
 
                     if str_date.lower() == "cancel":
                         print("Returning to Main Menu...")
-                        self.display_functions()
-                        break
+                        raise self.Cancel()
 
                     try:
+                        return "y", parse_date(str_date)
 
-                        if datetime.datetime.strptime(str_date, "%m/%d/%Y").date() > datetime.date(1970, 1, 1):
-
-                            return "y", datetime.datetime.strptime(str_date, "%m/%d/%Y").date()
-
-                        else:
-                            print("Is this correct? Dates should be at least after 1/1/1970! Try again.")
-
-                    except:
-                        print("Invalid date. Please use the MM/DD/YYYY format. Try again.")
+                    except ValueError as e:
+                        print(e)
 
 
             elif resp[0].lower() == "n":
@@ -335,20 +373,14 @@ class Session():
 
             if resp.lower() == "cancel":
                 print("Returning to Main Menu...")
-                self.display_functions()
-                break
+                raise self.Cancel()
 
             try:
-                # no zero dollars or negative numbers
-                if float(resp) <= 0:
-                    print("Please enter a price that is greater than 0 dollars.")
-                    continue
-                else:
-                    return float(resp)
+                # no zero dollars, negative numbers or non-numerical values
+                return parse_price(resp)
 
-            except:
-                # catches if they put non-numerical values
-                print("Invalid monetary value. Please try again.")
+            except ValueError as e:
+                print(e)
 
 
     def add_item_cat(self):
@@ -359,9 +391,6 @@ class Session():
         Returns the object
         """
 
-        categories = {"1": "Beauty/Skincare", "2":"Books", "3":"Clothing/Accessories",
-                      "4": "Electronics", "5":"Food", "6":"Jewelry", "7":"Other"}
-
         while True:
 
             print("""
@@ -381,13 +410,12 @@ class Session():
 
             if resp.lower() == "cancel":
                 print("Returning to Main Menu...")
-                self.display_functions()
-                break
+                raise self.Cancel()
 
             # if valid response then return it
-            if resp in [str(i) for i in range(1, 8)]:
+            if resp in CATEGORIES:
 
-                return categories[resp]
+                return parse_category(resp)
             else:
                 print("Invalid response. Please try again.")
 
@@ -412,13 +440,13 @@ class Session():
 
             if resp.lower() == "cancel":
                 print("Returning to Main Menu...")
-                self.display_functions()
-                break
+                raise self.Cancel()
 
-            if int(resp) >= 100 and int(resp) <= 2000:
-                return int(resp)
-            else:
-                print("Invalid response. Please try again.")
+            try:
+                return parse_value(resp)
+
+            except ValueError as e:
+                print(e)
 
     def add_item_run(self):
         """
@@ -428,12 +456,11 @@ class Session():
 
         while True:
 
-            item = input("To get started with adding an item to the wishlist, enter the item name: ")
+            item = self.item_input("To get started with adding an item to the wishlist, enter the item name: ")
 
             if item.lower() == "cancel":
                 print("Returning to Main Menu...")
-                self.display_functions()
-                break
+                raise self.Cancel()
 
             if self.cur_tracker.is_in_wishlist(item):
                 print("""
@@ -448,10 +475,10 @@ class Session():
                     continue
                 elif resp == "2":
                     self.update_item()
-                    #self.display_functions()
-                    break
+                    return
                 elif resp == "3":
-                    self.display_functions()
+                    print("Returning to Main Menu...")
+                    raise self.Cancel()
                 else:
                     continue
             else:
@@ -475,12 +502,11 @@ class Session():
 
         while True:
 
-            resp = input("What is the name of the item you would like to update? ")
+            resp = self.item_input("What is the name of the item you would like to update? ")
 
             if resp.lower() == "cancel":
                 print("Returning to Main Menu...")
-                self.display_functions()
-                break
+                raise self.Cancel()
 
             if self.cur_tracker.is_in_wishlist(resp) and self.cur_tracker.is_deleted(resp) == False and self.cur_tracker.is_redeemed(resp) == False:
 
@@ -500,20 +526,17 @@ class Session():
 
                 if resp2.lower() == "cancel":
                     print("Returning to Main Menu...")
-                    self.display_functions()
-                    break
+                    raise self.Cancel()
 
-                if resp2 in options.keys():
+                if resp2 not in options.keys():
+                    print("Invalid response. Please try again.")
+                    continue
 
-                    # run the corresponding function which has error checking
-                    resp3 = options[resp2][1]()
+                # run the corresponding function which has error checking
+                resp3 = options[resp2][1]()
 
+                # points and cost are kept up to date by the tracker
                 self.cur_tracker.update_item(resp, options[resp2][0], resp3)
-
-                if resp2 == "2" or resp2 == "3":
-                    self.cur_tracker.calc()
-
-                self.display_functions()
                 break
 
             else:
@@ -531,12 +554,11 @@ class Session():
 
         while True:
 
-            resp = input("What item do you want to delete from the wishlist? Please type the exact name: ")
+            resp = self.item_input("What item do you want to delete from the wishlist? Please type the exact name: ")
 
             if resp.lower() == "cancel":
                 print("Returning to Main Menu...")
-                self.display_functions()
-                break
+                raise self.Cancel()
 
             if self.cur_tracker.is_in_wishlist(resp) and self.cur_tracker.is_deleted(resp) == False and self.cur_tracker.is_redeemed(resp) == False:
 
@@ -567,12 +589,11 @@ class Session():
 
         while True:
 
-            resp = input("What item do you want to redeem from the wishlist? Please type the exact name: ")
+            resp = self.item_input("What item do you want to redeem from the wishlist? Please type the exact name: ")
 
             if resp.lower() == "cancel":
                 print("Returning to Main Menu...")
-                self.display_functions()
-                break
+                raise self.Cancel()
 
             if self.cur_tracker.is_in_wishlist(resp) and self.cur_tracker.is_deleted(resp) == False and self.cur_tracker.is_redeemed(resp) == False:
 
@@ -594,35 +615,51 @@ class Session():
 
         while True:
 
-            resp = input("What is the name of the item you want to search for? ")
+            resp = self.item_input("What is the name of the item you want to search for? ")
 
             if resp.lower() == "cancel":
                 print("Returning to Main Menu...")
-                self.display_functions()
-                break
+                raise self.Cancel()
 
-            if self.cur_tracker.is_in_wishlist(resp):
+            if not self.cur_tracker.is_in_wishlist(resp):
 
-                temp = self.cur_tracker.search_wishlist(resp)
-                # print the item info
+                # offer the closest names instead
+                matches = self.cur_tracker.fuzzy_search(resp, k = 5)
 
-                print("""Item Name: {} \n
-                       Category: {} \n
-                       Value: {} \n
-                       Price: {} \n
-                       Date Entered: {} \n
-                       Redeemed: {} \n""".format(resp, temp["category"], temp["value"],
-                                              temp["price"], temp["date"], temp["redeemed"]))
-                break
-            else:
-                print("Item not in wishlist. Please try again using the exact name of the item.")
+                if len(matches) == 0:
+                    print("Item not in wishlist and no similar items found. Please try again.")
+                    continue
+
+                print("Item not in wishlist. Did you mean:")
+
+                for i, (name, score) in enumerate(matches, start = 1):
+                    print("{}) {} ({:.0%} match)".format(i, name, score))
+
+                pick = input("Select one of the items above by number, or press Enter to search again: ")
+
+                if pick.isdigit() and 1 <= int(pick) <= len(matches):
+                    resp = matches[int(pick) - 1][0]
+                else:
+                    continue
+
+            temp = self.cur_tracker.search_wishlist(resp)
+            # print the item info
+
+            print("""Item Name: {} \n
+                   Category: {} \n
+                   Value: {} \n
+                   Price: {} \n
+                   Date Entered: {} \n
+                   Redeemed: {} \n""".format(resp, temp["category"], temp["value"],
+                                          temp["price"], temp["date"], temp["redeemed"]))
+            break
 
 
     def view_wishlist(self):
         """
         Utilizes the view wishlist function the tracker to present
         either a wishlist of only active items or the full wishlist regardless
-        of deletion or redemption
+        of deletion or redemption, one page at a time
         """
 
         while True:
@@ -631,24 +668,146 @@ class Session():
 
             if resp.lower() == "cancel":
                 print("Returning to Main Menu...")
-                self.display_functions()
-                break
+                raise self.Cancel()
 
             if resp.lower()[0] == "y":
-                print(self.cur_tracker.view_wishlist())
+                self.page_wishlist(self.cur_tracker.cursor())
                 break
             elif resp.lower()[0] == "n":
-                print(self.cur_tracker.view_wishlist(only_active = 'n'))
+                self.page_wishlist(self.cur_tracker.cursor(only_active = 'n'))
                 break
             else:
                 print("Invalid response. Please try again.")
 
+    def page_wishlist(self, cursor):
+
+        """
+        Pages through a wishlist cursor, only formatting the rows on screen
+        """
+
+        page = 1
+
+        while True:
+
+            pages = cursor.pages(self.page_size)
+            print(cursor.page(page, self.page_size))
+            print("\nPage {} of {} ({} items)".format(page, pages, len(cursor)))
+
+            resp = input("N) Next  P) Previous  J <page>) Jump  S <column>) Sort by item/date/category/price/value  Q) Done: ").strip().lower()
+
+            if resp in ("q", "cancel", ""):
+                break
+            elif resp == "n":
+                page = min(page + 1, pages)
+            elif resp == "p":
+                page = max(page - 1, 1)
+            elif resp[0:2] == "j " and resp[2:].strip().isdigit():
+                page = min(max(int(resp[2:].strip()), 1), pages)
+            elif resp[0:2] == "s " and resp[2:].strip() in Tracker.RowCursor.sort_keys:
+                sort_by = resp[2:].strip()
+                # sorting the same column again flips the order
+                reverse = sort_by == cursor.sort_by and not cursor.reverse
+                cursor = self.cur_tracker.cursor(cursor.only_active, sort_by, reverse)
+                page = 1
+            else:
+                print("Invalid response. Please try again.")
+
+
+    def import_csv(self):
+
+        """
+        Asks user for a CSV file and imports its rows as wishlist items
+        """
+
+        print("""
+            The CSV file needs a header row with item, price, category and value
+            columns. It can also have a date column (MM/DD/YYYY) to override the
+            item date. Categories can be given by name or menu number. Rows
+            with a status column other than active are skipped.
+            """)
+
+        while True:
+
+            resp = input("Enter the path of the CSV file: ")
+
+            if resp.lower() == "cancel":
+                print("Returning to Main Menu...")
+                break
+
+            try:
+                report = CsvImporter(self.cur_tracker).run(resp)
+
+            except OSError:
+                print("Unable to open that file. Please try again.")
+                continue
+
+            except CsvImporter.MissingColumns as e:
+                print(e)
+                continue
+
+            except UnicodeDecodeError:
+                print("Unable to import. The CSV file isn't UTF-8 encoded. Please save it as UTF-8 and try again.")
+                continue
+
+            except csv.Error as e:
+                print("Unable to import. The CSV file is malformed ({}).".format(e))
+                continue
+
+            print("Imported {} of {} rows in {:.2f}s ({:.0f} rows/sec).".format(
+                report["added"], report["rows"], report["seconds"], report["rows_per_sec"]))
+
+            for line, message in report["errors"]:
+                print("Line {}: {}".format(line, message) if line else message)
+
+            if report["error_count"] > len(report["errors"]):
+                print("...and {} more errors.".format(report["error_count"] - len(report["errors"])))
+
+            break
+
+    def export_wishlist(self):
+
+        """
+        Asks user for a file to export the wishlist to. Files ending in .jsonl
+        are written as JSON Lines, anything else as CSV.
+        """
+
+        while True:
+
+            resp = input("Do you want to export only active items? Please enter Y/N: ")
+
+            if resp.lower() == "cancel":
+                print("Returning to Main Menu...")
+                return
+
+            if resp.lower()[0:1] in ("y", "n"):
+                only_active = resp.lower()[0]
+                break
+
+            print("Invalid response. Please try again.")
+
+        while True:
+
+            path = input("Enter the path of the file to export to (.csv or .jsonl): ")
+
+            if path.lower() == "cancel":
+                print("Returning to Main Menu...")
+                return
+
+            try:
+                count, seconds = Exporter(self.cur_tracker).write(path, only_active = only_active)
+
+            except OSError:
+                print("Unable to write to that file. Please try again.")
+                continue
+
+            print("Exported {} items to {} in {:.2f}s.".format(count, path, seconds))
+            break
 
     def tracker_info(self, debug = "n"):
 
         """ Displays information about the tracker """
 
-        self.cur_tracker.calc()
+        self.cur_tracker.refresh()
 
         while True:
 
@@ -664,28 +823,112 @@ class Session():
 
             if resp.lower() == "y":
                 self.cur_tracker.tracker_info(debug = "y")
+                self.metrics_menu()
                 break
             elif resp.lower() == "n":
                 self.cur_tracker.tracker_info(debug = "n")
                 break
 
+    def metrics_menu(self):
+
+        """
+        Debug menu for the hot path metrics: shows them and lets the user
+        turn recording and cProfile capture on or off, export them to JSON
+        or clear them
+        """
+
+        while True:
+
+            print("\nMetrics are {}{}.\n".format("on" if Metrics.enabled else "off",
+                                                 " (capturing a profile)" if Metrics.profiling else ""))
+            print(Metrics.table())
+
+            # SqliteStore has no snapshots to compact
+            compaction = getattr(self.store, "last_compaction", None)
+
+            if compaction is not None:
+                print("\nLast snapshot compaction removed {} files, reclaimed {} bytes in {:.2f}s.".format(*compaction))
+
+            profile = Metrics.profile_stats(15)
+
+            if profile is not None:
+                print(profile)
+
+            print("""
+            1) Turn metrics {}
+            2) {} cProfile capture
+            3) Export metrics to a JSON file
+            4) Clear metrics
+            5) Return to the menu
+            """.format("off" if Metrics.enabled else "on", "Stop" if Metrics.profiling else "Start"))
+
+            resp = input("What would you like to do? ")
+
+            if resp == "1":
+                if Metrics.enabled:
+                    Metrics.disable()
+                else:
+                    Metrics.enable()
+
+            elif resp == "2":
+                if Metrics.profiling:
+                    Metrics.stop_profile()
+                else:
+                    # a profile is only useful with the metrics on
+                    Metrics.enable(profile = True)
+
+            elif resp == "3":
+
+                path = input("Enter the path of the file to export to (.json): ")
+
+                if path.lower() == "cancel":
+                    continue
+
+                try:
+                    prof_path = Metrics.export(path)
+                except OSError:
+                    print("Unable to write to that file.")
+                    continue
+
+                print("Metrics exported to {}.".format(path))
+
+                if prof_path is not None:
+                    print("Profile saved to {}.".format(prof_path))
+
+            elif resp == "4":
+                Metrics.reset()
+
+            elif resp == "5" or resp.lower() == "cancel":
+                break
+
+            else:
+                print("Invalid response. Please try again.")
+
 
     def save_tracker(self):
         """
-        Saves the tracker names into a pickle file inside the data directory
-        Saves the current tracker into a pickle file inside the data directory
+        Saves the tracker names and the current tracker using the store. If
+        the tracker was saved from somewhere else since it was loaded here,
+        loads that version and re-applies this session's changes to it.
         """
 
-        now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        while True:
+
+            try:
+                with Metrics.timer("Session.save"):
+                    self.store.save(self.cur_tracker, self.cur_username, self.tracker_names)
+                break
 
-        names_file = "data/tracker_names_" + now + ".pickle"
-        tracker_file = "data/" + self.cur_username + "_" + now + ".pickle"
+            except SnapshotStore.Conflict as e:
 
-        with open(names_file, "wb") as f:
-            pickle.dump(self.tracker_names, f)
+                self.cur_tracker = self.store.load(self.cur_username)
+                skipped = self.cur_tracker.rebase(e.changes)
+                print("The tracker was changed in another session since it was loaded. "
+                      "Your changes have been applied to the latest version.")
 
-        with open(tracker_file, "wb") as f:
-            pickle.dump(self.cur_tracker, f)
+                if len(skipped) > 0:
+                    print("{} change(s) no longer applied and were left out: {}".format(
+                        len(skipped), ", ".join("{} {}".format(op[0], op[1]) for seq, op in skipped)))
 
         print("Impulse Spending Tracker successfully saved.")
 
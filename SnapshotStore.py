@@ -0,0 +1,498 @@
+# import required packages
+
+from Tracker import Tracker
+from Journal import Journal
+from Manifest import Manifest
+from Retention import RetentionPolicy
+from Files import FileLock, atomic_write
+from Item import Wishlist
+import Metrics
+import datetime
+import os
+import pickle
+import struct
+import time
+
+
+# version of the snapshot file layout written by SnapshotStore
+SNAPSHOT_FORMAT = 3
+# snapshots from format 3 end with the length of what comes before and a
+# marker, so an incomplete file can be told apart without reading it all
+TRAILER = struct.Struct("<Q8s")
+TRAILER_MARK = b"SNAPEND\n"
+
+
+class LazyWishlist():
+
+    """
+    Wishlist that isn't read from its snapshot file until it's first used.
+    Only the file's path and the wishlist's offset in it are kept, so an
+    unused wishlist doesn't hold a file open. If the snapshot has been
+    removed by then (compaction only removes superseded snapshots), the
+    wishlist is read from fallback() instead. Once loaded it stands in for
+    the wishlist, including any hooks (totals(), aggregates(), rows())
+    Tracker looks for.
+    """
+
+    def __init__(self, path, offset, count, fallback = None):
+        self.__path = path
+        self.__offset = offset
+        self.__count = count
+        self.__fallback = fallback
+        self.__wishlist = None
+
+    def load(self):
+
+        """
+        Reads the wishlist from the snapshot if it hasn't been read yet
+        """
+
+        if self.__wishlist is None:
+
+            try:
+                f = open(self.__path, "rb")
+            except FileNotFoundError:
+                if self.__fallback is None:
+                    raise
+
+                self.__wishlist = self.__fallback()
+                return self.__wishlist
+
+            with f:
+                f.seek(self.__offset)
+                # wishlists of item dicts from older versions become compact records
+                self.__wishlist = Wishlist.upgrade(pickle.load(f))
+                Metrics.add_bytes("snapshot", read = f.tell() - self.__offset)
+
+        return self.__wishlist
+
+    def is_loaded(self):
+        return self.__wishlist is not None
+
+    def __reduce__(self):
+        # pickles as the wishlist it stands in for
+        return (type(self.load()), (self.load(),))
+
+    def __len__(self):
+
+        if self.__wishlist is None:
+            return self.__count
+
+        return len(self.__wishlist)
+
+    def __contains__(self, item):
+        return item in self.load()
+
+    def __getitem__(self, item):
+        return self.load()[item]
+
+    def __setitem__(self, item, fields):
+        self.load()[item] = fields
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def __repr__(self):
+        return repr(self.load())
+
+    def __getattr__(self, name):
+
+        # only called for what isn't defined here, e.g. the wishlist's hooks
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        return getattr(self.load(), name)
+
+    def keys(self):
+        return self.load().keys()
+
+    def values(self):
+        return self.load().values()
+
+    def items(self):
+        return self.load().items()
+
+
+class SnapshotStore():
+
+    """
+    Default storage for Session: pickle snapshots of each tracker as
+    checkpoints plus a journal of the changes since, and pickled sets of the
+    tracker names, all inside the data directory
+
+    A snapshot file holds three pickles: a small header dict (username, start
+    date, item count, cached totals and save time), the tracker without its
+    wishlist, and the wishlist, then a trailer. The header can be read on
+    its own with read_header(), and a loaded tracker only reads its wishlist
+    when it's first used. Single pickle snapshots from older versions still
+    load.
+
+    Several processes can share a data directory. Files are written to a
+    temp file and renamed into place, a user's files only change under an
+    exclusive lock on the user's lock file (loads take it shared), and
+    loading skips snapshots that aren't complete. To change a tracker
+    without losing another process's changes, hold lock(username) from the
+    load until the save; without it, a save of a tracker that's been saved
+    elsewhere since it was loaded raises Conflict instead of writing.
+    """
+
+    # number of journaled changes after which a full snapshot is written
+    checkpoint_every = 1000
+    # which old snapshots to remove, and how often (seconds) to check at save time
+    # set retention to None to keep every snapshot
+    retention = RetentionPolicy()
+    compact_interval = 3600
+
+    class Conflict(Exception):
+
+        """
+        Raised by save() when the user's saved tracker has changed since the
+        tracker being saved was loaded, e.g. by another session. Holds the
+        unsaved changes (taken from the tracker), which can be re-applied to
+        a freshly loaded copy with Tracker.rebase().
+        """
+
+        def __init__(self, username, changes):
+            self.username = username
+            self.changes = changes
+
+        def __str__(self):
+            return "The saved tracker for {} has changed since it was loaded.".format(self.username)
+
+    def __init__(self, root = "data"):
+
+        self.root = root
+        # index of the latest snapshot files in the data directory
+        self.manifest = Manifest(root)
+        # tracker names as of the last save, to skip rewriting them unchanged
+        self.saved_names = None
+        # change each loaded/saved tracker's snapshot covers up to, by username
+        self.checkpoints = dict()
+        # when old snapshots were last compacted, and the (files removed,
+        # bytes reclaimed, seconds taken) of the last one once it's finished
+        self.last_compact = 0
+        self.last_compaction = None
+
+        if not os.path.isdir(root):
+            os.makedirs(root)
+
+    def load_names(self):
+
+        """
+        Returns the set of tracker names from the most recent tracker_names file
+        """
+
+        # another process may have saved names since the manifest was read
+        self.manifest.refresh()
+        newest = self.manifest.latest_names()
+
+        if newest is None:
+            return set()
+
+        with open(newest, "rb") as f:
+            names = pickle.load(f)
+
+        self.saved_names = set(names)
+
+        return names
+
+    @staticmethod
+    def read_header(path):
+
+        """
+        Returns the header of a snapshot file without reading its wishlist
+        """
+
+        with open(path, "rb") as f:
+            header = pickle.load(f)
+
+        if isinstance(header, dict) and header.get("format") in (2, SNAPSHOT_FORMAT):
+            return header
+
+        # older snapshots are a single pickled tracker
+        header = header.summary()
+        header["format"] = 1
+        header["saved"] = os.path.getmtime(path)
+
+        return header
+
+    @staticmethod
+    def read_snapshot(path, fallback = None):
+
+        """
+        Returns the tracker in a snapshot file with its wishlist loaded lazily
+        (see LazyWishlist for fallback)
+        """
+
+        with open(path, "rb") as f:
+
+            header = pickle.load(f)
+
+            if not (isinstance(header, dict) and header.get("format") in (2, SNAPSHOT_FORMAT)):
+                # older snapshots are a single pickled tracker
+                Metrics.add_bytes("snapshot", read = f.tell())
+                return header
+
+            tracker = pickle.load(f)
+            Metrics.add_bytes("snapshot", read = f.tell())
+            tracker.set_wishlist(LazyWishlist(path, f.tell(), header["items"], fallback))
+
+        return tracker
+
+    @staticmethod
+    def write_snapshot(path, tracker):
+
+        """
+        Writes a tracker to a snapshot file: header, tracker, wishlist
+        """
+
+        header = tracker.summary()
+        header["format"] = SNAPSHOT_FORMAT
+        header["saved"] = time.time()
+        header["seq"] = tracker.last_seq()
+        wishlist = tracker.get_wishlist()
+
+        def write(f):
+            pickle.dump(header, f)
+            pickle.dump(tracker, f)
+            pickle.dump(wishlist, f)
+            f.write(TRAILER.pack(f.tell(), TRAILER_MARK))
+
+        # pickle the tracker without its wishlist, which follows separately
+        tracker.set_wishlist(None)
+
+        try:
+            size = atomic_write(path, write)
+        finally:
+            tracker.set_wishlist(wishlist)
+
+        Metrics.add_bytes("snapshot", written = size)
+
+        return size
+
+    @staticmethod
+    def is_complete(path):
+
+        """
+        Checks that a snapshot file was completely written. Format 3 files
+        are checked by their trailer, older ones by ending in a pickle stop.
+        """
+
+        try:
+            with open(path, "rb") as f:
+
+                header = pickle.load(f)
+                size = f.seek(0, os.SEEK_END)
+
+                if isinstance(header, dict) and header.get("format") == SNAPSHOT_FORMAT:
+
+                    if size < TRAILER.size:
+                        return False
+
+                    f.seek(size - TRAILER.size)
+                    length, mark = TRAILER.unpack(f.read(TRAILER.size))
+
+                    return mark == TRAILER_MARK and length == size - TRAILER.size
+
+                f.seek(size - 1)
+
+                return f.read(1) == pickle.STOP
+
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError, IndexError):
+            return False
+
+    def newest(self, username):
+
+        """
+        Returns the path of the user's newest complete snapshot, or None.
+        Uses the manifest (re-read if another process has changed it) and
+        only lists the user's directory if the snapshot it names is missing
+        or incomplete.
+        """
+
+        self.manifest.refresh()
+        path = self.manifest.latest(username)
+
+        if path is not None and self.is_complete(path):
+            return path
+
+        for saved, path in sorted(self.manifest.snapshots(username), reverse = True):
+
+            if self.is_complete(path):
+                return path
+
+        return None
+
+    def saved_seq(self, username):
+
+        """
+        Returns the sequence number of the last change saved for the user:
+        the journal's last change, or the newest snapshot's if the journal is
+        empty. Returns None if nothing is saved.
+        """
+
+        seq = Journal(self.manifest.journal_path(username)).last_seq()
+
+        if seq is not None:
+            return seq
+
+        newest = self.newest(username)
+
+        if newest is None:
+            return None
+
+        header = self.read_header(newest)
+
+        # headers from before the seq was added need the tracker read
+        return header["seq"] if "seq" in header else self.read_snapshot(newest).last_seq()
+
+    def lock(self, username):
+
+        """
+        Returns an exclusive lock on the user's files, to hold from loading a
+        tracker to saving it when other processes may change it too
+        """
+
+        os.makedirs(self.manifest.user_dir(username), exist_ok = True)
+
+        return FileLock(self.manifest.user_lock_path(username))
+
+    def save_names(self, names, now):
+
+        """
+        Writes the tracker names merged with the latest saved ones, since
+        another process may have added names of its own. The names set
+        passed in gets the merged names too.
+        """
+
+        with FileLock(os.path.join(self.root, "names.lock")):
+
+            self.manifest.refresh()
+            latest = self.manifest.latest_names()
+
+            if latest is not None:
+                with open(latest, "rb") as f:
+                    names.update(pickle.load(f))
+
+            names_file = os.path.join(self.root, "tracker_names_" + now + ".pickle")
+            atomic_write(names_file, lambda f: pickle.dump(names, f))
+            self.manifest.update(names_path = names_file)
+
+        self.saved_names = set(names)
+
+    def summaries(self):
+
+        """
+        Returns the snapshot headers of every user with a saved tracker,
+        without reading any wishlists
+        """
+
+        found = []
+
+        for username in self.manifest.usernames():
+
+            path = self.manifest.latest(username)
+
+            if path is not None:
+                found.append(self.read_header(path))
+
+        return found
+
+    def create(self, username):
+
+        """
+        Returns a new tracker for the username
+        """
+
+        self.checkpoints.pop(username, None)
+
+        return Tracker(username)
+
+    def load(self, username):
+
+        """
+        Loads the user's most recent snapshot and replays the journal on top.
+        The wishlist is only read if there are changes to replay or once it's
+        used. Returns None if the user has no snapshot.
+        """
+
+        if not os.path.isdir(self.manifest.user_dir(username)):
+            return None
+
+        # a save can't swap the snapshot and truncate the journal in between
+        with FileLock(self.manifest.user_lock_path(username), shared = True):
+
+            newest = self.newest(username)
+
+            if newest is None:
+                return None
+
+            def fallback():
+                # the snapshot was compacted away after a newer one was saved,
+                # which this tracker is now behind (saving it raises Conflict)
+                return self.read_snapshot(self.newest(username)).get_wishlist().load()
+
+            tracker = self.read_snapshot(newest, fallback)
+
+            self.checkpoints[username] = tracker.last_seq()
+
+            # apply the changes saved since the snapshot was taken
+            Journal(self.manifest.journal_path(username)).replay(tracker)
+
+        return tracker
+
+    def save(self, tracker, username, names):
+
+        """
+        Saves the tracker names into a pickle file inside the data directory
+        if they changed. Appends the tracker's changes since the last save to
+        its journal, and every checkpoint_every changes saves the whole tracker
+        into a pickle file as a checkpoint. Raises Conflict, saving nothing,
+        if the user's tracker was saved from elsewhere since this one was
+        loaded.
+        """
+
+        now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+
+        if names != self.saved_names:
+            self.save_names(names, now)
+
+        with self.lock(username):
+
+            changes = tracker.pop_changes()
+            saved_seq = self.saved_seq(username)
+
+            # the changes must follow on from what's saved, or they'd be
+            # numbered (and replayed) as if another save never happened
+            if saved_seq is not None and saved_seq != tracker.last_seq() - len(changes):
+                raise self.Conflict(username, changes)
+
+            journal = Journal(self.manifest.journal_path(username))
+            journal.append(changes)
+
+            if username not in self.checkpoints or tracker.last_seq() - self.checkpoints[username] >= self.checkpoint_every:
+
+                tracker_file = self.manifest.snapshot_path(username, now)
+
+                self.write_snapshot(tracker_file, tracker)
+
+                # point the manifest at the new snapshot before emptying the
+                # journal, so a crash in between can't lose the changes
+                self.manifest.update(username, tracker_file)
+
+                # the checkpoint covers everything in the journal
+                journal.truncate()
+                self.checkpoints[username] = tracker.last_seq()
+
+        # remove superseded snapshots without holding up the caller
+        if self.retention is not None and time.time() - self.last_compact >= self.compact_interval:
+            self.last_compact = time.time()
+            self.retention.compact_in_background(self.root, report = self.compacted)
+
+    def compacted(self, removed, reclaimed, taken):
+
+        """
+        Keeps the result of a background compaction for last_compaction
+        """
+
+        self.last_compaction = (removed, reclaimed, taken)
@@ -0,0 +1,376 @@
+# import required packages
+
+from Tracker import Tracker
+from Journal import Journal
+from SnapshotStore import SnapshotStore
+from Item import DELETED, NOT_REDEEMED, REDEEMED, item_flags
+import contextlib
+import datetime
+import os
+import pickle
+import sqlite3
+
+# the status column holds an item's status flags (the DELETED and REDEEMED
+# bits of Item.WishlistItem.flags), so 0 is an active item
+ACTIVE = 0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trackers (
+    username TEXT PRIMARY KEY,
+    start_date INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL REFERENCES trackers(username),
+    name TEXT NOT NULL,
+    price REAL NOT NULL,
+    category TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    date INTEGER NOT NULL,
+    redeemed_dt INTEGER NOT NULL,
+    status INTEGER NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS items_username_name ON items (username, name);
+CREATE INDEX IF NOT EXISTS items_username_category ON items (username, category);
+CREATE INDEX IF NOT EXISTS items_username_status_date ON items (username, status, date);
+"""
+
+
+class SqliteWishlist():
+
+    """
+    Wishlist of one user stored in the items table. Items are read and
+    written as rows on demand, and view_wishlist filtering and the calc
+    totals are pushed down into SQL, with the conditions of Item.item_totals
+    and item_aggregates written as WHERE clauses. Changes are committed when
+    the store saves.
+    """
+
+    def __init__(self, conn, username):
+        self.conn = conn
+        self.username = username
+
+    class Row():
+
+        """
+        View of a single item row using the same keys as the default item dicts
+        """
+
+        __slots__ = ("wishlist", "name")
+
+        def __init__(self, wishlist, name):
+            self.wishlist = wishlist
+            self.name = name
+
+        def __getitem__(self, key):
+            return self.wishlist._get(self.name, key)
+
+        def __setitem__(self, key, value):
+            self.wishlist._set(self.name, key, value)
+
+        def keys(self):
+            return ["price", "category", "value", "date", "redeemed_dt", "redeemed", "del_ind"]
+
+        def to_dict(self):
+            return self.wishlist._fetch(self.name)
+
+        def __repr__(self):
+            return repr(self.to_dict())
+
+    @staticmethod
+    def to_dict(record):
+
+        """
+        Converts a (price, category, value, date, redeemed_dt, status) row
+        into an item dict
+        """
+
+        price, category, value, date, redeemed_dt, status = record
+
+        return {"price": price, "category": category, "value": value,
+                "date": datetime.date.fromordinal(date),
+                "redeemed_dt": datetime.date.fromordinal(redeemed_dt),
+                "redeemed": "y" if status & REDEEMED else "n",
+                "del_ind": "y" if status & DELETED else "n"}
+
+    def _fetch(self, name):
+
+        """
+        Returns the item dict of a row
+        """
+
+        record = self.conn.execute("SELECT price, category, value, date, redeemed_dt, status "
+                                   "FROM items WHERE username = ? AND name = ?",
+                                   (self.username, name)).fetchone()
+
+        if record is None:
+            raise KeyError(name)
+
+        return self.to_dict(record)
+
+    def _get(self, name, key):
+
+        """
+        Reads a field of a row, converting it to the dict representation
+        """
+
+        return self._fetch(name)[key]
+
+    def _set(self, name, key, value):
+
+        """
+        Writes a field of a row from its dict representation
+        """
+
+        if key in ("price", "category", "value"):
+            column, value = key, value
+        elif key in ("date", "redeemed_dt"):
+            column, value = key, value.toordinal()
+        elif key in ("redeemed", "del_ind"):
+            # set or clear just the one flag, the other is kept
+            bit = REDEEMED if key == "redeemed" else DELETED
+            self.conn.execute("UPDATE items SET status = {} WHERE username = ? AND name = ?".format(
+                "status | ?" if value[0] == "y" else "status & ~?"), (bit, self.username, name))
+            return
+        else:
+            raise KeyError(key)
+
+        self.conn.execute("UPDATE items SET {} = ? WHERE username = ? AND name = ?".format(column),
+                          (value, self.username, name))
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM items WHERE username = ?",
+                                 (self.username,)).fetchone()[0]
+
+    def __contains__(self, item):
+        return self.conn.execute("SELECT 1 FROM items WHERE username = ? AND name = ?",
+                                 (self.username, item)).fetchone() is not None
+
+    def keys(self):
+        return [r[0] for r in self.conn.execute("SELECT name FROM items WHERE username = ? ORDER BY id",
+                                                (self.username,))]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def items(self):
+
+        cursor = self.conn.execute("SELECT name, price, category, value, date, redeemed_dt, status "
+                                   "FROM items WHERE username = ? ORDER BY id", (self.username,))
+
+        for record in cursor:
+            yield record[0], self.to_dict(record[1:])
+
+    def values(self):
+        return (item for name, item in self.items())
+
+    def __getitem__(self, item):
+
+        if item not in self:
+            raise KeyError(item)
+
+        return self.Row(self, item)
+
+    def __setitem__(self, item, fields):
+
+        """
+        Upserts an item from an item dict
+        """
+
+        status = item_flags(fields)
+
+        self.conn.execute("INSERT INTO items (username, name, price, category, value, date, redeemed_dt, status) "
+                          "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                          "ON CONFLICT (username, name) DO UPDATE SET price = excluded.price, "
+                          "category = excluded.category, value = excluded.value, date = excluded.date, "
+                          "redeemed_dt = excluded.redeemed_dt, status = excluded.status",
+                          (self.username, item, fields["price"], fields["category"], fields["value"],
+                           fields["date"].toordinal(), fields["redeemed_dt"].toordinal(), status))
+
+    def totals(self, today):
+
+        """
+        SQL version of Tracker.calc(). Takes today's date ordinal and returns
+        the points, wishlist points and cost.
+        """
+
+        points, wl_points, cost = self.conn.execute(
+            "SELECT COALESCE(SUM(? - date), 0), COALESCE(SUM(value), 0), COALESCE(SUM(price), 0) "
+            "FROM items WHERE username = ? AND status = ? AND date <= ?",
+            (today, self.username, ACTIVE, today)).fetchone()
+
+        points += self.conn.execute(
+            "SELECT COALESCE(SUM(ABS(redeemed_dt - date) - value), 0) FROM items "
+            "WHERE username = ? AND status & ? = 0 AND redeemed_dt > ? AND redeemed_dt <= ?",
+            (self.username, DELETED, NOT_REDEEMED, today)).fetchone()[0]
+
+        return points, wl_points, cost
+
+    def aggregates(self):
+
+        """
+        SQL pass used by Tracker to rebuild its running aggregates. Returns
+        the active count, sum of active add date ordinals, active value and
+        price totals, redeemed points and latest date ordinal.
+        """
+
+        count, ord_sum, value, price, max_active = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(date), 0), COALESCE(SUM(value), 0), "
+            "COALESCE(SUM(price), 0), COALESCE(MAX(date), 0) "
+            "FROM items WHERE username = ? AND status = ?",
+            (self.username, ACTIVE)).fetchone()
+
+        redeemed_points, max_redeemed = self.conn.execute(
+            "SELECT COALESCE(SUM(ABS(redeemed_dt - date) - value), 0), "
+            "COALESCE(MAX(MAX(redeemed_dt, date)), 0) FROM items "
+            "WHERE username = ? AND status & ? = 0 AND redeemed_dt > ?",
+            (self.username, DELETED, NOT_REDEEMED)).fetchone()
+
+        return count, ord_sum, value, price, redeemed_points, max(max_active, max_redeemed)
+
+    def rows(self, only_active = "y"):
+
+        """
+        Returns the table rows for Tracker.view_wishlist, filtered in SQL
+        """
+
+        formatted_wl = []
+
+        if only_active == "y":
+
+            cursor = self.conn.execute("SELECT name, date, category, price, value FROM items "
+                                       "WHERE username = ? AND status = ? ORDER BY id",
+                                       (self.username, ACTIVE))
+
+            for name, date, category, price, value in cursor:
+                formatted_wl.append((name, datetime.date.fromordinal(date).strftime("%m/%d/%Y"),
+                                     category, float(price), value))
+
+        else:
+
+            cursor = self.conn.execute("SELECT name, date, category, price, value, status FROM items "
+                                       "WHERE username = ? ORDER BY id", (self.username,))
+
+            for name, date, category, price, value, status in cursor:
+                formatted_wl.append((name, datetime.date.fromordinal(date).strftime("%m/%d/%Y"),
+                                     category, float(price), value,
+                                     "y" if status & DELETED else "n",
+                                     "y" if status & REDEEMED else "n"))
+
+        return formatted_wl
+
+
+class SqliteStore():
+
+    """
+    Storage for Session backed by a SQLite database, used with
+    Session(store = SqliteStore()). Trackers are loaded lazily: items are
+    queried as they're needed instead of read up front, and a save is a
+    commit of the changes made since the last one. Pickled trackers can be
+    imported and exported.
+    """
+
+    def __init__(self, path = "data/trackers.db"):
+
+        directory = os.path.dirname(path)
+
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def load_names(self):
+
+        """
+        Returns the set of saved tracker names
+        """
+
+        return set(r[0] for r in self.conn.execute("SELECT username FROM trackers"))
+
+    def create(self, username, start_date = None):
+
+        """
+        Returns a new tracker for the username. It's stored at the next save.
+        """
+
+        start_date = datetime.date.today() if start_date is None else start_date
+        self.conn.execute("INSERT INTO trackers (username, start_date) VALUES (?, ?)",
+                          (username, start_date.toordinal()))
+
+        return Tracker(username, wishlist = SqliteWishlist(self.conn, username), start_date = start_date)
+
+    def lock(self, username):
+
+        """
+        Returns a no-op lock, SQLite does its own locking
+        """
+
+        return contextlib.nullcontext()
+
+    def load(self, username):
+
+        """
+        Returns the user's tracker, or None if there isn't one
+        """
+
+        record = self.conn.execute("SELECT start_date FROM trackers WHERE username = ?",
+                                   (username,)).fetchone()
+
+        if record is None:
+            return None
+
+        return Tracker(username, wishlist = SqliteWishlist(self.conn, username),
+                       start_date = datetime.date.fromordinal(record[0]))
+
+    def save(self, tracker, username, names):
+
+        """
+        Commits the tracker's changes. Tracker names are the trackers table,
+        so they don't need saving separately.
+        """
+
+        # the changes are already in the database, so there's nothing to journal
+        tracker.pop_changes()
+        self.conn.commit()
+
+    def import_pickle(self, path):
+
+        """
+        Copies a pickled tracker into the database and returns its username.
+        Takes a SnapshotStore snapshot (with the changes journaled after it,
+        if it's the newest in its directory) or an older single pickle file.
+        """
+
+        tracker = SnapshotStore.read_snapshot(path)
+        journal = Journal(os.path.join(os.path.dirname(path), "journal"))
+        first = next(journal.read(), None)
+
+        # the journal carries on from the user's newest snapshot only
+        if first is not None and first[0] <= tracker.last_seq() + 1:
+            journal.replay(tracker)
+
+        info = tracker.summary()
+        self.create(info["username"], info["start_date"])
+        wishlist = SqliteWishlist(self.conn, info["username"])
+
+        for name, item in tracker.items():
+            wishlist[name] = dict(item)
+
+        self.conn.commit()
+
+        return info["username"]
+
+    def export_pickle(self, username, path):
+
+        """
+        Pickles a copy of the user's tracker that doesn't depend on the database
+        """
+
+        tracker = self.load(username)
+        info = tracker.summary()
+        exported = Tracker(username, wishlist = dict((name, dict(item)) for name, item in tracker.items()),
+                           start_date = info["start_date"])
+
+        with open(path, "wb") as f:
+            pickle.dump(exported, f)
@@ -1,22 +1,39 @@
 # import reqire packages
 
+import collections
 import datetime
+import math
 import time
 from tabulate import tabulate
+from Search import PrefixTrie, TrigramIndex
+from Index import SecondaryIndex
+from History import PointHistory
+from Item import Wishlist, WishlistItem, check_hooks, item_aggregates, item_fields, item_status, item_totals
+import Metrics
 
 
+@Metrics.instrumented
 class Tracker():
 
     """
     Tracker object to hold the wishlist items and track point values
+
+    The wishlist defaults to an Item.Wishlist, a dict of item names to compact
+    WishlistItem records that index like the item dicts older versions kept
+    (a plain dict of item dicts passed in or unpickled is upgraded to one).
+    Any object that behaves like that dict can be passed in instead (e.g.
+    Columnar.ColumnarWishlist). If it also provides rows(only_active),
+    totals(today) or aggregates(), those are used in place of the Python
+    loops in view_wishlist, calc and the aggregate rebuild, and have to
+    count items by the rules in Item (item_totals and item_aggregates).
     """
 
-    def __init__(self, username):
+    def __init__(self, username, wishlist = None, start_date = None):
 
         # creates the wishlist dict
-        self.__wishlist = dict()
+        self.__wishlist = Wishlist() if wishlist is None else Wishlist.upgrade(wishlist)
         # captures when the tracker was started
-        self.__start_date = datetime.date.today()
+        self.__start_date = datetime.date.today() if start_date is None else start_date
         # captures current date for state purposes
         self.__cur_date = datetime.date.today()
         # inital points accumulated
@@ -27,6 +44,75 @@ class Tracker():
         self.__cost = 0
         # get a username
         self.__username = username
+        # running aggregates so points don't need a full rescan of the wishlist:
+        # number of active items and the sum of their add date ordinals
+        self.__active_count = 0
+        self.__active_ord_sum = 0
+        # value and price totals of the active items
+        self.__active_value = 0
+        self.__active_price = 0
+        # net points from redeemed items (days held minus value redeemed)
+        self.__redeemed_points = 0
+        # latest date ordinals after today of the items that have one, with
+        # how many items each, since those don't count towards today's totals yet
+        self.__future = collections.Counter()
+        # number of changes applied and the changes that haven't been saved yet
+        self.__seq = 0
+        self.__pending = []
+        # fuzzy search index over item names and completion trie over active
+        # item names, built on first use
+        self.__search_index = None
+        self.__name_trie = None
+        # category, status and date indexes, built on first query
+        self.__indexes = None
+        # points balance by date, built on first history query
+        self.__history = None
+
+        # a wishlist passed in may already hold items
+        if len(self.__wishlist) > 0:
+            self.__rebuild()
+
+    def __getstate__(self):
+
+        # unsaved changes are written to the journal, not the snapshot
+        state = self.__dict__.copy()
+        state.pop("_Tracker__pending", None)
+        # the search indexes are rebuilt when they're next needed
+        state.pop("_Tracker__search_index", None)
+        state.pop("_Tracker__name_trie", None)
+        state.pop("_Tracker__indexes", None)
+        state.pop("_Tracker__history", None)
+
+        return state
+
+    def __setstate__(self, state):
+
+        """
+        Restores a pickled tracker. Trackers pickled before the running
+        aggregates existed get them rebuilt from the wishlist.
+        """
+
+        self.__dict__.update(state)
+        # wishlists of item dicts from older versions become compact records
+        self.__wishlist = Wishlist.upgrade(self.__wishlist)
+        self.__pending = []
+        self.__search_index = None
+        self.__name_trie = None
+        self.__indexes = None
+        self.__history = None
+
+        if "_Tracker__seq" not in state:
+            self.__seq = 0
+
+        if "_Tracker__active_count" not in state:
+            self.__rebuild()
+
+        elif "_Tracker__future" not in state:
+            # pickled when only the latest date was kept
+            self.__future = collections.Counter()
+
+            if self.__dict__.pop("_Tracker__max_ord", 0) > datetime.date.today().toordinal():
+                self.__count_future()
 
     class IsDel(Exception):
 
@@ -91,13 +177,113 @@ class Tracker():
 
             return "{} --> {}".format(self.item, self.message)
 
+    class RowCursor():
+
+        """
+        Sorted and filtered view over the wishlist names for paging through
+        large wishlists. The sort happens once when the cursor is made, after
+        that formatting a page only touches the items on it.
+        """
+
+        # columns that can be sorted by
+        sort_keys = ("item", "date", "category", "price", "value")
+
+        def __init__(self, tracker, only_active = "y", sort_by = None, reverse = False):
+
+            self.tracker = tracker
+            self.only_active = only_active
+            self.sort_by = sort_by
+            self.reverse = reverse
+
+            if sort_by is None:
+                self.names = [name for name, temp in tracker.iter_rows(only_active)]
+            elif sort_by == "item":
+                self.names = sorted((name for name, temp in tracker.iter_rows(only_active)), reverse = reverse)
+            else:
+                pairs = [(temp[sort_by], name) for name, temp in tracker.iter_rows(only_active)]
+                pairs.sort(reverse = reverse)
+                self.names = [name for value, name in pairs]
+
+        def __len__(self):
+            return len(self.names)
+
+        def pages(self, size):
+
+            """
+            Returns the number of pages of the given size
+            """
+
+            return max((len(self.names) + size - 1) // size, 1)
+
+        def page(self, number, size):
+
+            """
+            Returns a tabulate table of page number (starting at 1) of the given size
+            """
+
+            headers = ["Item", "Date", "Category", "Price", "Value"]
+            formatted_wl = []
+
+            if self.only_active == "n":
+                headers += ["Deleted?","Redeemed?"]
+
+            for name in self.names[(number - 1) * size:number * size]:
+
+                v = self.tracker.search_wishlist(name)
+                row = (name, v["date"].strftime("%m/%d/%Y"), v["category"], float(v["price"]), v["value"])
+
+                if self.only_active == "n":
+                    row += (v["del_ind"], v["redeemed"])
+
+                formatted_wl.append(row)
+
+            return tabulate(formatted_wl, headers = headers)
+
+    def cursor(self, only_active = "y", sort_by = None, reverse = False):
+
+        """
+        Function to return a RowCursor for paging through the wishlist, sorted
+        by item, date, category, price or value (or in the order added)
+        """
+
+        return self.RowCursor(self, only_active, sort_by, reverse)
+
     def tracker_info(self, debug = "n"):
 
         print("Start Date of Tracker:", self.__start_date)
         print("Username is:", self.__username)
 
+        # points balance over the life of the tracker, in at most 12 steps
+        days = (datetime.date.today() - self.__start_date).days
+        history = self.points_history(step = max(days // 11, 1))
+
+        if len(history) > 0 and history[-1][0] != datetime.date.today():
+            history.append((datetime.date.today(), self.points_on(datetime.date.today())))
+
+        print(tabulate([(d.strftime("%m/%d/%Y"), p) for d, p in history], headers = ["Date", "Points"]))
+
         if debug == "y":
-            print("Wishlist contains:", self.__wishlist)
+            # counts rather than the items themselves, which can run to millions
+            counts = collections.Counter(item_status(temp) for temp in self.__wishlist.values())
+            print("Wishlist items: {} ({} active, {} redeemed, {} deleted)".format(
+                len(self.__wishlist), counts["active"], counts["redeemed"], counts["deleted"]))
+            print("Running totals verified:", self.calc())
+            print("Wishlist hook problems:", check_hooks(self.__wishlist, datetime.date.today().toordinal()) or "none")
+            print("Points history verified:", self.points_on(datetime.date.today()) == self.__points)
+            print("Index problems:", self.check_indexes() or "none")
+
+    @Metrics.hot
+    def summary(self):
+
+        """
+        Function to return the tracker's details and current totals as a dict
+        """
+
+        self.refresh()
+
+        return {"username": self.__username, "start_date": self.__start_date,
+                "items": len(self.__wishlist), "points": self.__points,
+                "wl_points": self.__wl_points, "cost": self.__cost}
 
     def is_in_wishlist(self, item):
 
@@ -105,7 +291,7 @@ class Tracker():
         Function to check whether something is in the wishlist
         """
 
-        return item in self.__wishlist.keys()
+        return item in self.__wishlist
 
     def is_deleted(self, item):
 
@@ -134,6 +320,7 @@ class Tracker():
             return False
 
 
+    @Metrics.hot
     def view_wishlist(self, only_active = "y"):
 
         """
@@ -145,7 +332,14 @@ class Tracker():
         formatted_wl = []
         headers = ["Item", "Date", "Category", "Price", "Value"]
 
-        if only_active == "y":
+        if hasattr(self.__wishlist, "rows"):
+
+            formatted_wl = self.__wishlist.rows(only_active)
+
+            if only_active == "n":
+                headers += ["Deleted?","Redeemed?"]
+
+        elif only_active == "y":
 
             for k, v in self.__wishlist.items():
                 if v["redeemed"][0] == "n" and v["del_ind"][0] == "n":
@@ -164,6 +358,47 @@ class Tracker():
         return tabulate(formatted_wl, headers = headers)
 
 
+    def status(self, temp):
+
+        """
+        Function to return the status of an item dict: active, deleted or redeemed
+        """
+
+        return item_status(temp)
+
+    def iter_rows(self, only_active = "y", status = None, category = None, start = None, end = None):
+
+        """
+        Function to lazily yield (item name, item dict) pairs of the wishlist.
+        Like view_wishlist it either yields only active items or all items,
+        and can also filter by status (active, deleted or redeemed), category
+        and an add date range (start and end dates, both inclusive).
+        """
+
+        if status is None and category is None and start is None and end is None:
+
+            # keep the order items were added in
+            for k, v in self.__wishlist.items():
+
+                if only_active == "y" and (v["redeemed"][0] == "y" or v["del_ind"][0] == "y"):
+                    continue
+
+                yield k, v
+
+            return
+
+        if only_active == "y":
+
+            if status not in (None, "active"):
+                return
+
+            status = "active"
+
+        # filtered views come from the secondary indexes
+        for k in self.query(category, status, start, end):
+            yield k, self.__wishlist[k]
+
+    @Metrics.hot
     def add_item(self, item, price, category, value,
                           override_dates = "n", date = datetime.date(1900, 1, 1)):
 
@@ -174,23 +409,55 @@ class Tracker():
         if not self.is_in_wishlist(item):
 
             if override_dates == "n":
-                self.__wishlist[item] = {"price":price, "category":category,
-                                         "value":value, "date":datetime.date.today(),
-                                         "redeemed_dt":datetime.date(1900, 1, 1), "redeemed":"n",
-                                        "del_ind": "n"}
+                self.__record(("add", item, {"price":price, "category":category,
+                                             "value":value, "date":datetime.date.today(),
+                                             "redeemed_dt":datetime.date(1900, 1, 1), "redeemed":"n",
+                                             "del_ind": "n"}))
                 print("Item added to wishlist")
 
             elif override_dates == "y":
                 # allows overriding logging today's date in case we're backtracking
-                self.__wishlist[item] = {"price":price, "category":category,
-                                         "value":value, "date":date,
-                                         "redeemed_dt":datetime.date(1900, 1, 1), "redeemed":"n",
-                                        "del_ind": "n"}
+                self.__record(("add", item, {"price":price, "category":category,
+                                             "value":value, "date":date,
+                                             "redeemed_dt":datetime.date(1900, 1, 1), "redeemed":"n",
+                                             "del_ind": "n"}))
                 print("Item added to wishlist")
 
         else:
             print("Item is already in wishlist")
 
+    @Metrics.hot
+    def add_items(self, items):
+
+        """
+        Function to add many wishlist items at once, e.g. from an import. Takes
+        an iterable of (item, price, category, value, date) tuples, where a date
+        of None means today. Items already in the wishlist (or repeated in the
+        batch) are skipped. Nothing is printed and the totals are recomputed
+        once at the end. Returns the number added and the names skipped.
+        """
+
+        added = 0
+        skipped = []
+        today = datetime.date.today()
+
+        for item, price, category, value, date in items:
+
+            if item in self.__wishlist:
+                skipped.append(item)
+                continue
+
+            self.__record(("add", item, {"price":price, "category":category,
+                                         "value":value, "date":today if date is None else date,
+                                         "redeemed_dt":datetime.date(1900, 1, 1), "redeemed":"n",
+                                         "del_ind": "n"}), refresh = False)
+            added += 1
+
+        self.refresh()
+
+        return added, skipped
+
+    @Metrics.hot
     def del_item(self, item):
 
         """
@@ -209,7 +476,7 @@ class Tracker():
             if self.__wishlist[item]["redeemed"] == "y":
                 raise self.IsRedeemed(item)
 
-            self.__wishlist[item]["del_ind"] = "y"
+            self.__record(("delete", item))
             print("Item deleted from wishlist")
 
         except self.NotInWishlist:
@@ -222,6 +489,7 @@ class Tracker():
             print("Unable to perform action. Cannot delete a redeemed item.")
 
 
+    @Metrics.hot
     def update_item(self, item, to_update, update):
 
         """
@@ -239,7 +507,7 @@ class Tracker():
             if self.__wishlist[item]["redeemed"] == "y":
                 raise self.IsRedeemed(item)
 
-            self.__wishlist[item][to_update] = update
+            self.__record(("update", item, to_update, update))
             print("Item has been updated")
 
         except self.NotInWishlist:
@@ -251,39 +519,344 @@ class Tracker():
         except self.IsRedeemed:
             print("Unable to perform action. Cannot delete a redeemed item.")
 
+    def __apply(self, op):
+
+        """
+        Applies a change to the wishlist and the running aggregates without
+        any checks or printing. Changes are tuples of:
+
+        ("add", item, item dict)
+        ("update", item, key, new value)
+        ("delete", item)
+        ("redeem", item, redeemed date)
+        """
+
+        action, item = op[0], op[1]
+
+        rebuilt = False
+
+        # take the item out of the secondary indexes, history and future dates while it changes
+        if self.__indexes is not None and action != "add":
+            self.__indexes.remove(item, self.__wishlist[item])
+
+        if self.__history is not None and action != "add":
+            self.__history.remove(item, self.__wishlist[item])
+
+        if action != "add":
+            self.__track_future(self.__wishlist[item], -1)
+
+        if action == "add":
+
+            self.__wishlist[item] = WishlistItem.from_fields(op[2])
+            self.__add_active(self.__wishlist[item])
+
+            if self.__search_index is not None:
+                self.__search_index.add(item)
+
+            if self.__name_trie is not None:
+                self.__name_trie.add(item)
+
+        elif action == "delete":
+
+            temp = self.__wishlist[item]
+            temp["del_ind"] = "y"
+            self.__remove_active(temp)
+
+            if self.__name_trie is not None:
+                self.__name_trie.remove(item)
+
+        elif action == "update":
+
+            temp = self.__wishlist[item]
+            to_update, update = op[2], op[3]
+
+            if to_update in ("price", "value", "date"):
+                # swap the item's old contribution for the new one
+                self.__remove_active(temp)
+                temp[to_update] = update
+                self.__add_active(temp)
+
+            elif to_update == "category":
+                temp[to_update] = update
+
+            else:
+                # anything touching the status fields needs a full rebuild
+                temp[to_update] = update
+                self.__rebuild()
+                self.__name_trie = None
+                rebuilt = True
+
+        elif action == "redeem":
+
+            temp = self.__wishlist[item]
+            temp["redeemed"] = "y"
+            temp["redeemed_dt"] = op[2]
+
+            # move the item from the active totals into the redeemed ledger
+            self.__remove_active(temp)
+            self.__redeemed_points += item_aggregates(*item_fields(temp))[4]
+
+            if self.__name_trie is not None:
+                self.__name_trie.remove(item)
+
+        if self.__indexes is not None:
+            self.__indexes.add(item, self.__wishlist[item])
+
+        if self.__history is not None:
+            self.__history.add(item, self.__wishlist[item])
+
+        # a rebuild has counted it already
+        if not rebuilt:
+            self.__track_future(self.__wishlist[item], 1)
+
+        self.__seq += 1
+
+    def __record(self, op, refresh = True):
+
+        """
+        Applies a change and keeps it in the list of changes not yet saved
+        """
+
+        self.__apply(op)
+        self.__pending.append((self.__seq, op))
+
+        if refresh:
+            self.refresh()
+
+    def replay(self, seq, op):
+
+        """
+        Re-applies a saved change (see Journal) if the tracker doesn't already
+        include it. Call refresh() once done replaying.
+        """
+
+        if seq > self.__seq:
+            self.__apply(op)
+
+    def rebase(self, changes):
+
+        """
+        Function to re-apply changes made to another copy of this tracker
+        (pop_changes() of a copy loaded before someone else saved) on top of
+        this one, as new changes. Changes that no longer apply, e.g. updating
+        an item the other save deleted, are skipped. Returns the skipped
+        (sequence number, change) pairs.
+        """
+
+        skipped = []
+
+        for seq, op in changes:
+
+            action, item = op[0], op[1]
+
+            if action == "add":
+                applies = item not in self.__wishlist
+            else:
+                applies = (item in self.__wishlist and self.__wishlist[item]["del_ind"] == "n"
+                           and self.__wishlist[item]["redeemed"] == "n")
+
+            if applies:
+                self.__record(op, refresh = False)
+            else:
+                skipped.append((seq, op))
+
+        self.refresh()
+
+        return skipped
+
+    def last_seq(self):
+
+        """
+        Returns the sequence number of the last change applied to the tracker
+        """
+
+        return self.__seq
+
+    def pop_changes(self):
+
+        """
+        Returns the (sequence number, change) pairs made since the last call
+        and clears them
+        """
+
+        changes = self.__pending
+        self.__pending = []
+
+        return changes
+
+    def __add_active(self, temp):
+
+        """
+        Adds an active item's contribution to the running aggregates
+        """
+
+        self.__active_count += 1
+        self.__active_ord_sum += temp["date"].toordinal()
+        self.__active_value += temp["value"]
+        self.__active_price += temp["price"]
+
+    def __remove_active(self, temp):
+
+        """
+        Removes an active item's contribution from the running aggregates
+        """
+
+        self.__active_count -= 1
+        self.__active_ord_sum -= temp["date"].toordinal()
+        self.__active_value -= temp["value"]
+        self.__active_price -= temp["price"]
+
+    def __rebuild(self):
+
+        """
+        Recomputes the running aggregates with a full pass over the wishlist
+        """
+
+        today = datetime.date.today().toordinal()
+
+        if hasattr(self.__wishlist, "aggregates"):
+
+            (self.__active_count, self.__active_ord_sum, self.__active_value,
+             self.__active_price, self.__redeemed_points, max_ord) = self.__wishlist.aggregates()
+            self.__future = collections.Counter()
+
+            # the hook only gives the latest date, so find the future ones if there are any
+            if max_ord > today:
+                self.__count_future()
+
+            return
+
+        self.__active_count = 0
+        self.__active_ord_sum = 0
+        self.__active_value = 0
+        self.__active_price = 0
+        self.__redeemed_points = 0
+        self.__future = collections.Counter()
+
+        for temp in self.__wishlist.values():
+
+            count, ord_sum, value, price, redeemed_points, max_ord = item_aggregates(*item_fields(temp))
+            self.__active_count += count
+            self.__active_ord_sum += ord_sum
+            self.__active_value += value
+            self.__active_price += price
+            self.__redeemed_points += redeemed_points
+
+            if max_ord > today:
+                self.__future[max_ord] += 1
+
+    def __count_future(self):
+
+        """
+        Counts the future dates of the items with a pass over the wishlist
+        """
+
+        self.__future = collections.Counter()
+
+        for temp in self.__wishlist.values():
+            self.__track_future(temp, 1)
+
+    def __track_future(self, temp, sign):
+
+        """
+        Adds an item's latest date to the future dates if it's after today
+        (sign 1), or takes it back out (sign -1)
+        """
+
+        latest = item_aggregates(*item_fields(temp))[5]
+
+        if sign > 0 and latest > datetime.date.today().toordinal():
+            self.__future[latest] += 1
+
+        elif sign < 0 and latest in self.__future:
+            self.__future[latest] -= 1
+
+            if self.__future[latest] == 0:
+                del self.__future[latest]
+
+    def __has_future(self, today):
+
+        """
+        Returns whether any item is dated after today, first dropping the
+        dates that have since passed
+        """
+
+        if len(self.__future) > 0:
+            for day in [day for day in self.__future if day <= today]:
+                del self.__future[day]
+
+        return len(self.__future) > 0
+
+    @Metrics.hot
+    def refresh(self):
+
+        """
+        Function to update the points and cost from the running aggregates in
+        constant time. Falls back to a full calc() when an item is dated in
+        the future, since those don't count towards today's totals yet.
+        """
+
+        today = datetime.date.today().toordinal()
+
+        if self.__has_future(today):
+            self.calc()
+            return
+
+        self.__points = (self.__active_count * today - self.__active_ord_sum
+                         + self.__redeemed_points)
+        self.__wl_points = self.__active_value
+        self.__cost = self.__active_price
+
+    @Metrics.hot
     def calc(self):
 
         """
         Function to calculate the total points and cost based on the number of
          non-redeemed items current in the list
+
+        This walks the whole wishlist, so it's kept as a verifier of the running
+        aggregates used by refresh(). Returns True if they agree; otherwise the
+        aggregates are rebuilt and False is returned.
         """
 
         points = 0
         wl_points = 0
         cost = 0
+        today = datetime.date.today()
 
-        for item in self.__wishlist.keys():
-            temp = self.__wishlist[item]
+        if hasattr(self.__wishlist, "totals"):
+            points, wl_points, cost = self.__wishlist.totals(today.toordinal())
+
+        else:
+            for item in self.__wishlist.keys():
 
-            # for items that are active and haven't been redeemed or deleted
-            if temp["date"] <= datetime.date.today() and temp["redeemed"][0] == "n" and temp["del_ind"][0] == "n":
+                # active items earn until today, redeemed ones count the days held less the value
+                p, w, c = item_totals(*item_fields(self.__wishlist[item]), today.toordinal())
+                points += p
+                wl_points += w
+                cost += c
 
-                points += abs(datetime.date.today() - temp["date"]).days
-                wl_points += temp["value"]
-                cost += temp["price"]
+        verified = True
 
-            # for items that have been redeemed, add back the value up until redeemed
-            # then subtracted the value redeemed
-            if temp["redeemed_dt"] > datetime.date(1900, 1, 1) and temp["redeemed_dt"] <= datetime.date.today() and temp["del_ind"][0] == "n":
+        # future dated items are left out above, so only compare when there are none
+        if not self.__has_future(today.toordinal()):
 
-                points += abs(temp["redeemed_dt"] - temp["date"]).days
-                points -= temp["value"]
+            expected = (self.__active_count * today.toordinal() - self.__active_ord_sum
+                        + self.__redeemed_points)
+
+            # cost is a float sum so allow for rounding differences
+            if (expected, self.__active_value) != (points, wl_points) or not math.isclose(self.__active_price, cost, abs_tol = 1e-6):
+                verified = False
+                self.__rebuild()
 
         # set points attribute
         self.__points = points
         self.__cost = cost
         self.__wl_points = wl_points
 
+        return verified
+
+    @Metrics.hot
     def redeem_item(self, item, override_dates = "n", override_date = datetime.date(1900, 1, 1)):
 
         """
@@ -307,20 +880,19 @@ class Tracker():
             if self.__wishlist[item]["redeemed"] == "y":
                 raise self.IsRedeemed(item)
 
+            # make sure the point total is current before checking it
+            self.refresh()
+
             if self.__wishlist[item]["value"] > self.__points:
                 raise self.NotEnough(item)
 
-            self.__wishlist[item]["redeemed"] = "y"
-            self.__points -= self.__wishlist[item]["value"]
-            self.__cost -= self.__wishlist[item]["price"]
-
             if override_dates == "n":
 
-                self.__wishlist[item]["redeemed_dt"] = datetime.date.today()
+                self.__record(("redeem", item, datetime.date.today()))
 
             elif override_dates == "y":
 
-                self.__wishlist[item]["redeemed_dt"] = override_date
+                self.__record(("redeem", item, override_date))
 
             print("Item successfully redeemed!")
 
@@ -337,6 +909,120 @@ class Tracker():
             print("Unable to perform action. Item value exceeds the accumulated point total!")
 
 
+    def get_wishlist(self):
+
+        """
+        Function to return the wishlist storage object
+        """
+
+        return self.__wishlist
+
+    def set_wishlist(self, wishlist):
+
+        """
+        Function to swap in a wishlist storage object holding the same items,
+        e.g. one that loads them lazily. The running aggregates are kept.
+        """
+
+        self.__wishlist = wishlist
+        self.__search_index = None
+        self.__name_trie = None
+        self.__indexes = None
+        self.__history = None
+
+    def items(self):
+
+        """
+        Function to iterate over (item name, item dict) pairs of the whole wishlist
+        """
+
+        return iter(self.__wishlist.items())
+
+    @Metrics.hot
+    def fuzzy_search(self, query, k = 5):
+
+        """
+        Function to return up to k (item name, similarity score) pairs of
+        items whose names approximately match the query, best match first.
+        Matching ignores case, accents and punctuation and tolerates typos.
+        """
+
+        if self.__search_index is None:
+            self.__search_index = TrigramIndex(self.__wishlist.keys())
+
+        return self.__search_index.search(query, k)
+
+    @Metrics.hot
+    def query(self, category = None, status = None, start = None, end = None, date_field = "date"):
+
+        """
+        Function to return the names of items matching all the filters given:
+        category, status (active, deleted or redeemed) and an inclusive date
+        range on the add date, or the redeemed date if date_field is
+        "redeemed_dt". Uses the secondary indexes, so the cost follows the
+        number of results rather than the size of the wishlist.
+        """
+
+        if self.__indexes is None:
+            self.__indexes = SecondaryIndex(self.__wishlist.items())
+
+        return self.__indexes.query(category, status, start, end, date_field)
+
+    @Metrics.hot
+    def points_on(self, date):
+
+        """
+        Function to return the points balance as of a date, counting items
+        added and redeemed up to then. Runs in O(log days) once the history
+        has been built.
+        """
+
+        if self.__history is None:
+            self.__history = PointHistory(self.__wishlist.items())
+
+        return self.__history.points_on(date)
+
+    @Metrics.hot
+    def points_history(self, start = None, end = None, step = 1):
+
+        """
+        Function to return (date, points) pairs from start (default the start
+        date of the tracker) to end (default today) every step days
+        """
+
+        if self.__history is None:
+            self.__history = PointHistory(self.__wishlist.items())
+
+        start = self.__start_date if start is None else start
+        end = datetime.date.today() if end is None else end
+
+        return self.__history.series(start, end, step)
+
+    def check_indexes(self):
+
+        """
+        Function to check the secondary indexes against the wishlist, returning
+        a list of the problems found (empty if they're consistent)
+        """
+
+        if self.__indexes is None:
+            return []
+
+        return self.__indexes.check(self.__wishlist.items())
+
+    @Metrics.hot
+    def complete(self, prefix, limit = 50):
+
+        """
+        Function to return up to limit active item names starting with prefix
+        """
+
+        if self.__name_trie is None:
+            self.__name_trie = PrefixTrie(name for name, temp in self.iter_rows("y"))
+
+        return self.__name_trie.complete(prefix, limit)
+
+    @Metrics.hot
     def search_wishlist(self, item):
 
         """
@@ -0,0 +1,80 @@
+"""
+Checks shared by the interactive prompts in Session and the bulk importers.
+Each takes the text entered and returns the converted value, or raises
+ValueError with a message to show the user.
+"""
+
+# import required packages
+
+import datetime
+
+# item categories by their menu number
+CATEGORIES = {"1": "Beauty/Skincare", "2":"Books", "3":"Clothing/Accessories",
+              "4": "Electronics", "5":"Food", "6":"Jewelry", "7":"Other"}
+
+
+def parse_price(resp):
+
+    """
+    Returns the price as a float. No zero dollars or negative numbers.
+    """
+
+    try:
+        price = float(resp)
+    except (TypeError, ValueError):
+        # catches if they put non-numerical values
+        raise ValueError("Invalid monetary value. Please try again.")
+
+    if price <= 0:
+        raise ValueError("Please enter a price that is greater than 0 dollars.")
+
+    return price
+
+
+def parse_value(resp):
+
+    """
+    Returns the point value as an int between 100 and 2000
+    """
+
+    try:
+        value = int(resp)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid response. Please try again.")
+
+    if value < 100 or value > 2000:
+        raise ValueError("Invalid response. Please try again.")
+
+    return value
+
+
+def parse_date(resp):
+
+    """
+    Returns a MM/DD/YYYY date as a date object. Dates should be after 1/1/1970.
+    """
+
+    try:
+        date = datetime.datetime.strptime(resp, "%m/%d/%Y").date()
+    except (TypeError, ValueError):
+        raise ValueError("Invalid date. Please use the MM/DD/YYYY format. Try again.")
+
+    if date <= datetime.date(1970, 1, 1):
+        raise ValueError("Is this correct? Dates should be at least after 1/1/1970! Try again.")
+
+    return date
+
+
+def parse_category(resp):
+
+    """
+    Returns the category for its menu number or its name
+    """
+
+    if resp in CATEGORIES:
+        return CATEGORIES[resp]
+
+    if resp in CATEGORIES.values():
+        return resp
+
+    raise ValueError("Invalid response. Please try again.")
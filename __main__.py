@@ -1,3 +1,15 @@
+import os
+import sys
+import Metrics
+
+if os.environ.get("TRACKER_METRICS", "0") not in ("", "0"):
+    # e.g. TRACKER_METRICS=1, or =profile to capture a cProfile profile too
+    Metrics.enable(profile = os.environ["TRACKER_METRICS"].lower() == "profile")
+
+if len(sys.argv) > 1:
+    # a command was given, run it without the menus
+    from Cli import main
+    sys.exit(main())
 
 from Session import Session
 